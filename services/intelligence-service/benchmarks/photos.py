@@ -0,0 +1,98 @@
+"""
+Photo hash index build time, lookup latency and recall at scale.
+
+Run from services/intelligence-service:
+
+    python -m benchmarks.photos --sizes 100000,1000000 --queries 1000
+
+Stores that many random 64-bit hashes. Half the queries are stored hashes
+with up to PHOTO_HASH_MAX_DISTANCE + 2 bits flipped; the rest are fresh.
+Each query's result is checked against a linear scan, so recall should be
+exactly 1.0.
+"""
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+from benchmarks.run import _int_list, percentile
+from photo_index import PhotoHashIndex
+
+
+def measure(size: int, n_queries: int, max_distance: int, chunks: int, seed: int,
+            scan_queries: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    stored = [rng.getrandbits(64) for _ in range(size)]
+    index = PhotoHashIndex(max_distance, chunks)
+    start = time.perf_counter()
+    index.add_many((h, f"C{i}") for i, h in enumerate(stored))
+    build = time.perf_counter() - start
+
+    queries = []
+    for i in range(n_queries):
+        if i % 2:
+            h = stored[rng.randrange(size)]
+            for b in rng.sample(range(64), rng.randint(0, max_distance + 2)):
+                h ^= 1 << b
+        else:
+            h = rng.getrandbits(64)
+        queries.append(h)
+
+    latencies, results = [], []
+    for q in queries:
+        start = time.perf_counter()
+        results.append(index.search(q))
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    # A full scan is slow at millions of hashes, so only check a sample.
+    expected = found = 0
+    for q, got in list(zip(queries, results))[:scan_queries]:
+        truth = {eid for eid, h in enumerate(stored) if (h ^ q).bit_count() <= max_distance}
+        expected += len(truth)
+        found += len(truth & {eid for _, eid in got})
+    ms = lambda v: round(v * 1000.0, 3)
+    return {
+        "size": size,
+        "queries": n_queries,
+        "max_distance": max_distance,
+        "chunks": chunks,
+        "build_s": round(build, 3),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "recall": round(found / expected, 4) if expected else 1.0,
+        "checked_matches": expected,
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the perceptual photo hash index.")
+    parser.add_argument("--sizes", type=_int_list, default=[100000, 1000000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--max-distance", type=int, default=6)
+    parser.add_argument("--chunks", type=int, default=4)
+    parser.add_argument("--scan-queries", type=int, default=50, help="queries verified against a linear scan")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = []
+    for size in args.sizes:
+        row = measure(size, args.queries, args.max_distance, args.chunks, args.seed, args.scan_queries)
+        results.append(row)
+        print(f"size={row['size']:<8} build={row['build_s']}s p50={row['p50_ms']}ms p95={row['p95_ms']}ms "
+              f"p99={row['p99_ms']}ms recall={row['recall']} ({row['checked_matches']} checked)", flush=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
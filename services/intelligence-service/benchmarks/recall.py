@@ -0,0 +1,132 @@
+"""
+Recall and latency of LSH dedupe candidates against the exact scan.
+
+Run from services/intelligence-service:
+
+    python -m benchmarks.recall --corpus-sizes 10000,100000 --queries 500
+
+For each corpus size, a synthetic canonical corpus is indexed twice: with
+the exact token posting lists and with the MinHash LSH index. Queries are
+near-duplicates of corpus incidents (a word dropped, added or swapped for a
+plural, half of them without coordinates so only text can match) mixed
+with fresh reports. Both indexes run the same dedupe; recall is the share
+of exact-scan duplicates the LSH run also finds, with the same incident.
+"""
+import argparse
+import json
+import math
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.run import _int_list, percentile
+from benchmarks.synthetic import FILLER, Generator
+
+import services
+import textsim
+from incident_index import IncidentIndex
+
+
+def _perturb(gen: Generator, summary: str) -> str:
+    words = summary.split()
+    roll = gen.rng.random()
+    if roll < 0.3 and len(words) > 3:
+        words.pop(gen.rng.randrange(len(words)))
+    elif roll < 0.6:
+        words.insert(gen.rng.randrange(len(words) + 1), gen.rng.choice(FILLER))
+    elif roll < 0.8:
+        i = gen.rng.randrange(len(words))
+        words[i] = words[i] + "s"
+    return " ".join(words)
+
+
+def queries(gen: Generator, incidents: List[Dict], n: int) -> List[Tuple[str, Optional[float], Optional[float]]]:
+    out = []
+    for i in range(n):
+        if i % 4 == 3:
+            m = gen.mepp()
+            out.append((m["issue"]["summary"], m["location"].get("lat"), m["location"].get("lon")))
+            continue
+        inc = gen.rng.choice(incidents)
+        with_geo = i % 2 == 0
+        out.append((_perturb(gen, inc["summary"]),
+                    inc["lat"] if with_geo else None, inc["lon"] if with_geo else None))
+    return out
+
+
+def _timed_dedupe(index: IncidentIndex, qs, threshold: float):
+    results, latencies = [], []
+    for summary, lat, lon in qs:
+        start = time.perf_counter()
+        res = services._dedupe(index, services.tokenize(summary), lat, lon, threshold)
+        latencies.append(time.perf_counter() - start)
+        results.append(res)
+    return results, sorted(latencies)
+
+
+def measure(size: int, n_queries: int, seed: int, bands: int, rows: int, threshold: float) -> Dict[str, Any]:
+    gen = Generator(seed)
+    incidents = gen.incidents(size)
+    start = time.perf_counter()
+    exact = IncidentIndex.from_incidents(incidents, services.tokenize)
+    exact_build = time.perf_counter() - start
+    start = time.perf_counter()
+    lsh = IncidentIndex.from_incidents(incidents, services.tokenize, lsh_bands=bands, lsh_rows=rows)
+    lsh_build = time.perf_counter() - start
+
+    qs = queries(gen, incidents, n_queries)
+    exact_res, exact_lat = _timed_dedupe(exact, qs, threshold)
+    lsh_res, lsh_lat = _timed_dedupe(lsh, qs, threshold)
+
+    expected = [i for i, r in enumerate(exact_res) if r.duplicate_of is not None]
+    found = sum(1 for i in expected if lsh_res[i].duplicate_of == exact_res[i].duplicate_of)
+    ms = lambda v: round(v * 1000.0, 3)
+    return {
+        "corpus_size": size,
+        "queries": n_queries,
+        "bands": bands,
+        "rows": rows,
+        "tokenizer": textsim.TEXT_TOKENIZER,
+        "exact_duplicates": len(expected),
+        "recall": round(found / len(expected), 4) if expected else 1.0,
+        "false_positives": sum(1 for e, l in zip(exact_res, lsh_res)
+                               if l.duplicate_of is not None and l.duplicate_of != e.duplicate_of),
+        "exact_build_s": round(exact_build, 3),
+        "lsh_build_s": round(lsh_build, 3),
+        "exact_p50_ms": ms(percentile(exact_lat, 50)),
+        "exact_p95_ms": ms(percentile(exact_lat, 95)),
+        "lsh_p50_ms": ms(percentile(lsh_lat, 50)),
+        "lsh_p95_ms": ms(percentile(lsh_lat, 95)),
+    }
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LSH dedupe candidate recall against the exact scan.")
+    parser.add_argument("--corpus-sizes", type=_int_list, default=[10000, 100000])
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--bands", type=int, default=textsim.LSH_BANDS)
+    parser.add_argument("--rows", type=int, default=textsim.LSH_ROWS)
+    parser.add_argument("--threshold", type=float, default=0.65, help="DEDUPE_THRESHOLD to evaluate at")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    results = []
+    for size in args.corpus_sizes:
+        row = measure(size, args.queries, args.seed, args.bands, args.rows, args.threshold)
+        results.append(row)
+        print(f"corpus={row['corpus_size']:<7} recall={row['recall']:.4f} ({row['exact_duplicates']} dups) "
+              f"fp={row['false_positives']} exact p50/p95={row['exact_p50_ms']}/{row['exact_p95_ms']}ms "
+              f"lsh p50/p95={row['lsh_p50_ms']}/{row['lsh_p95_ms']}ms "
+              f"build {row['exact_build_s']}s/{row['lsh_build_s']}s", flush=True)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"results": results}, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,301 @@
+"""
+Latency and throughput benchmarks for the intelligence service.
+
+Run from services/intelligence-service:
+
+    python -m benchmarks.run --corpus-sizes 1000,10000 --concurrency 1,8 \
+        --requests 500 --output bench.json
+
+For every corpus size the canonical incident corpus is replaced with that
+many synthetic incidents and the cluster store is grown to that many
+clustered reports, then each target is driven with fresh synthetic MEPPs at
+each concurrency level, both by calling the service function directly and
+through the ASGI app. p50/p95/p99 latency and throughput go to stdout and,
+with --output, to a JSON file; --compare prints the change against an
+earlier file.
+
+CLUSTER_DB and PACK_DIR point into a scratch directory (--workdir, default a
+fresh temp dir) unless already set, so runs never touch real data. Result
+caches are disabled unless --cache is given, since every synthetic MEPP is
+distinct anyway.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from benchmarks.synthetic import Generator
+
+TARGETS = ("dedupe", "score", "route", "analyze", "cluster", "pack")
+MODES = ("function", "asgi")
+CLUSTER_PRELOAD_CHUNK = 500
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), math.ceil(pct / 100.0 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], wall_seconds: float, errors: int) -> Dict[str, Any]:
+    ordered = sorted(latencies)
+    ms = lambda v: round(v * 1000.0, 3)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": ms(percentile(ordered, 50)),
+        "p95_ms": ms(percentile(ordered, 95)),
+        "p99_ms": ms(percentile(ordered, 99)),
+        "mean_ms": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        "max_ms": ms(ordered[-1]) if ordered else 0.0,
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds > 0 else 0.0,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+class Bench:
+    def __init__(self, args: argparse.Namespace):
+        # Imported here so the CLUSTER_DB / PACK_DIR set up in main() apply.
+        import main
+        import schemas
+        import scoring
+        import services
+
+        self.args = args
+        self.main = main
+        self.schemas = schemas
+        self.scoring = scoring
+        self.services = services
+        self.gen = Generator(args.seed)
+        self.clustered = 0
+        if not args.cache:
+            for cache in (services.DEDUPE_CACHE, services.SCORE_CACHE, services.ROUTE_CACHE):
+                cache.max_entries = 0
+
+    # --- setup ---
+
+    def prepare_corpus(self, size: int) -> None:
+        self.services.CANONICAL_STORE.publish(Generator(self.args.seed + size).incidents(size))
+
+    def grow_cluster_store(self, size: int) -> None:
+        while self.clustered < size:
+            n = min(CLUSTER_PRELOAD_CHUNK, size - self.clustered)
+            self.services.cluster_batch([self.schemas.MEPP(**m) for m in self.gen.mepps(n)])
+            self.clustered += n
+
+    def payloads(self, target: str, n: int) -> List[Dict]:
+        if target == "pack":
+            return [self.gen.pack_request() for _ in range(n)]
+        return [{"mepp": m} for m in self.gen.mepps(n)]
+
+    # --- function mode ---
+
+    def function_call(self, target: str) -> Callable[[Dict], Any]:
+        s, schemas = self.services, self.schemas
+        if target == "pack":
+            return lambda p: s.build_pack(schemas.PackReq(**p))
+        fn = {
+            "dedupe": s.dedupe_mepp,
+            "score": s.score_credibility,
+            "route": s.route_mepp,
+            "analyze": s.analyze_mepp,
+            "cluster": s.cluster_mepp,
+        }[target]
+        return lambda p: fn(schemas.MEPP(**p["mepp"]))
+
+    def run_function(self, target: str, payloads: List[Dict], concurrency: int) -> Dict[str, Any]:
+        call = self.function_call(target)
+
+        def timed(payload: Dict) -> Optional[float]:
+            start = time.perf_counter()
+            try:
+                call(payload)
+            except Exception:
+                return None
+            return time.perf_counter() - start
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(timed, payloads))
+            wall = time.perf_counter() - start
+        latencies = [r for r in results if r is not None]
+        errors = len(results) - len(latencies)
+        return summarize(latencies, wall, errors)
+
+    # --- ASGI mode ---
+
+    async def _run_asgi(self, target: str, payloads: List[Dict], concurrency: int) -> Dict[str, Any]:
+        import httpx
+
+        headers = {"X-API-Key": self.main.API_KEY} if self.main.API_KEY else {}
+        transport = httpx.ASGITransport(app=self.main.app)
+        latencies: List[float] = []
+        errors = 0
+        queue: asyncio.Queue = asyncio.Queue()
+        for p in payloads:
+            queue.put_nowait(p)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=headers) as client:
+            async def worker():
+                nonlocal errors
+                while True:
+                    try:
+                        payload = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post(f"/{target}", json=payload)
+                        ok = response.status_code < 400
+                    except Exception:
+                        ok = False
+                    if ok:
+                        latencies.append(time.perf_counter() - start)
+                    else:
+                        errors += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            wall = time.perf_counter() - start
+        return summarize(latencies, wall, errors)
+
+    def run_asgi(self, target: str, payloads: List[Dict], concurrency: int) -> Dict[str, Any]:
+        return asyncio.run(self._run_asgi(target, payloads, concurrency))
+
+    # --- driver ---
+
+    def run(self) -> List[Dict[str, Any]]:
+        args = self.args
+        results = []
+        for size in args.corpus_sizes:
+            self.prepare_corpus(size)
+            if {"cluster", "analyze"} & set(args.targets):
+                self.grow_cluster_store(size)
+            for target in args.targets:
+                for mode in args.modes:
+                    runner = self.run_function if mode == "function" else self.run_asgi
+                    for concurrency in args.concurrency:
+                        if args.warmup:
+                            runner(target, self.payloads(target, args.warmup), concurrency)
+                        row = {"target": target, "mode": mode, "corpus_size": size, "concurrency": concurrency}
+                        row.update(runner(target, self.payloads(target, args.requests), concurrency))
+                        results.append(row)
+                        print(format_row(row), flush=True)
+        return results
+
+
+def format_row(row: Dict[str, Any]) -> str:
+    return (f"{row['target']:<8} {row['mode']:<8} corpus={row['corpus_size']:<7} c={row['concurrency']:<3} "
+            f"p50={row['p50_ms']:>9.3f}ms p95={row['p95_ms']:>9.3f}ms p99={row['p99_ms']:>9.3f}ms "
+            f"{row['throughput_rps']:>9.1f} req/s errors={row['errors']}")
+
+
+def _row_key(row: Dict[str, Any]) -> Tuple:
+    return row["target"], row["mode"], row["corpus_size"], row["concurrency"]
+
+
+def compare(base: Dict[str, Any], results: List[Dict[str, Any]]) -> List[str]:
+    """Lines describing p95 and throughput changes against an earlier run."""
+    previous = {_row_key(r): r for r in base.get("results", [])}
+    lines = []
+    for row in results:
+        old = previous.get(_row_key(row))
+        if old is None:
+            continue
+        p95 = (row["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+        rps = (row["throughput_rps"] - old["throughput_rps"]) / old["throughput_rps"] * 100 if old["throughput_rps"] else 0.0
+        target, mode, size, concurrency = _row_key(row)
+        lines.append(f"{target:<8} {mode:<8} corpus={size:<7} c={concurrency:<3} "
+                     f"p95 {old['p95_ms']:.3f} -> {row['p95_ms']:.3f}ms ({p95:+.1f}%) "
+                     f"throughput {old['throughput_rps']:.1f} -> {row['throughput_rps']:.1f} ({rps:+.1f}%)")
+    return lines
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+def _choice_list(choices: Sequence[str]) -> Callable[[str], List[str]]:
+    def parse(value: str) -> List[str]:
+        items = [v.strip() for v in value.split(",") if v.strip()]
+        unknown = [v for v in items if v not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown {unknown}; choose from {', '.join(choices)}")
+        return items
+    return parse
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark intelligence-service endpoints.")
+    parser.add_argument("--corpus-sizes", type=_int_list, default=[1000, 10000],
+                        help="canonical incidents / clustered reports per run, comma separated")
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 8], help="concurrent callers, comma separated")
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per target and setting")
+    parser.add_argument("--warmup", type=int, default=20, help="unmeasured requests before each measurement")
+    parser.add_argument("--targets", type=_choice_list(TARGETS), default=list(TARGETS))
+    parser.add_argument("--modes", type=_choice_list(MODES), default=list(MODES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--cache", action="store_true", help="keep the result caches enabled")
+    parser.add_argument("--workdir", help="scratch directory for CLUSTER_DB and PACK_DIR")
+    parser.add_argument("--output", help="write results as JSON to this file")
+    parser.add_argument("--compare", help="earlier JSON results to compare against")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    workdir = args.workdir or tempfile.mkdtemp(prefix="intel-bench-")
+    os.makedirs(workdir, exist_ok=True)
+    os.environ.setdefault("CLUSTER_DB", os.path.join(workdir, "cluster.db"))
+    os.environ.setdefault("PACK_DIR", os.path.join(workdir, "packs"))
+    # Per-request access logs would dominate the measurement.
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    bench = Bench(args)
+    started = datetime.now(timezone.utc).isoformat()
+    results = bench.run()
+    report = {
+        "meta": {
+            "started_at": started,
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "numpy": bench.scoring.numpy_enabled(),
+            "cache": args.cache,
+            "requests": args.requests,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            for line in compare(json.load(f), results):
+                print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+"""
+Synthetic canonical incidents, MEPPs and pack requests for benchmarks.
+
+Reports are spread around a fixed set of ward centres (a Gaussian of a few
+hundred metres each) and summaries are drawn from per-category vocabularies
+plus shared filler and landmark words, so token overlap and geo density look
+like real traffic rather than uniform noise. Everything is seeded and
+deterministic.
+"""
+import random
+from typing import Dict, List, Optional, Tuple
+
+# Roughly the Tiruppur municipal area.
+CITY_CENTRE = (11.1085, 77.3411)
+CITY_SPREAD_DEG = 0.04
+WARD_COUNT = 60
+WARD_SPREAD_DEG = 0.003  # ~330 m
+
+CATEGORY_VOCAB: Dict[str, List[str]] = {
+    "sanitation/garbage": ["garbage", "bin", "overflowing", "trash", "waste", "dump", "smell", "litter", "collection", "heap"],
+    "sanitation/drainage": ["drain", "blocked", "sewage", "overflow", "stagnant", "water", "mosquito", "clogged", "gutter", "manhole"],
+    "roads/pothole": ["pothole", "road", "damaged", "crater", "tar", "broken", "surface", "accident", "uneven", "patch"],
+    "electrical/streetlight": ["streetlight", "lamp", "dark", "bulb", "flickering", "pole", "wire", "night", "fused", "light"],
+    "water/supply": ["water", "pipe", "leak", "burst", "supply", "shortage", "tap", "pressure", "contaminated", "valve"],
+    "public/encroachment": ["encroachment", "footpath", "blocked", "shop", "vendor", "illegal", "hoarding", "parking", "obstruction", "pavement"],
+}
+LANDMARKS = ["market", "temple", "school", "bus", "stand", "hospital", "junction", "park", "station", "college",
+             "gandhi", "statue", "main", "street", "cross", "nagar", "colony", "bridge", "canal", "mill"]
+FILLER = ["near", "the", "at", "behind", "opposite", "for", "days", "since", "very", "large", "again", "still"]
+
+
+class Generator:
+    def __init__(self, seed: int = 7):
+        self.rng = random.Random(seed)
+        self.wards: List[Tuple[str, float, float]] = [
+            (str(i + 1),
+             CITY_CENTRE[0] + self.rng.gauss(0, CITY_SPREAD_DEG),
+             CITY_CENTRE[1] + self.rng.gauss(0, CITY_SPREAD_DEG))
+            for i in range(WARD_COUNT)
+        ]
+        self.categories = list(CATEGORY_VOCAB)
+        self._case = 0
+
+    def point(self) -> Tuple[str, float, float]:
+        ward, lat, lon = self.rng.choice(self.wards)
+        return (ward,
+                round(lat + self.rng.gauss(0, WARD_SPREAD_DEG), 6),
+                round(lon + self.rng.gauss(0, WARD_SPREAD_DEG), 6))
+
+    def summary(self, category: str) -> str:
+        rng = self.rng
+        words = rng.sample(CATEGORY_VOCAB[category], rng.randint(2, 4))
+        words += rng.sample(LANDMARKS, rng.randint(1, 3))
+        words += rng.sample(FILLER, rng.randint(1, 3))
+        rng.shuffle(words)
+        return " ".join(words)
+
+    def incident(self, i: int) -> Dict:
+        category = self.rng.choice(self.categories)
+        _, lat, lon = self.point()
+        return {"id": f"INC-{i:07d}", "summary": self.summary(category), "lat": lat, "lon": lon}
+
+    def incidents(self, n: int) -> List[Dict]:
+        return [self.incident(i) for i in range(n)]
+
+    def mepp(self, geo_ratio: float = 0.9) -> Dict:
+        self._case += 1
+        category = self.rng.choice(self.categories)
+        ward, lat, lon = self.point()
+        location: Dict = {"ward": ward}
+        if self.rng.random() < geo_ratio:
+            location.update(lat=lat, lon=lon)
+        if self.rng.random() < 0.6:
+            location["address_text"] = " ".join(self.rng.sample(LANDMARKS, 2))
+        photos = [{"url": f"https://example.invalid/p/{self._case}-{k}.jpg", "hash": f"{self.rng.getrandbits(64):016x}"}
+                  for k in range(self.rng.randint(0, 3))]
+        return {
+            "version": "1.0",
+            "case_id": f"BENCH-{self._case:07d}",
+            "reporter": {"contact": "+910000000000"} if self.rng.random() < 0.5 else {},
+            "issue": {"category": category, "summary": self.summary(category), "details": ""},
+            "evidence": {"photos": photos},
+            "location": location,
+            "provenance": {"raw_id": f"raw-{self._case}"},
+        }
+
+    def mepps(self, n: int, geo_ratio: float = 0.9) -> List[Dict]:
+        return [self.mepp(geo_ratio) for _ in range(n)]
+
+    def pack_request(self, mepp: Optional[Dict] = None) -> Dict:
+        mepp = mepp or self.mepp()
+        return {
+            "mepp": mepp,
+            "gating": {"status": "action", "final_confidence": round(self.rng.uniform(0.5, 1.0), 2)},
+            "routing": {"dest": "ULB_GENERIC", "confidence": 0.4},
+            "cluster": {"cluster_id": f"CL-{self.rng.getrandbits(32):08x}", "is_new": True,
+                        "members": 1, "text_similarity": 1.0},
+        }
+
@@ -0,0 +1,137 @@
+"""
+Bulk pack generation: many PackReqs -> per-case JSON packs plus one
+combined multi-page PDF.
+
+Every case is drawn onto one shared canvas, and the table of contents is
+rendered after the last case and mirrored as PDF bookmarks. reportlab keeps
+every page in memory until the bundle is saved (about 4 KB per case), so
+memory grows with the bundle; it is bounded by capping a bundle at
+BULK_PACK_MAX_CASES cases, checked before any pack is written.
+
+A case's pdf_url points into the bundle at its bookmark (#<pack_id>); no
+separate per-case PDF is rendered.
+
+CLI:
+    python bulk_pack.py requests.jsonl > results.jsonl
+
+Each input line is a PackReq; once the bundle is written, each output line
+is the PackRes of one case, followed by a final line with the bundle summary.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+import metrics
+import services
+from schemas import PackBulkRes, PackReq, PackRes
+
+
+def _bundle_id(digest: str) -> str:
+    return "BP-" + digest[:services.PACK_ID_HEX]
+
+
+def _file_sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def build_bulk_pack(reqs: Iterable[PackReq],
+                    on_pack: Optional[Callable[[PackRes], None]] = None) -> PackBulkRes:
+    from reportlab.pdfgen import canvas
+
+    reqs = list(itertools.islice(reqs, services.BULK_PACK_MAX_CASES + 1))
+    if len(reqs) > services.BULK_PACK_MAX_CASES:
+        raise ValueError(f"Bulk pack exceeds BULK_PACK_MAX_CASES ({services.BULK_PACK_MAX_CASES} cases)")
+
+    store = services.PACK_STORE
+    os.makedirs(store.root, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=store.root, prefix=".tmp-bundle-", suffix=".pdf")
+    os.close(fd)
+
+    toc: List[Tuple[str, str, int]] = []
+    packs: List[PackRes] = []
+    bundle_hash = hashlib.sha256()
+    page = 1
+    started = time.perf_counter()
+    try:
+        c = canvas.Canvas(tmp_path, pageCompression=1)
+        for req in reqs:
+            pack_id = services.pack_id_for(req)
+            res, _, lines = services.prepare_pack(req, pack_id)
+            bundle_hash.update(pack_id.encode("ascii"))
+
+            case_id = str(req.mepp.case_id or req.mepp.provenance.get("raw_id", "Unknown"))
+            c.bookmarkPage(pack_id)
+            c.addOutlineEntry(f"{case_id} ({pack_id})", pack_id, level=0)
+            toc.append((case_id, pack_id, page))
+            page += services.draw_pack_lines(c, lines)
+            c.showPage()
+            packs.append(res)
+
+        c.bookmarkPage("toc")
+        c.addOutlineEntry("Table of Contents", "toc", level=0)
+        toc_lines = ["Table of Contents", ""]
+        toc_lines.extend(f"{case_id}  {pack_id}  ....  page {p}" for case_id, pack_id, p in toc)
+        page += services.draw_pack_lines(c, toc_lines) - 1
+        c.save()
+        metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "bulk_pack_build")
+
+        bundle_id = _bundle_id(bundle_hash.hexdigest())
+        _, pdf_path = store.paths(bundle_id)
+        os.makedirs(os.path.dirname(pdf_path), exist_ok=True)
+        os.replace(tmp_path, pdf_path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    pdf_url = f"file://{os.path.abspath(pdf_path)}"
+    if on_pack is not None:
+        for res in packs:
+            on_pack(res.model_copy(update={"pdf_url": f"{pdf_url}#{res.pack_id}", "status": "bundled"}))
+
+    return PackBulkRes(
+        bundle_id=bundle_id,
+        pdf_url=pdf_url,
+        sha256=f"sha256:{_file_sha256(pdf_path)}",
+        cases=len(toc),
+        pages=page,
+    )
+
+
+def _read_requests(stream: TextIO) -> Iterator[PackReq]:
+    for line in stream:
+        if line.strip():
+            yield PackReq.model_validate_json(line)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Render many packs into one combined PDF.")
+    parser.add_argument("input", help="JSON-lines file of PackReq objects, or - for stdin")
+    args = parser.parse_args(argv)
+
+    def emit(res: PackRes) -> None:
+        sys.stdout.write(res.model_dump_json() + "\n")
+
+    if args.input == "-":
+        bundle = build_bulk_pack(_read_requests(sys.stdin), emit)
+    else:
+        with open(args.input, "r", encoding="utf-8") as f:
+            bundle = build_bulk_pack(_read_requests(f), emit)
+    sys.stdout.write(bundle.model_dump_json() + "\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
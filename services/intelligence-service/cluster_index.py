@@ -0,0 +1,442 @@
+"""
+In-memory cluster index with write-behind persistence.
+
+The active clusters live in RAM, keyed by geocell and ward, each with its
+centroid as a frozenset of interned tokens plus per-token counts. Cluster
+assignment reads and updates only this index; the changes are handed to a
+ClusterWriter, which writes them to SQLite in batched transactions on a
+background thread. SQLite stays the durable record, but it is off the
+request path.
+
+One process owns a store's index: it holds an exclusive lock on
+<store path>.owner while loaded, and a second process trying to load an
+index over the same store fails instead of assigning against stale state.
+
+Startup restores the index from a snapshot: a binary header of watermarks
+followed by the clusters as plain JSON arrays, so a tampered file can at
+worst be rejected, never run code. It then reads back only the clusters
+that gained members after the snapshot was taken. Without a usable snapshot it falls back to loading every active
+row from the clusters table.
+
+The store may be sharded (see cluster_shards); the writer flushes each
+shard in its own transaction and the snapshot records a watermark per
+shard.
+"""
+import fcntl
+import json
+import logging
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import metrics
+from cluster_shards import ShardedClusterStore
+from cluster_store import (
+    SELECT_ACTIVE_CLUSTERS, SELECT_CHANGED_CLUSTERS, SELECT_MEMBER_WATERMARK, UPSERT_CLUSTER, INSERT_MEMBER,
+    INSERT_PHOTO_HASH, ClusterStoreError, count_tokens, decode_token_counts, rank_tokens,
+)
+
+logger = logging.getLogger("intelligence-service")
+
+# Magic (format version included) and the shard count, followed by each
+# shard's cluster_members rowid the snapshot is consistent with.
+SNAPSHOT_MAGIC = b"CRCLIX03"
+_HEADER = struct.Struct("<8sI")
+
+
+class ClusterEntry:
+    """One active cluster. tokens and counts are the centroid in rank order."""
+    __slots__ = ("cluster_id", "ward", "geocell", "lat", "lon", "tokens", "counts", "centroid",
+                 "members", "created_at", "updated_at", "expires_at")
+
+    def __init__(self, cluster_id: str, ward: str, geocell: str, lat: Optional[float], lon: Optional[float],
+                 tokens: Sequence[str], counts: Sequence[int], members: int,
+                 created_at: Optional[str], updated_at: Optional[str], expires_at: float):
+        self.cluster_id = cluster_id
+        self.ward = ward
+        self.geocell = geocell
+        self.lat = lat
+        self.lon = lon
+        # sys.intern shares token strings across clusters; unlike the global
+        # token dictionary, it frees them once no cluster holds them.
+        self.tokens: Tuple[str, ...] = tuple(sys.intern(t) for t in tokens)
+        self.counts: Tuple[int, ...] = tuple(counts)
+        self.centroid = frozenset(self.tokens)
+        self.members = members
+        self.created_at = created_at
+        self.updated_at = updated_at
+        self.expires_at = expires_at
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "ClusterEntry":
+        """From a row in cluster_store.CLUSTER_COLUMNS order."""
+        cluster_id, ward, geocell, centroid, members, created_at, updated_at, token_counts, lat, lon, expires_at = row
+        counts = decode_token_counts(centroid, token_counts)
+        return cls(cluster_id, ward, geocell, lat, lon, list(counts), list(counts.values()),
+                   members or 0, created_at, updated_at, expires_at)
+
+    def row(self) -> tuple:
+        """The clusters row, in cluster_store.CLUSTER_COLUMNS order."""
+        return (self.cluster_id, self.ward, self.geocell, " ".join(self.tokens), self.members,
+                self.created_at, self.updated_at, " ".join(str(n) for n in self.counts),
+                self.lat, self.lon, self.expires_at)
+
+    def compact(self) -> tuple:
+        return (self.cluster_id, self.ward, self.geocell, self.lat, self.lon, self.tokens, self.counts,
+                self.members, self.created_at, self.updated_at, self.expires_at)
+
+    def set_tokens(self, ranked: List[Tuple[str, int]]) -> None:
+        self.tokens = tuple(sys.intern(t) for t, _ in ranked)
+        self.counts = tuple(n for _, n in ranked)
+        self.centroid = frozenset(self.tokens)
+
+
+class ClusterWriter:
+    """
+    Batches cluster changes into SQLite transactions, one per shard.
+
+    submit() only queues; a daemon thread, started on first use, flushes
+    every interval seconds or as soon as batch_size changes are waiting.
+    Repeated changes to one cluster are coalesced to its latest row. A
+    shard whose flush fails keeps its changes queued for the next one. Once
+    max_pending changes are stuck behind a failing database, check()
+    raises ClusterStoreError, so callers stop taking new work instead of
+    queueing more.
+    """
+
+    def __init__(self, store: ShardedClusterStore, interval: float = 0.05, batch_size: int = 500,
+                 max_pending: int = 100000):
+        self.store = store
+        self.interval = interval
+        self.batch_size = max(1, batch_size)
+        self.max_pending = max(1, max_pending)
+        # shard -> (cluster rows by id, member rows, photo rows)
+        self._queued: Dict[int, Tuple[Dict[str, tuple], List[tuple], List[tuple]]] = {}
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.last_error: Optional[str] = None
+        self.flushed = 0
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def check(self) -> None:
+        if self.last_error is not None and self.pending >= self.max_pending:
+            raise ClusterStoreError(f"{self.pending} cluster writes pending after: {self.last_error}")
+
+    def _queue(self, shard: int, clusters: Iterable[tuple], members: Iterable[tuple],
+               photos: Iterable[tuple], newer: bool = True) -> None:
+        queued = self._queued.get(shard)
+        if queued is None:
+            queued = self._queued[shard] = ({}, [], [])
+        before = len(queued[0]) + len(queued[1]) + len(queued[2])
+        for row in clusters:
+            if newer:
+                queued[0][row[0]] = row
+            else:
+                queued[0].setdefault(row[0], row)
+        if newer:
+            queued[1].extend(members)
+            queued[2].extend(photos)
+        else:
+            queued[1][:0] = members
+            queued[2][:0] = photos
+        self._pending += len(queued[0]) + len(queued[1]) + len(queued[2]) - before
+
+    def submit(self, shard: int, clusters: Iterable[tuple], members: Iterable[tuple],
+               photos: Iterable[tuple]) -> None:
+        with self._lock:
+            self._queue(shard, clusters, members, photos)
+            full = self._pending >= self.batch_size
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def flush(self) -> int:
+        """
+        Write everything queued so far; returns the number of rows written.
+        Raises the first shard's error after trying every shard.
+        """
+        with self._flush_lock:
+            with self._lock:
+                queued, self._queued, self._pending = self._queued, {}, 0
+            written = 0
+            error: Optional[Exception] = None
+            for shard, (clusters, members, photos) in sorted(queued.items()):
+                # Every assignment queues one member row, so those rows give
+                # each cluster's member delta to add.
+                added = Counter(m[0] for m in members)
+                rows = [row[:4] + (added.get(row[0], 0),) + row[5:] for row in clusters.values()]
+
+                def write(c) -> None:
+                    c.executemany(UPSERT_CLUSTER, rows)
+                    c.executemany(INSERT_MEMBER, members)
+                    c.executemany(INSERT_PHOTO_HASH, photos)
+
+                try:
+                    with metrics.stage("cluster_flush"):
+                        self.store.shards[shard].run_in_transaction(write, "cluster flush")
+                except Exception as e:
+                    with self._lock:
+                        # Anything queued meanwhile is newer than what failed.
+                        self._queue(shard, clusters.values(), members, photos, newer=False)
+                    error = error or e
+                    continue
+                written += len(clusters) + len(members) + len(photos)
+            self.flushed += written
+            if error is not None:
+                self.last_error = str(error)
+                raise error
+            self.last_error = None
+            return written
+
+    def _ensure_thread(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cluster-writer", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Cluster write-behind flush failed, will retry: {e}")
+
+    def stop(self) -> None:
+        """Stop the thread and write whatever is still queued."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        self.flush()
+
+
+class ClusterIndex:
+    """
+    Active clusters by geocell and ward. Callers hold `lock` across a read
+    and the updates that depend on it, so a batch sees its own changes and
+    concurrent assignments never interleave.
+    """
+
+    def __init__(self, store: ShardedClusterStore, writer: ClusterWriter, snapshot_path: Optional[str] = None):
+        self.store = store
+        self.writer = writer
+        self.snapshot_path = snapshot_path or None
+        self.lock = threading.RLock()
+        self._clusters: Dict[str, ClusterEntry] = {}
+        self._by_cell: Dict[str, Dict[str, ClusterEntry]] = {}
+        self._by_ward: Dict[str, Dict[str, ClusterEntry]] = {}
+        self._loaded = False
+        self._owner = None
+        # "snapshot" or "table", for logs and tests.
+        self.restored_from: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self._clusters)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> "ClusterIndex":
+        if self._loaded:
+            return self
+        with self.lock:
+            if not self._loaded:
+                self._claim()
+                try:
+                    self._restore()
+                except BaseException:
+                    self.release()
+                    raise
+                self._loaded = True
+        return self
+
+    def _claim(self) -> None:
+        """Take the store's owner lock, or fail if another process holds it."""
+        path = self.store.path + ".owner"
+        owner = open(path, "a+")
+        try:
+            fcntl.flock(owner.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            owner.seek(0)
+            pid = owner.read().strip() or "unknown"
+            owner.close()
+            raise ClusterStoreError(f"{self.store.path} already has an in-memory cluster index in process {pid}; "
+                                    "run one process per CLUSTER_DB or set CLUSTER_INDEX=sqlite")
+        owner.truncate(0)
+        owner.write(str(os.getpid()))
+        owner.flush()
+        self._owner = owner
+
+    def release(self) -> None:
+        """Drop the owner lock; the index must not be used afterwards."""
+        if self._owner is not None:
+            self._owner.close()
+            self._owner = None
+
+    # --- Lookup and update ---
+
+    def by_cells(self, cells: Iterable[str], at: float) -> List[ClusterEntry]:
+        out = []
+        for cell in cells:
+            bucket = self._by_cell.get(cell)
+            if bucket:
+                out.extend(e for e in bucket.values() if e.expires_at > at)
+        return out
+
+    def by_ward(self, ward: str, at: float) -> List[ClusterEntry]:
+        bucket = self._by_ward.get(ward)
+        if not bucket:
+            return []
+        return [e for e in bucket.values() if e.expires_at > at]
+
+    def add(self, entry: ClusterEntry) -> None:
+        self._drop(entry.cluster_id)
+        self._clusters[entry.cluster_id] = entry
+        self._by_cell.setdefault(entry.geocell, {})[entry.cluster_id] = entry
+        self._by_ward.setdefault(entry.ward, {})[entry.cluster_id] = entry
+
+    def _drop(self, cluster_id: str) -> Optional[ClusterEntry]:
+        entry = self._clusters.pop(cluster_id, None)
+        if entry is not None:
+            for table, key in ((self._by_cell, entry.geocell), (self._by_ward, entry.ward)):
+                bucket = table.get(key)
+                if bucket is not None:
+                    bucket.pop(cluster_id, None)
+                    if not bucket:
+                        del table[key]
+        return entry
+
+    def create(self, cluster_id: str, ward: str, geocell: str, lat: Optional[float], lon: Optional[float],
+               tokens: Iterable[str], now_str: str, expires_at: float, max_tokens: int) -> ClusterEntry:
+        ranked = rank_tokens({tok: 1 for tok in sorted(tokens)}, max_tokens)
+        entry = ClusterEntry(cluster_id, ward, geocell, lat, lon, [t for t, _ in ranked], [n for _, n in ranked],
+                             1, now_str, now_str, expires_at)
+        self.add(entry)
+        return entry
+
+    def merge(self, entry: ClusterEntry, tokens: Iterable[str], now_str: str, expires_at: float,
+              max_tokens: int) -> ClusterEntry:
+        """Count a new member into entry, the same way the SQL path updates a row."""
+        counts = dict(zip(entry.tokens, entry.counts))
+        count_tokens(counts, tokens, max_tokens)
+        entry.set_tokens(rank_tokens(counts, max_tokens))
+        entry.members += 1
+        entry.updated_at = now_str
+        entry.expires_at = max(entry.expires_at, expires_at)
+        return entry
+
+    def evict_expired(self, now: float) -> List[str]:
+        with self.lock:
+            expired = [cid for cid, e in self._clusters.items() if e.expires_at <= now]
+            for cid in expired:
+                self._drop(cid)
+        return expired
+
+    # --- Restore and snapshot ---
+
+    def _restore(self) -> None:
+        started = time.perf_counter()
+        now = time.time()
+        snapshot = self._read_snapshot() if self.snapshot_path else None
+        current = self._watermarks()
+        if snapshot is not None and len(snapshot[0]) != len(current):
+            logger.warning(f"Cluster snapshot {self.snapshot_path} covers {len(snapshot[0])} shards, "
+                           f"not {len(current)}; ignoring it")
+            snapshot = None
+        if snapshot is not None and any(w > c for w, c in zip(snapshot[0], current)):
+            logger.warning(f"Cluster snapshot {self.snapshot_path} is ahead of {self.store.path}; ignoring it")
+            snapshot = None
+        changed: List[tuple] = []
+        for i, shard in enumerate(self.store.shards):
+            with shard.connection() as conn:
+                if snapshot is not None:
+                    changed.extend(conn.execute(SELECT_CHANGED_CLUSTERS, (snapshot[0][i],)).fetchall())
+                else:
+                    changed.extend(conn.execute(SELECT_ACTIVE_CLUSTERS, (now,)).fetchall())
+        for entry in snapshot[1] if snapshot is not None else []:
+            if entry.expires_at > now:
+                self.add(entry)
+        for row in changed:
+            entry = ClusterEntry.from_row(row)
+            if entry.expires_at > now:
+                self.add(entry)
+            else:
+                self._drop(entry.cluster_id)
+        self.restored_from = "snapshot" if snapshot is not None else "table"
+        logger.info(f"Cluster index restored from {self.restored_from}: {len(self._clusters)} clusters "
+                    f"({len(changed)} read from the table) in {time.perf_counter() - started:.3f}s")
+
+    def _watermarks(self) -> List[int]:
+        """Each shard's highest cluster_members rowid."""
+        marks = []
+        for shard in self.store.shards:
+            with shard.connection() as conn:
+                marks.append(conn.execute(SELECT_MEMBER_WATERMARK).fetchone()[0])
+        return marks
+
+    def _read_snapshot(self) -> Optional[Tuple[List[int], List[ClusterEntry]]]:
+        try:
+            with open(self.snapshot_path, "rb") as f:
+                magic, count = _HEADER.unpack(f.read(_HEADER.size))
+                if magic != SNAPSHOT_MAGIC:
+                    logger.warning(f"Cluster snapshot {self.snapshot_path} has an unknown format; ignoring it")
+                    return None
+                watermarks = list(struct.unpack(f"<{count}Q", f.read(8 * count)))
+                rows = json.loads(f.read())
+            return watermarks, [ClusterEntry(*row) for row in rows]
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, TypeError, struct.error) as e:
+            logger.warning(f"Cluster snapshot {self.snapshot_path} unreadable ({e}); loading from the table")
+            return None
+
+    def save_snapshot(self) -> int:
+        """
+        Flush pending writes and write the index to snapshot_path, atomically.
+        Holds the lock throughout, so the snapshot matches every shard at its
+        watermark. Returns the number of clusters written.
+        """
+        if not self.snapshot_path or not self._loaded:
+            return 0
+        with self.lock:
+            self.writer.flush()
+            watermarks = self._watermarks()
+            rows = [e.compact() for e in self._clusters.values()]
+            data = json.dumps(rows, separators=(",", ":")).encode("utf-8")
+        directory = os.path.dirname(os.path.abspath(self.snapshot_path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".snapshot")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(SNAPSHOT_MAGIC, len(watermarks)))
+                f.write(struct.pack(f"<{len(watermarks)}Q", *watermarks))
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.snapshot_path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        return len(rows)
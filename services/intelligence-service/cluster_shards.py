@@ -0,0 +1,147 @@
+"""
+Cluster storage partitioned across several SQLite files.
+
+SQLite admits one writer per database file, so every cluster write used to
+queue behind every other. A ShardedClusterStore splits the cluster tables
+over `shards` files and routes each cluster by where it is anchored:
+
+- reports with coordinates: by region, a block of region_cells x
+  region_cells geocells, so a neighbourhood's clusters share a shard;
+- reports without coordinates: by ward.
+
+Routing is a fixed hash of that key, so every process maps a cluster to the
+same file. A cluster never moves, and its cluster_members and photo_hashes
+rows live in its shard. A neighbourhood search near a region edge may touch
+two to four shards; read_all() queries every shard for region-wide reads.
+
+Sharding pays off with CLUSTER_INDEX=sqlite and several worker processes,
+each committing on the lock of the shards it touches. A transaction over
+several shards is not atomic: each shard commits separately, so a failure
+between commits leaves the earlier shards' changes applied.
+
+With one shard the store is exactly the single CLUSTER_DB file.
+"""
+import os
+import sqlite3
+import zlib
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, TypeVar
+
+import metrics
+from cluster_store import ClusterStore, ClusterStoreError, RetryPolicy
+
+T = TypeVar("T")
+
+
+def shard_paths(path: str, shards: int) -> List[str]:
+    """
+    cluster.db -> cluster-00of04.db, ... The shard count is part of the
+    name, so a different count starts on fresh files instead of misrouting
+    existing clusters.
+    """
+    if shards <= 1:
+        return [path]
+    root, ext = os.path.splitext(path)
+    return [f"{root}-{i:02d}of{shards:02d}{ext or '.db'}" for i in range(shards)]
+
+
+class ShardedClusterStore:
+    """Routes cluster rows to one of several ClusterStores; see the module docstring."""
+
+    def __init__(self, path: str, shards: int = 1, region_cells: int = 100, pool_size: int = 4,
+                 busy_timeout_ms: int = 5000, retry: Optional[RetryPolicy] = None):
+        self.path = path
+        self.region_cells = max(1, region_cells)
+        self.retry = retry or RetryPolicy()
+        self.shards = [ClusterStore(p, pool_size=pool_size, busy_timeout_ms=busy_timeout_ms, retry=self.retry)
+                       for p in shard_paths(path, shards)]
+
+    def __len__(self) -> int:
+        return len(self.shards)
+
+    def _hash(self, key: str) -> int:
+        return zlib.crc32(key.encode("utf-8")) % len(self.shards)
+
+    def shard_for(self, geocell: str, ward: str) -> int:
+        """The shard owning a cluster anchored at geocell ("nogeo" routes by ward)."""
+        if len(self.shards) == 1:
+            return 0
+        if geocell != "nogeo":
+            row, _, col = geocell.partition(":")
+            try:
+                return self._hash(f"{int(row) // self.region_cells}:{int(col) // self.region_cells}")
+            except ValueError:
+                pass
+        return self._hash(f"ward:{ward}")
+
+    def cells_by_shard(self, cells: Iterable[str]) -> Dict[int, List[str]]:
+        """Group geocells by the shard that owns clusters anchored in them."""
+        out: Dict[int, List[str]] = {}
+        for cell in cells:
+            out.setdefault(self.shard_for(cell, ""), []).append(cell)
+        return out
+
+    @property
+    def all_shards(self) -> List[int]:
+        return list(range(len(self.shards)))
+
+    def init_schema(self) -> None:
+        for shard in self.shards:
+            shard.init_schema()
+
+    def read_all(self, sql: str, params: Sequence = ()) -> List[tuple]:
+        """Run a read on every shard and concatenate the rows, in shard order."""
+        rows: List[tuple] = []
+        for shard in self.shards:
+            with shard.connection() as conn:
+                rows.extend(conn.execute(sql, params).fetchall())
+        return rows
+
+    def run_in_transaction(self, fn: Callable[[Dict[int, sqlite3.Cursor]], T], shard_ids: Iterable[int],
+                           what: str = "transaction") -> T:
+        """
+        Run fn({shard: cursor}) with BEGIN IMMEDIATE held on every listed
+        shard, retrying on lock errors. Shards are locked in index order, so
+        concurrent multi-shard transactions cannot wait on each other in a
+        cycle. This is not atomic across shards: each shard commits on its
+        own, so a failure after the first commit leaves that shard's changes
+        in place (say, a neighbour-cell cluster updated while the new member
+        row is lost). That case is reported as a ClusterStoreError and not
+        retried.
+        """
+        ids = sorted(set(shard_ids))
+        if len(ids) == 1:
+            shard = ids[0]
+            return self.shards[shard].run_in_transaction(lambda c: fn({shard: c}), what)
+
+        def attempt() -> T:
+            with ExitStack() as stack:
+                conns = {i: stack.enter_context(self.shards[i].connection()) for i in ids}
+                committed = 0
+                try:
+                    with metrics.stage("db_lock_wait"):
+                        for i in ids:
+                            conns[i].execute("BEGIN IMMEDIATE")
+                    cursors = {i: conns[i].cursor() for i in ids}
+                    result = fn(cursors)
+                    for cursor in cursors.values():
+                        cursor.close()
+                    with metrics.stage("db_commit"):
+                        for i in ids:
+                            conns[i].execute("COMMIT")
+                            committed += 1
+                except BaseException as e:
+                    for conn in conns.values():
+                        if conn.in_transaction:
+                            conn.rollback()
+                    if committed:
+                        raise ClusterStoreError(
+                            f"{what} committed on {committed} of {len(ids)} shards before failing: {e}") from e
+                    raise
+                return result
+
+        return self.retry.run(attempt, what)
+
+    def close(self) -> None:
+        for shard in self.shards:
+            shard.close()
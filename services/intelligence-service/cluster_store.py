@@ -0,0 +1,368 @@
+import json
+import logging
+import queue
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+import metrics
+
+logger = logging.getLogger("intelligence-service")
+
+T = TypeVar("T")
+
+# Statements are module constants so every call hands sqlite3 the identical
+# string and hits the per-connection prepared statement cache.
+CREATE_CLUSTERS = '''
+    CREATE TABLE IF NOT EXISTS clusters (
+        cluster_id TEXT PRIMARY KEY,
+        ward TEXT,
+        geocell TEXT,
+        centroid TEXT,
+        members INT,
+        created_at TEXT,
+        updated_at TEXT,
+        token_counts TEXT,
+        lat REAL,
+        lon REAL,
+        expires_at REAL NOT NULL DEFAULT 9e999
+    )
+'''
+# Columns added after the original schema, applied to existing databases.
+# 9e999 reads back as inf: existing clusters never expire.
+MIGRATIONS = (
+    ("clusters", "token_counts", "ALTER TABLE clusters ADD COLUMN token_counts TEXT"),
+    ("clusters", "lat", "ALTER TABLE clusters ADD COLUMN lat REAL"),
+    ("clusters", "lon", "ALTER TABLE clusters ADD COLUMN lon REAL"),
+    ("clusters", "expires_at", "ALTER TABLE clusters ADD COLUMN expires_at REAL NOT NULL DEFAULT 9e999"),
+)
+CLUSTER_COLUMNS = ("cluster_id, ward, geocell, centroid, members, created_at, updated_at, "
+                   "token_counts, lat, lon, expires_at")
+# Expired clusters move here, out of the candidate queries' way. Their
+# cluster_members and photo_hashes rows stay where they are.
+CREATE_CLUSTERS_ARCHIVE = '''
+    CREATE TABLE IF NOT EXISTS clusters_archive (
+        cluster_id TEXT,
+        ward TEXT,
+        geocell TEXT,
+        centroid TEXT,
+        members INT,
+        created_at TEXT,
+        updated_at TEXT,
+        token_counts TEXT,
+        lat REAL,
+        lon REAL,
+        expires_at REAL,
+        archived_at TEXT
+    )
+'''
+CREATE_CLUSTER_MEMBERS = '''
+    CREATE TABLE IF NOT EXISTS cluster_members (
+        cluster_id TEXT,
+        case_id TEXT,
+        summary TEXT,
+        lat REAL,
+        lon REAL,
+        ts TEXT
+    )
+'''
+# Perceptual hashes of clustered reports' photos, signed 64-bit (see
+# photo_index.to_signed); loaded into the in-memory PhotoHashIndex.
+CREATE_PHOTO_HASHES = '''
+    CREATE TABLE IF NOT EXISTS photo_hashes (
+        phash INTEGER NOT NULL,
+        case_id TEXT NOT NULL,
+        cluster_id TEXT,
+        ts TEXT
+    )
+'''
+CREATE_INDEXES = (
+    'CREATE INDEX IF NOT EXISTS idx_clusters_ward ON clusters (ward)',
+    'CREATE INDEX IF NOT EXISTS idx_clusters_geocell ON clusters (geocell)',
+    'CREATE INDEX IF NOT EXISTS idx_cluster_members_cluster ON cluster_members (cluster_id)',
+    'CREATE INDEX IF NOT EXISTS idx_photo_hashes_case ON photo_hashes (case_id)',
+    'CREATE INDEX IF NOT EXISTS idx_clusters_expires ON clusters (expires_at)',
+)
+# Candidate queries take the report time as their last parameter and skip
+# clusters that expired before it.
+SELECT_CANDIDATES_BY_WARD = ('SELECT cluster_id, centroid, members, lat, lon FROM clusters '
+                             'WHERE ward = ? AND expires_at > ?')
+_SELECT_BY_CELLS = ('SELECT cluster_id, centroid, members, lat, lon FROM clusters '
+                    'WHERE geocell IN ({}) AND expires_at > ?')
+# Statements for 1..CELL_STATEMENT_MAX cells are built once and reused.
+CELL_STATEMENT_MAX = 64
+_CELL_STATEMENTS = [_SELECT_BY_CELLS.format(", ".join("?" * n)) for n in range(CELL_STATEMENT_MAX + 1)]
+
+
+def select_candidates_by_cells(n_cells: int) -> str:
+    if n_cells <= CELL_STATEMENT_MAX:
+        return _CELL_STATEMENTS[n_cells]
+    return _SELECT_BY_CELLS.format(", ".join("?" * n_cells))
+
+
+# members is only ever incremented in SQL, never written back from Python,
+# so concurrent merges cannot lose counts.
+SELECT_TOKEN_COUNTS = 'SELECT token_counts FROM clusters WHERE cluster_id = ?'
+# A new member can only push the expiry later.
+UPDATE_CLUSTER = ('UPDATE clusters SET centroid = ?, token_counts = ?, members = members + 1, updated_at = ?, '
+                  'expires_at = MAX(expires_at, ?) '
+                  'WHERE cluster_id = ? RETURNING members')
+INSERT_CLUSTER = ('INSERT INTO clusters '
+                  '(cluster_id, ward, geocell, lat, lon, centroid, token_counts, members, created_at, updated_at, '
+                  'expires_at) '
+                  'VALUES (?, ?, ?, ?, ?, ?, ?, 1, ?, ?, ?) '
+                  'ON CONFLICT (cluster_id) DO UPDATE SET members = members + 1, updated_at = excluded.updated_at, '
+                  'expires_at = MAX(expires_at, excluded.expires_at) '
+                  'RETURNING members')
+# Write-behind from the in-memory ClusterIndex, which owns the cluster state
+# in that mode: the latest row of each changed cluster is written as is.
+# members is the number of members added since the last write, not a total.
+UPSERT_CLUSTER = (f'INSERT INTO clusters ({CLUSTER_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) '
+                  'ON CONFLICT (cluster_id) DO UPDATE SET centroid = excluded.centroid, '
+                  'token_counts = excluded.token_counts, members = members + excluded.members, '
+                  'updated_at = excluded.updated_at, expires_at = excluded.expires_at')
+SELECT_ACTIVE_CLUSTERS = f'SELECT {CLUSTER_COLUMNS} FROM clusters WHERE expires_at > ?'
+# Clusters with members added after a snapshot's watermark, to catch up on.
+SELECT_CHANGED_CLUSTERS = (f'SELECT {CLUSTER_COLUMNS} FROM clusters WHERE cluster_id IN '
+                           '(SELECT cluster_id FROM cluster_members WHERE rowid > ?)')
+SELECT_MEMBER_WATERMARK = 'SELECT IFNULL(MAX(rowid), 0) FROM cluster_members'
+ARCHIVE_EXPIRED = (f'INSERT INTO clusters_archive ({CLUSTER_COLUMNS}, archived_at) '
+                   f'SELECT {CLUSTER_COLUMNS}, ? FROM clusters WHERE expires_at <= ?')
+DELETE_EXPIRED = 'DELETE FROM clusters WHERE expires_at <= ?'
+INSERT_PHOTO_HASH = 'INSERT INTO photo_hashes (phash, case_id, cluster_id, ts) VALUES (?, ?, ?, ?)'
+SELECT_PHOTO_HASHES = 'SELECT phash, case_id FROM photo_hashes ORDER BY rowid'
+INSERT_MEMBER = ('INSERT INTO cluster_members (cluster_id, case_id, summary, lat, lon, ts) '
+                 'VALUES (?, ?, ?, ?, ?, ?)')
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",
+    "PRAGMA mmap_size=268435456",
+)
+
+_RETRYABLE = ("locked", "busy")
+
+
+def encode_centroid(tokens) -> str:
+    """Centroid tokens as one space-separated string (tokens never contain whitespace)."""
+    return " ".join(tokens)
+
+
+def decode_centroid(value: Optional[str]) -> set:
+    if not value:
+        return set()
+    if value[0] == "[":
+        # Rows written before the compact format stored a JSON list.
+        return set(json.loads(value))
+    return set(value.split())
+
+
+def decode_token_counts(centroid: Optional[str], counts: Optional[str]) -> Dict[str, int]:
+    """
+    Per-token frequencies of a cluster. token_counts holds one integer per
+    centroid token, in centroid order; rows without it count each token once.
+    """
+    if centroid and centroid[0] == "[":
+        tokens = json.loads(centroid)
+    else:
+        tokens = centroid.split() if centroid else []
+    values = counts.split() if counts else []
+    if len(values) != len(tokens):
+        return {tok: 1 for tok in tokens}
+    return {tok: int(n) for tok, n in zip(tokens, values)}
+
+
+def count_tokens(counts: Dict[str, int], tokens: Iterable[str], max_tokens: int) -> None:
+    """
+    Count one member's tokens into counts, in place, keeping at most
+    max_tokens entries (Space-Saving): once full, a new token takes over the
+    lowest-ranked least frequent entry with that entry's count plus one, so
+    vocabulary that keeps recurring can overtake the established tokens.
+    """
+    for tok in sorted(tokens):
+        if tok in counts:
+            counts[tok] += 1
+        elif max_tokens <= 0 or len(counts) < max_tokens:
+            counts[tok] = 1
+        else:
+            floor = min(counts.values())
+            evicted = [t for t, n in counts.items() if n == floor][-1]
+            del counts[evicted]
+            counts[tok] = floor + 1
+
+
+def rank_tokens(counts: Dict[str, int], max_tokens: int) -> List[Tuple[str, int]]:
+    """
+    The max_tokens most frequent (token, count) pairs, most frequent first.
+    Ties keep insertion order, so established tokens outrank newcomers.
+    """
+    ranked = sorted(counts.items(), key=lambda kv: -kv[1])
+    if max_tokens > 0:
+        ranked = ranked[:max_tokens]
+    return ranked
+
+
+def top_tokens(counts: Dict[str, int], max_tokens: int) -> Tuple[str, str]:
+    """Encode the max_tokens most frequent tokens as (centroid, token_counts)."""
+    ranked = rank_tokens(counts, max_tokens)
+    return " ".join(tok for tok, _ in ranked), " ".join(str(n) for _, n in ranked)
+
+
+class ClusterStoreError(Exception):
+    """A cluster store operation failed after exhausting its retries."""
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter for transient SQLite lock errors."""
+
+    def __init__(self, attempts: int = 5, base_delay: float = 0.05, max_delay: float = 1.0):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def is_retryable(exc: sqlite3.OperationalError) -> bool:
+        msg = str(exc).lower()
+        return any(word in msg for word in _RETRYABLE)
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+    def run(self, fn: Callable[[], T], what: str = "operation") -> T:
+        for attempt in range(self.attempts):
+            try:
+                return fn()
+            except sqlite3.OperationalError as e:
+                if not self.is_retryable(e):
+                    raise
+                if attempt == self.attempts - 1:
+                    metrics.SQLITE_RETRY_FAILURES.inc(what)
+                    raise ClusterStoreError(f"{what} failed after {self.attempts} attempts: {e}") from e
+                wait = self.delay(attempt)
+                metrics.SQLITE_RETRIES.inc(what)
+                metrics.SQLITE_RETRY_WAIT.inc(what, amount=wait)
+                logger.warning(f"Cluster store {what} hit '{e}', retrying in {wait:.3f}s")
+                time.sleep(wait)
+        raise AssertionError("unreachable")
+
+
+class ClusterStore:
+    """
+    SQLite access layer for the cluster tables.
+
+    Connections are opened lazily up to pool_size, configured once for WAL
+    and reused across requests. Writes go through run_in_transaction, which
+    takes the write lock up front with BEGIN IMMEDIATE and retries the whole
+    transaction under the retry policy, so a transaction is either applied
+    completely or reported as a ClusterStoreError.
+    """
+
+    def __init__(self, path: str, pool_size: int = 4, busy_timeout_ms: int = 5000,
+                 retry: Optional[RetryPolicy] = None):
+        self.path = path
+        self.pool_size = max(1, pool_size)
+        self.busy_timeout_ms = busy_timeout_ms
+        self.retry = retry or RetryPolicy()
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            self.path,
+            timeout=self.busy_timeout_ms / 1000.0,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=128,
+        )
+        conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self) -> sqlite3.Connection:
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.pool_size:
+                self._created += 1
+                try:
+                    return self._connect()
+                except Exception:
+                    self._created -= 1
+                    raise
+        return self._pool.get()
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        if not self._schema_ready:
+            self.init_schema()
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            self._pool.put(conn)
+
+    def init_schema(self) -> None:
+        with self._lock:
+            if self._schema_ready:
+                return
+            conn = self._connect()
+            try:
+                self.retry.run(lambda: self._create_schema(conn), "schema init")
+            finally:
+                conn.close()
+            self._schema_ready = True
+
+    @staticmethod
+    def _create_schema(conn: sqlite3.Connection) -> None:
+        conn.execute(CREATE_CLUSTERS)
+        conn.execute(CREATE_CLUSTER_MEMBERS)
+        conn.execute(CREATE_PHOTO_HASHES)
+        conn.execute(CREATE_CLUSTERS_ARCHIVE)
+        for table, column, stmt in MIGRATIONS:
+            existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+            if column not in existing:
+                conn.execute(stmt)
+        for stmt in CREATE_INDEXES:
+            conn.execute(stmt)
+
+    def run_in_transaction(self, fn: Callable[[sqlite3.Cursor], T], what: str = "transaction") -> T:
+        """Run fn(cursor) inside BEGIN IMMEDIATE ... COMMIT, retrying on lock errors."""
+        def attempt() -> T:
+            with self.connection() as conn:
+                # Includes busy_timeout waits for the write lock.
+                with metrics.stage("db_lock_wait"):
+                    conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+                try:
+                    result = fn(cursor)
+                    # Finalise any half-read statement (e.g. RETURNING) so COMMIT can run.
+                    cursor.close()
+                    with metrics.stage("db_commit"):
+                        conn.execute("COMMIT")
+                except BaseException:
+                    conn.rollback()
+                    raise
+                return result
+        return self.retry.run(attempt, what)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
@@ -0,0 +1,84 @@
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Work classes and their default pool sizes. Each class gets its own bounded
+# pool so a backlog of PDF renders cannot starve dedupe/score traffic.
+#   cpu  - dedupe, score, route scoring loops
+#   db   - cluster store reads and writes
+#   pdf  - pack JSON writes and PDF rendering
+POOL_DEFAULTS = {"cpu": 4, "db": 4, "pdf": 2}
+
+_pools: Dict[str, ThreadPoolExecutor] = {}
+_lock = threading.Lock()
+
+
+def pool_size(kind: str) -> int:
+    default = POOL_DEFAULTS.get(kind, 4)
+    try:
+        return max(1, int(os.environ.get(f"{kind.upper()}_POOL_SIZE", str(default))))
+    except ValueError:
+        return default
+
+
+def get_pool(kind: str) -> ThreadPoolExecutor:
+    pool = _pools.get(kind)
+    if pool is None:
+        with _lock:
+            pool = _pools.get(kind)
+            if pool is None:
+                pool = ThreadPoolExecutor(max_workers=pool_size(kind), thread_name_prefix=f"{kind}-pool")
+                _pools[kind] = pool
+    return pool
+
+
+async def run_in_pool(kind: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run a blocking fn on the bounded pool for this work class."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_pool(kind), functools.partial(fn, *args, **kwargs))
+
+
+def shutdown(wait: bool = True) -> None:
+    with _lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(wait=wait)
+
+
+_http_client = None
+_http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def http_client():
+    """
+    Shared httpx.AsyncClient for outbound calls. Created on first use and
+    bound to the running event loop; a new loop (e.g. in tests) gets a new
+    client.
+    """
+    global _http_client, _http_client_loop
+    import httpx
+
+    loop = asyncio.get_running_loop()
+    if _http_client is None or _http_client_loop is not loop or _http_client.is_closed:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(float(os.environ.get("HTTP_CLIENT_TIMEOUT", "5.0"))),
+            limits=httpx.Limits(
+                max_connections=int(os.environ.get("HTTP_CLIENT_MAX_CONNECTIONS", "20")),
+                max_keepalive_connections=int(os.environ.get("HTTP_CLIENT_MAX_KEEPALIVE", "10")),
+            ),
+        )
+        _http_client_loop = loop
+    return _http_client
+
+
+async def close_http_client() -> None:
+    global _http_client, _http_client_loop
+    client, _http_client, _http_client_loop = _http_client, None, None
+    if client is not None and not client.is_closed:
+        await client.aclose()
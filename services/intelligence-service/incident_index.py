@@ -0,0 +1,193 @@
+import math
+from array import array
+from typing import Callable, Dict, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+import textsim
+import time_window
+from scoring import TokenMatrix
+
+# Grid cells per degree. get_geocell uses 3000 (~37 m) for clusters; the
+# dedupe radius is 300 m, so a coarser grid keeps the neighbourhood small.
+GRID_SCALE = 300
+EARTH_RADIUS_KM = 6371.0
+# Widen the search box slightly so float rounding never drops a candidate
+# that sits exactly on the radius.
+_BOX_MARGIN = 1.01
+
+
+def grid_cell(lat: float, lon: float, scale: int = GRID_SCALE) -> Tuple[int, int]:
+    return (math.floor(lat * scale), math.floor(lon * scale))
+
+
+def bounding_cells(lat: float, lon: float, radius_km: float,
+                   scale: int = GRID_SCALE) -> Optional[Tuple[int, int, int, int]]:
+    """
+    (row_lo, row_hi, col_lo, col_hi) of the grid cells covering every point
+    within radius_km of (lat, lon), or None near the poles or the
+    antimeridian where a simple cell range does not cover the circle.
+    """
+    dlat = math.degrees(radius_km / EARTH_RADIUS_KM) * _BOX_MARGIN
+    lat_lo, lat_hi = lat - dlat, lat + dlat
+    if lat_lo <= -90.0 or lat_hi >= 90.0:
+        return None
+
+    # Longitude half-width of a spherical cap at this latitude.
+    ang = radius_km / EARTH_RADIUS_KM
+    cos_lat = math.cos(math.radians(lat))
+    ratio = math.sin(ang) / cos_lat if cos_lat > 0 else 2.0
+    if ratio >= 1.0:
+        return None
+    dlon = math.degrees(math.asin(ratio)) * _BOX_MARGIN
+    lon_lo, lon_hi = lon - dlon, lon + dlon
+    if lon_lo <= -180.0 or lon_hi >= 180.0:
+        return None
+
+    row_lo, col_lo = grid_cell(lat_lo, lon_lo, scale)
+    row_hi, col_hi = grid_cell(lat_hi, lon_hi, scale)
+    return row_lo, row_hi, col_lo, col_hi
+
+
+def _coord(value) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return math.nan
+
+
+class IncidentIndex:
+    """
+    Immutable, compact view of the canonical incidents plus candidate lookup.
+
+    Incidents are stored column-wise: ids, pre-tokenized summaries as
+    frozensets of interned strings, and lat/lon in float arrays (NaN when an
+    incident has no usable coordinates). A token -> positions posting list
+    and a lat/lon grid answer candidate queries. Positions follow corpus
+    order, so callers scanning candidates keep the tie-breaking of a full
+    scan.
+
+    With lsh_bands > 0, text candidates come from a MinHash LSH index
+    instead of the posting lists: near-duplicates only, rather than every
+    incident sharing any token.
+
+    Each incident also has an expiry (epoch seconds, inf for never; see
+    time_window). Queries made at a given time skip expired incidents, and
+    active() builds the smaller index the expiry sweep publishes.
+    """
+
+    def __init__(self, ids: Sequence[str], tokens: Sequence[FrozenSet[str]],
+                 lats: Sequence[float], lons: Sequence[float],
+                 version: int = 0, scale: int = GRID_SCALE,
+                 lsh_bands: int = 0, lsh_rows: int = textsim.LSH_ROWS,
+                 expires: Optional[Sequence[float]] = None):
+        self.ids: Tuple[str, ...] = tuple(ids)
+        self.tokens: Tuple[FrozenSet[str], ...] = tuple(tokens)
+        self.lats = array("d", lats)
+        self.lons = array("d", lons)
+        self.expires = array("d", expires if expires is not None else [time_window.NEVER] * len(self.ids))
+        # Earliest expiry; queries before it need no time filter at all.
+        self.next_expiry = min(self.expires, default=time_window.NEVER)
+        self.version = version
+        self.scale = scale
+        self.lsh_bands = lsh_bands
+        self.lsh_rows = lsh_rows
+        self.postings: Dict[str, List[int]] = {}
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        self._geo_positions: List[int] = []
+
+        for pos, toks in enumerate(self.tokens):
+            for tok in toks:
+                self.postings.setdefault(tok, []).append(pos)
+            lat, lon = self.lats[pos], self.lons[pos]
+            if math.isfinite(lat) and math.isfinite(lon):
+                self.cells.setdefault(grid_cell(lat, lon, scale), []).append(pos)
+                self._geo_positions.append(pos)
+        self.matrix = TokenMatrix(self.postings, [len(t) for t in self.tokens])
+        self.lsh: Optional[textsim.LSHIndex] = None
+        if lsh_bands > 0:
+            self.lsh = textsim.LSHIndex(lsh_bands, lsh_rows)
+            self.lsh.add_many(range(len(self.tokens)), self.tokens)
+
+    @classmethod
+    def from_incidents(cls, incidents: Iterable[Dict], tokenizer: Callable[[str], Set[str]],
+                       version: int = 0, scale: int = GRID_SCALE,
+                       lsh_bands: int = 0, lsh_rows: int = textsim.LSH_ROWS,
+                       window: Optional[time_window.TimeWindow] = None) -> "IncidentIndex":
+        """
+        Index incident dicts. With a window, each incident expires per its
+        category and optional created_at.
+        """
+        ids, tokens, lats, lons, expires = [], [], [], [], []
+        intern = textsim.TOKENS.intern
+        for inc in incidents:
+            ids.append(str(inc["id"]))
+            tokens.append(frozenset(intern(t) for t in tokenizer(inc.get("summary") or "")))
+            lats.append(_coord(inc.get("lat")))
+            lons.append(_coord(inc.get("lon")))
+            if window is not None:
+                expires.append(window.expires_at(time_window.parse_timestamp(inc.get("created_at")),
+                                                 inc.get("category")))
+        return cls(ids, tokens, lats, lons, version=version, scale=scale,
+                   lsh_bands=lsh_bands, lsh_rows=lsh_rows, expires=expires if window is not None else None)
+
+    def active(self, at: float, version: int) -> "IncidentIndex":
+        """A new index holding only the incidents still active at time at."""
+        keep = [pos for pos, exp in enumerate(self.expires) if exp > at]
+        return IncidentIndex(
+            [self.ids[p] for p in keep], [self.tokens[p] for p in keep],
+            [self.lats[p] for p in keep], [self.lons[p] for p in keep],
+            version=version, scale=self.scale, lsh_bands=self.lsh_bands, lsh_rows=self.lsh_rows,
+            expires=[self.expires[p] for p in keep],
+        )
+
+    def expiring_by(self, at: Optional[float]) -> bool:
+        """Whether any incident has expired by time at."""
+        return at is not None and self.next_expiry <= at
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def has_geo(self, pos: int) -> bool:
+        return math.isfinite(self.lats[pos]) and math.isfinite(self.lons[pos])
+
+    def token_candidates(self, tokens: Iterable[str]) -> Set[int]:
+        if self.lsh is not None:
+            return self.lsh.query(tokens)
+        found: Set[int] = set()
+        for tok in tokens:
+            posting = self.postings.get(tok)
+            if posting:
+                found.update(posting)
+        return found
+
+    def geo_candidates(self, lat: float, lon: float, radius_km: float) -> Set[int]:
+        """Positions of incidents in grid cells overlapping a radius_km box."""
+        if not (math.isfinite(lat) and math.isfinite(lon)):
+            return set()
+        box = bounding_cells(lat, lon, radius_km, self.scale)
+        if box is None:
+            return set(self._geo_positions)
+        row_lo, row_hi, col_lo, col_hi = box
+        found: Set[int] = set()
+        for row in range(row_lo, row_hi + 1):
+            for col in range(col_lo, col_hi + 1):
+                bucket = self.cells.get((row, col))
+                if bucket:
+                    found.update(bucket)
+        return found
+
+    def candidates(self, tokens: Iterable[str], lat: Optional[float] = None,
+                   lon: Optional[float] = None, radius_km: float = 0.0,
+                   at: Optional[float] = None) -> List[int]:
+        """
+        Positions that share a token with the query (or, with LSH, are
+        likely near-duplicates of it) or lie within radius_km, in corpus
+        order. Anything else scores zero against the query. With at, only
+        incidents still active at that time are returned.
+        """
+        found = self.token_candidates(tokens)
+        if lat is not None and lon is not None and radius_km > 0:
+            found |= self.geo_candidates(lat, lon, radius_km)
+        if self.expiring_by(at):
+            expires = self.expires
+            return sorted(pos for pos in found if expires[pos] > at)
+        return sorted(found)
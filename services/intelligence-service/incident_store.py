@@ -0,0 +1,208 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from incident_index import IncidentIndex
+from time_window import TimeWindow
+
+logger = logging.getLogger("intelligence-service")
+
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+# Read from a SQLite source when the table has them.
+OPTIONAL_COLUMNS = ("created_at", "category")
+
+
+def _is_sqlite_source(source: str) -> bool:
+    return source.startswith("sqlite:") or source.lower().endswith(SQLITE_SUFFIXES)
+
+
+def _sqlite_path(source: str) -> str:
+    if source.startswith("sqlite:///"):
+        return source[len("sqlite:///"):]
+    if source.startswith("sqlite:"):
+        return source[len("sqlite:"):]
+    return source
+
+
+def load_incidents(source: str, table: str = "canonical_incidents") -> List[Dict]:
+    """
+    Read canonical incidents from a JSON file, a JSON-lines file or a SQLite
+    table with columns (id, summary, lat, lon) and optionally created_at
+    and category.
+    """
+    if _is_sqlite_source(source):
+        conn = sqlite3.connect(f"file:{_sqlite_path(source)}?mode=ro", uri=True, timeout=10.0)
+        try:
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')}
+            columns = ["id", "summary", "lat", "lon"] + [c for c in OPTIONAL_COLUMNS if c in existing]
+            rows = conn.execute(f'SELECT {", ".join(columns)} FROM "{table}" ORDER BY rowid').fetchall()
+        finally:
+            conn.close()
+        return [dict(zip(columns, r)) for r in rows]
+
+    with open(source, "r", encoding="utf-8") as f:
+        if source.lower().endswith(".jsonl"):
+            return [json.loads(line) for line in f if line.strip()]
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get("incidents", [])
+    if not isinstance(data, list):
+        raise ValueError(f"{source}: expected a list of incidents")
+    return data
+
+
+class IncidentStore:
+    """
+    In-memory canonical incident corpus.
+
+    The current corpus is an immutable IncidentIndex; reloads build a new
+    one off to the side and publish it with a single reference swap, so a
+    request that grabbed snapshot() keeps a consistent view for its whole
+    lifetime. If nothing has been published yet, the first snapshot() loads
+    the corpus; startup normally does this ahead of traffic through
+    ensure_loaded(). With a source configured, a daemon thread polls the
+    source's modification time and reloads when it changes.
+
+    With a time window, incidents expire per their category and created_at;
+    evict_expired() republishes the corpus without the expired ones.
+    """
+
+    def __init__(self, tokenizer: Callable[[str], Set[str]], source: Optional[str] = None,
+                 default: Optional[List[Dict]] = None, table: str = "canonical_incidents",
+                 lsh_bands: int = 0, lsh_rows: int = 0, window: Optional[TimeWindow] = None):
+        self.tokenizer = tokenizer
+        # Passed to IncidentIndex; lsh_bands > 0 builds its LSH candidate index.
+        self.lsh_bands = lsh_bands
+        self.lsh_rows = lsh_rows
+        self.window = window
+        self.source = source or None
+        self.default = list(default or [])
+        self.table = table
+        self._version = 0
+        self._stamp: Optional[Tuple] = None
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        self._loaded = False
+        self._watcher: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._listeners: List[Callable[[IncidentIndex], None]] = []
+        self._snapshot = IncidentIndex.from_incidents([], tokenizer)
+
+    def snapshot(self) -> IncidentIndex:
+        if not self._loaded:
+            self.ensure_loaded()
+        return self._snapshot
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> IncidentIndex:
+        """Load the corpus unless something has already been published."""
+        with self._load_lock:
+            if not self._loaded:
+                self.load()
+        return self._snapshot
+
+    @property
+    def version(self) -> int:
+        return self.snapshot().version
+
+    def add_listener(self, fn: Callable[[IncidentIndex], None]) -> None:
+        """Call fn(new_index) after every publish, e.g. to drop cached results."""
+        self._listeners.append(fn)
+
+    def publish(self, incidents: List[Dict]) -> IncidentIndex:
+        """Index the given incidents and make them the live corpus."""
+        with self._lock:
+            self._version += 1
+            index = IncidentIndex.from_incidents(incidents, self.tokenizer, version=self._version,
+                                                 lsh_bands=self.lsh_bands, lsh_rows=self.lsh_rows,
+                                                 window=self.window)
+            now = time.time()
+            if index.expiring_by(now):
+                index = index.active(now, self._version)
+            self._snapshot = index
+            self._loaded = True
+        for fn in self._listeners:
+            fn(index)
+        return index
+
+    def evict_expired(self, now: Optional[float] = None) -> int:
+        """Republish without incidents expired by now; returns how many were dropped."""
+        if not self._loaded:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            current = self._snapshot
+            if not current.expiring_by(now):
+                return 0
+            self._version += 1
+            index = current.active(now, self._version)
+            self._snapshot = index
+        for fn in self._listeners:
+            fn(index)
+        evicted = len(current) - len(index)
+        logger.info(f"Evicted {evicted} expired canonical incidents (version {index.version})")
+        return evicted
+
+    def _source_stamp(self) -> Optional[Tuple]:
+        if not self.source:
+            return None
+        path = _sqlite_path(self.source) if _is_sqlite_source(self.source) else self.source
+        stamp = []
+        for p in (path, path + "-wal"):
+            try:
+                st = os.stat(p)
+                stamp.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                stamp.append(None)
+        return tuple(stamp)
+
+    def load(self) -> IncidentIndex:
+        """(Re)load from the configured source, or the built-in default."""
+        if not self.source:
+            return self.publish(self.default)
+        stamp = self._source_stamp()
+        incidents = load_incidents(self.source, self.table)
+        index = self.publish(incidents)
+        self._stamp = stamp
+        logger.info(f"Loaded {len(index)} canonical incidents from {self.source} (version {index.version})")
+        return index
+
+    def reload_if_changed(self) -> bool:
+        if not self.source:
+            return False
+        stamp = self._source_stamp()
+        if stamp == self._stamp:
+            return False
+        try:
+            self.load()
+        except Exception as e:
+            # Keep serving the previous corpus; retry on the next change.
+            self._stamp = stamp
+            logger.error(f"Canonical incident reload from {self.source} failed: {e}")
+            return False
+        return True
+
+    def start_watcher(self, interval: float) -> None:
+        if not self.source or interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def _watch():
+            while not self._stop.wait(interval):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=_watch, name="incident-store-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5.0)
+            self._watcher = None
@@ -1,24 +1,38 @@
+import asyncio
 import os
-import time
-import uuid
 import logging
-import json
-import re
 from datetime import datetime, timezone
 from typing import Optional
 
-from fastapi import FastAPI, Request, HTTPException, Depends, status
+from fastapi import FastAPI, Request, HTTPException, Depends, Path, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.exceptions import RequestValidationError
 
+import bulk_pack
+import executors
+import metrics
 import schemas
 import services
+import warmup
+from cluster_store import ClusterStoreError
+from fast_json import FastJSONResponse, FastJSONRoute
+from middleware import RequestMiddleware
 
 # --- Configuration ---
 LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
 API_KEY = os.environ.get("API_KEY")
 CORS_ALLOW_ORIGINS = os.environ.get("CORS_ALLOW_ORIGINS", "*").split(",")
+CANONICAL_RELOAD_INTERVAL = float(os.environ.get("CANONICAL_RELOAD_INTERVAL", "30"))
+TRACE_HEADER = os.environ.get("TRACE_HEADER", "X-Trace-Id")
+# Fraction of successful requests that get an INFO access log line.
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", "1.0"))
+# Startup warm-up: which steps, and whether startup waits for them
+# ("blocking") or serves /healthz while they run ("background").
+WARMUP_STEPS = warmup.parse_steps(os.environ.get("WARMUP_STEPS"))
+WARMUP_MODE = os.environ.get("WARMUP_MODE", "background").lower()
+if WARMUP_MODE not in ("background", "blocking"):
+    raise ValueError(f"WARMUP_MODE must be 'background' or 'blocking', got {WARMUP_MODE!r}")
 
 # --- Logging Setup ---
 logging.basicConfig(level=LOG_LEVEL)
@@ -28,8 +42,11 @@ logger = logging.getLogger("intelligence-service")
 app = FastAPI(
     title="Intelligence Service API",
     version="1.0.0",
-    description="Helper service for CivicResolve orchestration."
+    description="Helper service for CivicResolve orchestration.",
+    default_response_class=FastJSONResponse,
 )
+# Parse request bodies with the fast JSON parser on every route.
+app.router.route_class = FastJSONRoute
 
 @app.on_event("startup")
 async def startup_event():
@@ -39,78 +56,37 @@ async def startup_event():
         logger.info(f"API_KEY is set: {masked_key}")
     else:
         logger.warning("API_KEY is not set.")
+    services.CANONICAL_STORE.start_watcher(CANONICAL_RELOAD_INTERVAL)
+    services.EXPIRY_SWEEPER.start(services.TIME_WINDOW_SWEEP_INTERVAL)
+    services.CLUSTER_SNAPSHOTTER.start(services.CLUSTER_SNAPSHOT_INTERVAL)
+    if WARMUP_MODE == "blocking":
+        await warmup.run(WARMUP_STEPS)
+    else:
+        app.state.warmup_task = asyncio.create_task(warmup.run(WARMUP_STEPS))
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    task = getattr(app.state, "warmup_task", None)
+    if task is not None and not task.done():
+        task.cancel()
+    services.CANONICAL_STORE.stop_watcher()
+    services.EXPIRY_SWEEPER.stop()
+    await executors.close_http_client()
+    executors.shutdown(wait=False)
+    services.close_cluster_index()
+    services.CLUSTER_STORE.close()
 
 # --- Middleware ---
-# Note: Middleware is added LIFO. The last added middleware is the first to execute.
-# We want: CORS -> Logging -> Path Normalization -> Auth -> App
-# So we add in order: Auth, then Normalization, then Logging, then CORS.
-
-@app.middleware("http")
-async def auth_middleware(request: Request, call_next):
-    # Fix B: Allow OPTIONS (CORS preflight) without API key
-    if request.method == "OPTIONS":
-        return await call_next(request)
-
-    # Skip auth for health and version
-    # Normalize path to ignore trailing slash if needed, but standardizing on strict for now
-    path = request.url.path.rstrip("/")
-    if path in ["/healthz", "/version"] or request.url.path in ["/healthz", "/version"]:
-        return await call_next(request)
-    
-    if API_KEY:
-        x_api_key = request.headers.get("X-API-Key")
-        if x_api_key != API_KEY:
-            return JSONResponse(
-                status_code=status.HTTP_403_FORBIDDEN,
-                content={"detail": "Invalid or missing API Key"}
-            )
-            
-    return await call_next(request)
-
-@app.middleware("http")
-async def normalize_path_middleware(request: Request, call_next):
-    # Fix A: Normalize double slashes
-    if "//" in request.url.path:
-        request.scope["path"] = re.sub('/+', '/', request.url.path)
-    return await call_next(request)
-
-@app.middleware("http")
-async def structured_logging_middleware(request: Request, call_next):
-    trace_id = str(uuid.uuid4())
-    request.state.trace_id = trace_id
-    
-    start_time = time.time()
-    
-    try:
-        response = await call_next(request)
-        process_time_ms = round((time.time() - start_time) * 1000, 2)
-        
-        log_entry = {
-            "trace_id": trace_id,
-            "method": request.method,
-            "path": request.url.path,
-            "status": response.status_code,
-            "latency_ms": process_time_ms
-        }
-        logger.info(json.dumps(log_entry))
-        return response
-        
-    except Exception as e:
-        process_time_ms = round((time.time() - start_time) * 1000, 2)
-        log_entry = {
-            "trace_id": trace_id,
-            "method": request.method,
-            "path": request.url.path,
-            "status": 500,
-            "latency_ms": process_time_ms,
-            "error": str(e)
-        }
-        logger.error(json.dumps(log_entry))
-        return JSONResponse(
-            status_code=500,
-            content={"error": "Internal Server Error", "trace_id": trace_id}
-        )
+# Middleware is added LIFO: CORS runs first, then RequestMiddleware
+# (path normalization, trace id, auth, metrics, access log), then the app.
 
+app.add_middleware(
+    RequestMiddleware,
+    api_key=API_KEY,
+    public_paths=("/healthz", "/readyz", "/version"),
+    trace_header=TRACE_HEADER,
+    log_sample_rate=LOG_SAMPLE_RATE,
+)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=CORS_ALLOW_ORIGINS,
@@ -129,11 +105,20 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
     )
 
 # --- Endpoints ---
+# Hot endpoints wrap their result in FastJSONResponse themselves: the
+# services already return the response model, so FastAPI's response_model
+# re-validation and encoding pass is skipped.
 
 @app.get("/healthz")
 async def healthz():
     return {"status": "ok"}
 
+@app.get("/readyz")
+async def readyz():
+    # Liveness stays on /healthz; this only turns 200 once warm-up is done.
+    body = warmup.READINESS.snapshot()
+    return JSONResponse(status_code=200 if warmup.READINESS.ready else 503, content=body)
+
 @app.get("/version")
 async def version():
     return {
@@ -141,17 +126,42 @@ async def version():
         "build_time": datetime.now(timezone.utc).isoformat()
     }
 
+@app.get("/stats")
+async def stats():
+    return {
+        "result_cache": services.cache_stats(),
+        "pack_jobs": services.PACK_JOBS.stats(),
+    }
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return Response(content=metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.post("/dedupe", response_model=schemas.DedupeRes)
 async def dedupe(req: schemas.DedupeReq):
-    return services.dedupe_mepp(req.mepp)
+    return FastJSONResponse(await executors.run_in_pool("cpu", services.dedupe_mepp, req.mepp))
+
+@app.post("/dedupe/batch", response_model=schemas.DedupeBatchRes)
+async def dedupe_batch(req: schemas.DedupeBatchReq):
+    return FastJSONResponse(schemas.DedupeBatchRes(results=await executors.run_in_pool("cpu", services.dedupe_batch, req.mepps)))
 
 @app.post("/score", response_model=schemas.ScoreRes)
 async def score(req: schemas.ScoreReq):
-    return services.score_credibility(req.mepp)
+    return FastJSONResponse(await executors.run_in_pool(
+        "cpu", services.score_credibility, req.mepp, dedupe_similarity=req.dedupe_similarity
+    ))
+
+@app.post("/score/batch", response_model=schemas.ScoreBatchRes)
+async def score_batch(req: schemas.ScoreBatchReq):
+    return FastJSONResponse(schemas.ScoreBatchRes(results=await executors.run_in_pool("cpu", services.score_batch, req.mepps)))
 
 @app.post("/route", response_model=schemas.RouteRes)
 async def route(req: schemas.RouteReq):
-    return services.route_mepp(req.mepp)
+    return FastJSONResponse(services.route_mepp(req.mepp))
+
+@app.post("/route/batch", response_model=schemas.RouteBatchRes)
+async def route_batch(req: schemas.RouteBatchReq):
+    return FastJSONResponse(schemas.RouteBatchRes(results=await executors.run_in_pool("cpu", services.route_batch, req.mepps)))
 
 @app.get("/simulate_ulb_status", response_model=schemas.StatusRes)
 async def simulate_ulb_status(ticket_id: str):
@@ -159,21 +169,21 @@ async def simulate_ulb_status(ticket_id: str):
     DEPRECATED: simulate_ulb_status has been moved to sla-status-service.
     This endpoint remains for backward compatibility.
     """
-    import os
-    import httpx
-    
     sla_service_url = os.environ.get("SLA_STATUS_SERVICE_URL", "http://localhost:3004")
     try:
-        response = httpx.get(f"{sla_service_url}/status/simulate/{ticket_id}", timeout=5.0)
+        response = await executors.http_client().get(f"{sla_service_url}/status/simulate/{ticket_id}")
         response.raise_for_status()
         data = response.json()
-        return schemas.StatusRes(
+        res = schemas.StatusRes(
             ticket_id=data["ticket_id"],
             status=data["status"],
             updated_at=data["updated_at"]
         )
+        metrics.ULB_STATUS_CALLS.inc("ok")
+        return res
     except Exception as e:
         logger.error(f"Fallback to sla-status-service failed: {e}")
+        metrics.ULB_STATUS_CALLS.inc("fallback")
         # Fallback to dummy data
         from datetime import datetime, timezone
         return schemas.StatusRes(
@@ -185,15 +195,66 @@ async def simulate_ulb_status(ticket_id: str):
 @app.post("/cluster", response_model=schemas.ClusterRes)
 async def cluster(req: schemas.ClusterReq):
     try:
-        return services.cluster_mepp(req.mepp)
+        return FastJSONResponse(await executors.run_in_pool("db", services.cluster_mepp, req.mepp))
+    except ClusterStoreError as e:
+        logger.error(f"/cluster store unavailable: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
     except Exception as e:
         logger.error(f"/cluster error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/cluster/batch", response_model=schemas.ClusterBatchRes)
+async def cluster_batch(req: schemas.ClusterBatchReq):
+    try:
+        return FastJSONResponse(schemas.ClusterBatchRes(results=await executors.run_in_pool("db", services.cluster_batch, req.mepps)))
+    except ClusterStoreError as e:
+        logger.error(f"/cluster/batch store unavailable: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"/cluster/batch error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analyze", response_model=schemas.AnalyzeRes)
+async def analyze(req: schemas.AnalyzeReq):
+    # Clustering holds a DB transaction, so the combined call runs on the db pool.
+    pool = "db" if req.cluster else "cpu"
+    try:
+        return FastJSONResponse(await executors.run_in_pool(pool, services.analyze_mepp, req.mepp, include_cluster=req.cluster))
+    except ClusterStoreError as e:
+        logger.error(f"/analyze store unavailable: {e}")
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except Exception as e:
+        logger.error(f"/analyze error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/pack", response_model=schemas.PackRes)
 async def pack(req: schemas.PackReq):
     try:
-        return services.build_pack(req)
+        return await executors.run_in_pool("pdf", services.submit_pack, req)
     except Exception as e:
         logger.error(f"/pack error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/pack/bulk", response_model=schemas.PackBulkRes)
+async def pack_bulk(req: schemas.PackBulkReq):
+    if len(req.packs) > services.BULK_PACK_MAX_CASES:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"At most {services.BULK_PACK_MAX_CASES} cases per bulk pack")
+
+    def run():
+        packs = []
+        bundle = bulk_pack.build_bulk_pack(req.packs, packs.append)
+        bundle.packs = packs
+        return bundle
+    try:
+        return await executors.run_in_pool("pdf", run)
+    except Exception as e:
+        logger.error(f"/pack/bulk error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/pack/{pack_id}", response_model=schemas.PackStatusRes)
+async def pack_status(pack_id: str = Path(..., pattern=r"^PK-[0-9a-f]{6,64}$")):
+    res = await executors.run_in_pool("cpu", services.pack_status, pack_id)
+    if res is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=f"Unknown pack {pack_id}")
+    return res
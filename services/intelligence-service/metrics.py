@@ -0,0 +1,228 @@
+"""
+In-process metrics in the Prometheus text exposition format.
+
+Counters and histograms keep their values in plain dicts keyed by label
+values behind one lock each, so recording a sample is a dict lookup, a
+bisect and an add. Nothing is formatted until /metrics is scraped. Values
+that already live elsewhere (cache and pack queue stats) are read through
+collector callbacks at scrape time instead of being mirrored.
+"""
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; fine-grained at the low end where most in-process stages sit.
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value) and abs(value) < 1e15:
+        return str(int(value))
+    return repr(float(value))
+
+
+def _format_labels(labels: Iterable[Tuple[str, str]]) -> str:
+    parts = [f'{k}="{_escape(str(v))}"' for k, v in labels]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labelvalues: Tuple) -> Tuple[str, ...]:
+        if len(labelvalues) != len(self.labelnames):
+            raise ValueError(f"{self.name}: expected labels {self.labelnames}, got {labelvalues}")
+        return tuple(str(v) for v in labelvalues)
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labelvalues, amount: float = 1.0) -> None:
+        key = self._key(labelvalues)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, *labelvalues) -> float:
+        with self._lock:
+            return self._values.get(self._key(labelvalues), 0.0)
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = list(self._values.items())
+        return [(self.name + "_total", tuple(zip(self.labelnames, k)), v) for k, v in items]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [per-bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labelvalues) -> None:
+        key = self._key(labelvalues)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0.0] * (len(self.buckets) + 2)
+            row[i] += 1
+            row[-1] += value
+
+    def time(self, *labelvalues) -> "_Timer":
+        return _Timer(self, labelvalues)
+
+    def count(self, *labelvalues) -> int:
+        with self._lock:
+            row = self._values.get(self._key(labelvalues))
+            return int(sum(row[:-1])) if row else 0
+
+    def samples(self) -> List[Sample]:
+        with self._lock:
+            items = [(k, list(row)) for k, row in self._values.items()]
+        out: List[Sample] = []
+        bounds = [_format_value(b) for b in self.buckets] + ["+Inf"]
+        for key, row in items:
+            labels = tuple(zip(self.labelnames, key))
+            cumulative = 0.0
+            for bound, n in zip(bounds, row[:-1]):
+                cumulative += n
+                out.append((self.name + "_bucket", labels + (("le", bound),), cumulative))
+            out.append((self.name + "_count", labels, cumulative))
+            out.append((self.name + "_sum", labels, row[-1]))
+        return out
+
+
+class _Timer:
+    __slots__ = ("histogram", "labelvalues", "start")
+
+    def __init__(self, histogram: Histogram, labelvalues: Tuple):
+        self.histogram = histogram
+        self.labelvalues = labelvalues
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.histogram.observe(time.perf_counter() - self.start, *self.labelvalues)
+
+
+class GaugeCollector(_Metric):
+    """Gauge whose samples come from fn() at scrape time: {label values: value}."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str],
+                 fn: Callable[[], Dict[Tuple, float]]):
+        super().__init__(name, documentation, labelnames)
+        self.fn = fn
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, tuple(zip(self.labelnames, (str(v) for v in k))), float(v))
+                for k, v in self.fn().items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge_collector(self, name: str, documentation: str, labelnames: Sequence[str],
+                        fn: Callable[[], Dict[Tuple, float]]) -> GaugeCollector:
+        return self.register(GaugeCollector(name, documentation, labelnames, fn))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+REQUESTS = REGISTRY.counter(
+    "intelligence_http_requests", "HTTP requests by method, route template and status code.",
+    ("method", "route", "status"),
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "intelligence_http_request_seconds", "HTTP request latency by method and route template.",
+    ("method", "route"),
+)
+STAGE_SECONDS = REGISTRY.histogram(
+    "intelligence_stage_seconds", "Time spent in each processing stage inside a request.",
+    ("stage",),
+)
+SQLITE_RETRIES = REGISTRY.counter(
+    "intelligence_sqlite_retries", "Retried SQLite OperationalErrors (locked/busy) by operation.",
+    ("operation",),
+)
+SQLITE_RETRY_FAILURES = REGISTRY.counter(
+    "intelligence_sqlite_retry_exhausted", "SQLite operations that failed after all retries.",
+    ("operation",),
+)
+SQLITE_RETRY_WAIT = REGISTRY.counter(
+    "intelligence_sqlite_retry_wait_seconds", "Backoff time slept between SQLite retries.",
+    ("operation",),
+)
+WINDOW_EVICTIONS = REGISTRY.counter(
+    "intelligence_window_evictions", "Canonical incidents and clusters dropped by the expiry sweep, by kind.",
+    ("kind",),
+)
+ULB_STATUS_CALLS = REGISTRY.counter(
+    "intelligence_ulb_status_calls", "simulate_ulb_status calls by outcome (ok or fallback).",
+    ("outcome",),
+)
+
+
+def stage(name: str) -> _Timer:
+    """Context manager timing one named stage into STAGE_SECONDS."""
+    return STAGE_SECONDS.time(name)
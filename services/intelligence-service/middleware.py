@@ -0,0 +1,153 @@
+"""
+Single pure-ASGI request middleware: path normalization, API key auth,
+trace ids, request metrics and structured access logs.
+
+This replaces three @app.middleware("http") layers. Those were each a
+BaseHTTPMiddleware, with its own task, Request object and response
+streaming. Here the request scope is handled directly, and the only
+per-request extra is a small send() wrapper that stamps the trace header
+and captures the status code.
+"""
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import time
+from typing import Iterable, Optional
+
+import metrics
+
+logger = logging.getLogger("intelligence-service")
+
+_SLASHES = re.compile("/+")
+# Process-unique prefix plus a counter: unique, and far cheaper than uuid4.
+_TRACE_PREFIX = os.urandom(6).hex()
+_trace_counter = itertools.count(1)
+
+
+def new_trace_id() -> str:
+    return f"{_TRACE_PREFIX}-{next(_trace_counter):08x}"
+
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class RequestMiddleware:
+    """
+    Per request, in order:
+
+    - Collapse repeated slashes in the path.
+    - Take the trace id from trace_header, or mint one. It is stored in
+      request.state.trace_id and echoed on the response.
+    - Reject requests without a valid X-API-Key with 403. OPTIONS and
+      public_paths are exempt.
+    - Record request metrics.
+    - Log one JSON line. Successes are logged at INFO, sampled at
+      log_sample_rate, and skipped entirely when INFO is disabled. Errors
+      are always logged. An unhandled exception becomes a 500 carrying the
+      trace id.
+    """
+
+    def __init__(self, app, api_key: Optional[str] = None,
+                 public_paths: Iterable[str] = ("/healthz", "/version"),
+                 trace_header: str = "X-Trace-Id", log_sample_rate: float = 1.0):
+        self.app = app
+        self.api_key = api_key
+        self.public_paths = frozenset(public_paths)
+        self.trace_header = trace_header.lower().encode("latin-1")
+        self.log_sample_rate = log_sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        path = scope["path"]
+        if "//" in path:
+            path = scope["path"] = _SLASHES.sub("/", path)
+
+        trace_id = _header(scope, self.trace_header) or new_trace_id()
+        scope.setdefault("state", {})["trace_id"] = trace_id
+        trace_header = (self.trace_header, trace_id.encode("latin-1"))
+        status_code = 500
+        response_started = False
+
+        async def send_with_trace(message):
+            nonlocal status_code, response_started
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                response_started = True
+                message["headers"] = list(message.get("headers", [])) + [trace_header]
+            await send(message)
+
+        try:
+            if self._authorized(scope, path):
+                await self.app(scope, receive, send_with_trace)
+            else:
+                await self._send_json(send_with_trace, 403, {"detail": "Invalid or missing API Key"})
+        except Exception as e:
+            elapsed = time.perf_counter() - started
+            self._record(scope, 500, elapsed)
+            logger.error(json.dumps({
+                "trace_id": trace_id,
+                "method": scope["method"],
+                "path": path,
+                "status": 500,
+                "latency_ms": round(elapsed * 1000, 2),
+                "error": str(e),
+            }))
+            if response_started:
+                raise
+            await self._send_json(send_with_trace, 500, {"error": "Internal Server Error", "trace_id": trace_id})
+            return
+
+        elapsed = time.perf_counter() - started
+        self._record(scope, status_code, elapsed)
+        if status_code >= 500:
+            level = logging.ERROR
+        elif logger.isEnabledFor(logging.INFO) and (
+                self.log_sample_rate >= 1.0 or random.random() < self.log_sample_rate):
+            level = logging.INFO
+        else:
+            return
+        logger.log(level, json.dumps({
+            "trace_id": trace_id,
+            "method": scope["method"],
+            "path": path,
+            "status": status_code,
+            "latency_ms": round(elapsed * 1000, 2),
+        }))
+
+    def _authorized(self, scope, path: str) -> bool:
+        if not self.api_key or scope["method"] == "OPTIONS":
+            return True
+        if path in self.public_paths or path.rstrip("/") in self.public_paths:
+            return True
+        return _header(scope, b"x-api-key") == self.api_key
+
+    @staticmethod
+    async def _send_json(send, status_code: int, content: dict) -> None:
+        body = json.dumps(content).encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(b"content-type", b"application/json"),
+                        (b"content-length", str(len(body)).encode("latin-1"))],
+        })
+        await send({"type": "http.response.body", "body": body})
+
+    @staticmethod
+    def _record(scope, status_code: int, elapsed: float) -> None:
+        # Label by route template (/pack/{pack_id}), never the raw path, to
+        # keep the series count bounded.
+        route = scope.get("route")
+        path = getattr(route, "path", None) or "unmatched"
+        metrics.REQUESTS.inc(scope["method"], path, status_code)
+        metrics.REQUEST_SECONDS.observe(elapsed, scope["method"], path)
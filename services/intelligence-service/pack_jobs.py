@@ -0,0 +1,140 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from schemas import PackRes
+
+logger = logging.getLogger("intelligence-service")
+
+QUEUED = "queued"
+RENDERING = "rendering"
+DONE = "done"
+FAILED = "failed"
+
+
+class PackJob:
+    __slots__ = ("pack_id", "result", "status", "error", "submitted_at", "started_at", "finished_at")
+
+    def __init__(self, pack_id: str, result: PackRes, status: str = QUEUED):
+        self.pack_id = pack_id
+        self.result = result
+        self.status = status
+        self.error: Optional[str] = None
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+
+    def response(self) -> PackRes:
+        return self.result.model_copy(update={"status": self.status})
+
+
+class PackJobQueue:
+    """
+    Registry of PDF render jobs keyed by pack_id.
+
+    submit() is idempotent: while a job for a pack_id is queued, rendering
+    or done, resubmitting returns that job instead of rendering again. Only
+    failed jobs are re-run. The most recent max_jobs jobs are remembered.
+
+    prepare() does disk I/O, so it runs outside the lock; a concurrent
+    submit of the same pack_id waits for it instead of preparing twice.
+    """
+
+    def __init__(self, executor_factory: Callable[[], Executor], max_jobs: int = 10000):
+        self.executor_factory = executor_factory
+        self.max_jobs = max(1, max_jobs)
+        self._jobs: "OrderedDict[str, PackJob]" = OrderedDict()
+        self._preparing: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.rendered = 0
+        self.failed = 0
+        self.render_seconds_total = 0.0
+        self.render_seconds_max = 0.0
+
+    def get(self, pack_id: str) -> Optional[PackJob]:
+        with self._lock:
+            return self._jobs.get(pack_id)
+
+    def submit(self, pack_id: str,
+               prepare: Callable[[], Tuple[PackRes, Optional[Callable[[], Any]]]]) -> PackRes:
+        """
+        prepare() writes whatever must exist before returning and gives back
+        (result, render); render is None when the PDF already exists.
+        """
+        while True:
+            with self._lock:
+                job = self._jobs.get(pack_id)
+                if job is not None and job.status != FAILED:
+                    self._jobs.move_to_end(pack_id)
+                    return job.response()
+                preparing = self._preparing.get(pack_id)
+                if preparing is None:
+                    preparing = self._preparing[pack_id] = threading.Event()
+                    break
+            # Another caller is preparing this pack; if it fails, retry.
+            preparing.wait()
+        try:
+            result, render = prepare()
+            job = PackJob(pack_id, result, status=QUEUED if render else DONE)
+            with self._lock:
+                self._jobs[pack_id] = job
+                self._jobs.move_to_end(pack_id)
+                self._trim()
+        finally:
+            with self._lock:
+                del self._preparing[pack_id]
+            preparing.set()
+        if render is not None:
+            self.executor_factory().submit(self._run, job, render)
+        return job.response()
+
+    def _trim(self) -> None:
+        # Drop the oldest finished jobs first; never forget in-flight ones.
+        excess = len(self._jobs) - self.max_jobs
+        if excess <= 0:
+            return
+        for pack_id in [k for k, j in self._jobs.items() if j.status in (DONE, FAILED)][:excess]:
+            del self._jobs[pack_id]
+
+    def _run(self, job: PackJob, render: Callable[[], Any]) -> None:
+        job.status = RENDERING
+        job.started_at = time.monotonic()
+        try:
+            render()
+        except Exception as e:
+            job.error = str(e)
+            job.status = FAILED
+            logger.error(f"Pack {job.pack_id} render failed: {e}")
+        else:
+            job.status = DONE
+        job.finished_at = time.monotonic()
+        elapsed = job.finished_at - job.started_at
+        with self._lock:
+            if job.status == DONE:
+                self.rendered += 1
+            else:
+                self.failed += 1
+            self.render_seconds_total += elapsed
+            self.render_seconds_max = max(self.render_seconds_max, elapsed)
+
+    def depth(self) -> int:
+        with self._lock:
+            return sum(1 for j in self._jobs.values() if j.status in (QUEUED, RENDERING))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            queued = sum(1 for j in self._jobs.values() if j.status == QUEUED)
+            rendering = sum(1 for j in self._jobs.values() if j.status == RENDERING)
+            finished = self.rendered + self.failed
+            return {
+                "queue_depth": queued + rendering,
+                "queued": queued,
+                "rendering": rendering,
+                "rendered": self.rendered,
+                "failed": self.failed,
+                "render_seconds_avg": round(self.render_seconds_total / finished, 4) if finished else 0.0,
+                "render_seconds_max": round(self.render_seconds_max, 4),
+            }
@@ -0,0 +1,55 @@
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+
+class PackStore:
+    """
+    Content-addressed pack storage under a root directory.
+
+    A pack_id is "PK-" plus a prefix of the sha256 of the canonical pack
+    content (bulk bundles use "BP-"), so the same content always maps to the
+    same files. Files are sharded by the leading hex digits of that hash
+    (PK-abcd... lives in ab/cd/) to keep directories small, and every write
+    goes to a temp file in the target directory followed by an atomic
+    rename, so a file that exists is always complete.
+    """
+
+    def __init__(self, root: str, shard_levels: int = 2, shard_width: int = 2):
+        self.root = root
+        self.shard_levels = shard_levels
+        self.shard_width = shard_width
+
+    def shard_dir(self, pack_id: str) -> str:
+        digest = pack_id.split("-", 1)[-1]
+        parts = [digest[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_levels)]
+        return os.path.join(self.root, *parts)
+
+    def paths(self, pack_id: str) -> Tuple[str, str]:
+        base = os.path.join(self.shard_dir(pack_id), pack_id)
+        return f"{base}.json", f"{base}.pdf"
+
+    @contextmanager
+    def atomic_path(self, path: str) -> Iterator[str]:
+        """Yield a temp path next to path; rename it into place on success."""
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.splitext(path)[1])
+        os.close(fd)
+        try:
+            yield tmp_path
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+    def write_bytes(self, path: str, data: bytes) -> None:
+        with self.atomic_path(path) as tmp_path:
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
@@ -0,0 +1,164 @@
+"""
+Near-duplicate lookup over 64-bit perceptual photo hashes.
+
+Multi-index hashing: each hash is split into `chunks` equal slices, and
+each slice value has its own table of entry ids. By pigeonhole, two hashes
+within Hamming distance r agree to within r // chunks bits on at least one
+slice. A query therefore probes every slice value within that many bits of
+its own, then checks the real distance of the few entries found. The cost
+depends on bucket sizes, not on how many hashes are stored.
+"""
+import itertools
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+HASH_BITS = 64
+_HEX_DIGITS = HASH_BITS // 4
+
+
+def parse_phash(value) -> Optional[int]:
+    """
+    A 64-bit perceptual hash from a Photo.hash value: 16 hex digits,
+    optionally prefixed with "0x". Anything else (a SHA-256, a file hash,
+    garbage) is not a perceptual hash and yields None.
+    """
+    if not isinstance(value, str):
+        return None
+    text = value.strip().lower()
+    if text.startswith("0x"):
+        text = text[2:]
+    if len(text) != _HEX_DIGITS:
+        return None
+    try:
+        return int(text, 16)
+    except ValueError:
+        return None
+
+
+def to_signed(phash: int) -> int:
+    """SQLite INTEGER is signed 64-bit."""
+    return phash - (1 << HASH_BITS) if phash >= 1 << (HASH_BITS - 1) else phash
+
+
+def from_signed(value: int) -> int:
+    return value & ((1 << HASH_BITS) - 1)
+
+
+class PhotoHashIndex:
+    """
+    Append-only multi-index hash table of (phash, owner) entries, where the
+    owner is the case id that submitted the photo.
+
+    With a loader, the stored entries are read on first use (or by
+    ensure_loaded() during warm-up) and later adds are applied on top.
+    """
+
+    def __init__(self, max_distance: int = 6, chunks: int = 4,
+                 loader: Optional[Callable[[], Iterable[Tuple[int, str]]]] = None):
+        if chunks < 1 or HASH_BITS % chunks:
+            raise ValueError(f"chunks must divide {HASH_BITS}")
+        self.max_distance = max(0, max_distance)
+        self.chunks = chunks
+        self.chunk_bits = HASH_BITS // chunks
+        self._chunk_mask = (1 << self.chunk_bits) - 1
+        self.loader = loader
+        self._loaded = loader is None
+        self.hashes = array("Q")
+        self.owners: List[str] = []
+        self._owner_ids: Dict[str, str] = {}
+        self._tables: List[Dict[int, array]] = [{} for _ in range(chunks)]
+        self._probe_masks = self._masks(self.max_distance // chunks)
+        self._lock = threading.RLock()
+
+    def _masks(self, radius: int) -> Tuple[int, ...]:
+        """XOR masks for every slice value within radius bits, 0 first."""
+        masks = [0]
+        for r in range(1, min(radius, self.chunk_bits) + 1):
+            for bits in itertools.combinations(range(self.chunk_bits), r):
+                masks.append(sum(1 << b for b in bits))
+        return tuple(masks)
+
+    def __len__(self) -> int:
+        return len(self.hashes)
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def ensure_loaded(self) -> "PhotoHashIndex":
+        if self._loaded:
+            return self
+        with self._lock:
+            if not self._loaded:
+                for phash, owner in self.loader():
+                    self._add(phash, owner)
+                self._loaded = True
+        return self
+
+    def _slices(self, phash: int) -> List[int]:
+        bits, mask = self.chunk_bits, self._chunk_mask
+        return [(phash >> (i * bits)) & mask for i in range(self.chunks)]
+
+    def _add(self, phash: int, owner: str) -> None:
+        eid = len(self.hashes)
+        self.hashes.append(phash)
+        # Photos of one case share a single owner string.
+        self.owners.append(self._owner_ids.setdefault(owner, owner))
+        for table, value in zip(self._tables, self._slices(phash)):
+            bucket = table.get(value)
+            if bucket is None:
+                bucket = table[value] = array("I")
+            bucket.append(eid)
+
+    def add(self, phash: int, owner: str) -> None:
+        with self._lock:
+            self._add(phash, owner)
+
+    def add_many(self, entries: Iterable[Tuple[int, str]]) -> None:
+        with self._lock:
+            for phash, owner in entries:
+                self._add(phash, owner)
+
+    def search(self, phash: int, max_distance: Optional[int] = None) -> List[Tuple[int, int]]:
+        """(distance, entry id) of stored hashes within max_distance, nearest first."""
+        self.ensure_loaded()
+        if max_distance is None or max_distance > self.max_distance:
+            max_distance = self.max_distance
+        hashes = self.hashes
+        seen = set()
+        out = []
+        with self._lock:
+            for table, value in zip(self._tables, self._slices(phash)):
+                for mask in self._probe_masks:
+                    bucket = table.get(value ^ mask)
+                    if not bucket:
+                        continue
+                    for eid in bucket:
+                        if eid in seen:
+                            continue
+                        seen.add(eid)
+                        d = (hashes[eid] ^ phash).bit_count()
+                        if d <= max_distance:
+                            out.append((d, eid))
+        out.sort()
+        return out
+
+    def nearest(self, phashes: Sequence[int], exclude_owner: Optional[str] = None) -> Optional[Tuple[str, int]]:
+        """
+        (owner, distance) of the closest stored photo to any of phashes,
+        skipping the querying case's own photos; ties go to the earliest
+        stored entry.
+        """
+        best: Optional[Tuple[int, int]] = None
+        for phash in phashes:
+            for d, eid in self.search(phash):
+                if exclude_owner is not None and self.owners[eid] == exclude_owner:
+                    continue
+                # search() is sorted, so this is phash's nearest entry.
+                if best is None or (d, eid) < best:
+                    best = (d, eid)
+                break
+        if best is None:
+            return None
+        return self.owners[best[1]], best[0]
@@ -0,0 +1,198 @@
+import json
+import re
+from typing import Any, Dict, FrozenSet, List, Optional, Pattern, Set, Tuple
+
+from result_cache import content_key
+
+# Built-in rules, used when ROUTING_RULES_PATH is not set. Rules are tried in
+# order and the first one whose conditions all hold wins; a rule without
+# conditions always matches, so the last one is the catch-all.
+DEFAULT_RULES: List[Dict[str, Any]] = [
+    {
+        "categories": ["sanitation/garbage", "sanitation/drainage"],
+        "wards": ["14"],
+        "dest": "ULB_TIRUPPUR_SANITATION",
+        "confidence": 0.90,
+        "basis": "rule: sanitation+ward14",
+    },
+    {
+        "keywords": ["streetlight", "lamp", "bulb"],
+        "dest": "ULB_ELECTRICAL",
+        "confidence": 0.75,
+        "basis": "rule: streetlight keywords",
+    },
+    {
+        "keywords": ["water", "pipe", "leak"],
+        "dest": "ULB_WATER",
+        "confidence": 0.40,
+        "basis": "fallback: keyword heuristic",
+    },
+    {
+        "keywords": ["road", "pothole", "tar"],
+        "dest": "ULB_ROADS",
+        "confidence": 0.40,
+        "basis": "fallback: keyword heuristic",
+    },
+    {
+        "keywords": ["garbage", "trash", "waste"],
+        "dest": "ULB_TIRUPPUR_SANITATION",
+        "confidence": 0.40,
+        "basis": "fallback: keyword heuristic",
+    },
+    {
+        "dest": "ULB_GENERIC",
+        "confidence": 0.40,
+        "basis": "fallback: keyword heuristic",
+    },
+]
+
+
+class RoutingRule:
+    __slots__ = ("categories", "wards", "keywords", "dest", "confidence", "basis")
+
+    def __init__(self, dest: str, confidence: float, basis: str,
+                 categories: FrozenSet[str] = frozenset(), wards: FrozenSet[str] = frozenset(),
+                 keywords: FrozenSet[str] = frozenset()):
+        self.dest = dest
+        self.confidence = confidence
+        self.basis = basis
+        self.categories = categories
+        self.wards = wards
+        self.keywords = keywords
+
+    @classmethod
+    def from_dict(cls, raw: Dict[str, Any], position: int) -> "RoutingRule":
+        if not isinstance(raw, dict):
+            raise ValueError(f"rule {position}: expected an object")
+        dest = raw.get("dest")
+        if not dest or not isinstance(dest, str):
+            raise ValueError(f"rule {position}: 'dest' is required")
+        try:
+            confidence = float(raw.get("confidence", 0.0))
+        except (TypeError, ValueError):
+            raise ValueError(f"rule {position}: 'confidence' must be a number")
+        if not 0.0 <= confidence <= 1.0:
+            raise ValueError(f"rule {position}: 'confidence' must be between 0 and 1")
+        keywords = frozenset(str(k).lower() for k in raw.get("keywords") or [] if str(k))
+        return cls(
+            dest=dest,
+            confidence=confidence,
+            basis=str(raw.get("basis") or f"rule: {dest}"),
+            categories=frozenset(str(c) for c in raw.get("categories") or []),
+            wards=frozenset(str(w) for w in raw.get("wards") or []),
+            keywords=keywords,
+        )
+
+    def matches(self, category: str, ward: str, found: Set[str]) -> bool:
+        if self.categories and category not in self.categories:
+            return False
+        if self.wards and ward not in self.wards:
+            return False
+        if self.keywords and self.keywords.isdisjoint(found):
+            return False
+        return True
+
+
+def _compile_keywords(keywords: Set[str]) -> Tuple[Optional[Pattern], Dict[str, Tuple[str, ...]]]:
+    """
+    One regex finding every keyword occurrence in a single scan.
+
+    Each alternative sits inside a zero-width lookahead, so the scan tries
+    every start position instead of skipping past a match, and alternatives
+    are ordered longest first so the longest keyword starting at a position
+    is the one reported. Shorter keywords that are prefixes of it start at
+    the same position too; they come from the precomputed prefix closure.
+    """
+    if not keywords:
+        return None, {}
+    ordered = sorted(keywords, key=lambda k: (-len(k), k))
+    pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in ordered) + "))")
+    closure = {k: tuple(p for p in ordered if k.startswith(p)) for k in ordered}
+    return pattern, closure
+
+
+class RuleSet:
+    """
+    Compiled routing rules.
+
+    All keywords across all rules are matched in one regex pass over the
+    summary; rules are then looked up through indexes on keyword, category
+    and ward rather than tried one by one, so the work per request depends
+    on how many rules could apply, not on how many exist. Among the rules
+    whose conditions all hold, the earliest in the configured order wins.
+    """
+
+    def __init__(self, rules: List[RoutingRule]):
+        if not rules:
+            raise ValueError("routing rules: at least one rule is required")
+        self.rules = rules
+        self.version = content_key(
+            [(sorted(r.categories), sorted(r.wards), sorted(r.keywords), r.dest, r.confidence, r.basis)
+             for r in rules]
+        )
+        # Each rule is indexed under its most selective condition; every
+        # rule holding the other conditions too is checked in full.
+        self._by_keyword: Dict[str, List[int]] = {}
+        self._by_category: Dict[str, List[int]] = {}
+        self._by_ward: Dict[str, List[int]] = {}
+        self._always: List[int] = []
+        for i, rule in enumerate(rules):
+            if rule.keywords:
+                for kw in rule.keywords:
+                    self._by_keyword.setdefault(kw, []).append(i)
+            elif rule.categories:
+                for cat in rule.categories:
+                    self._by_category.setdefault(cat, []).append(i)
+            elif rule.wards:
+                for ward in rule.wards:
+                    self._by_ward.setdefault(ward, []).append(i)
+            else:
+                self._always.append(i)
+        self._pattern, self._closure = _compile_keywords(set(self._by_keyword))
+
+    @classmethod
+    def from_config(cls, config: Any) -> "RuleSet":
+        raw_rules = config.get("rules") if isinstance(config, dict) else config
+        if not isinstance(raw_rules, list):
+            raise ValueError("routing rules: expected a list of rules")
+        return cls([RoutingRule.from_dict(r, i) for i, r in enumerate(raw_rules)])
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+    def find_keywords(self, text: str) -> Set[str]:
+        if self._pattern is None or not text:
+            return set()
+        found: Set[str] = set()
+        for m in self._pattern.finditer(text):
+            found.update(self._closure[m.group(1)])
+        return found
+
+    def match(self, category: str, summary: str, ward: str) -> Optional[RoutingRule]:
+        """First rule, in configured order, matching the report; summary must be lower-cased."""
+        found = self.find_keywords(summary)
+        candidates: Set[int] = set(self._always)
+        for kw in found:
+            candidates.update(self._by_keyword[kw])
+        candidates.update(self._by_category.get(category, ()))
+        candidates.update(self._by_ward.get(ward, ()))
+        for i in sorted(candidates):
+            rule = self.rules[i]
+            if rule.matches(category, ward, found):
+                return rule
+        return None
+
+
+def load_rules(path: Optional[str] = None) -> RuleSet:
+    """
+    Load rules from a JSON file (a list of rules, or {"rules": [...]}), or
+    the built-in defaults when no path is given.
+    """
+    if not path:
+        return RuleSet.from_config(DEFAULT_RULES)
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    try:
+        return RuleSet.from_config(config)
+    except ValueError as e:
+        raise ValueError(f"{path}: {e}") from e
@@ -1,5 +1,37 @@
-from typing import Dict, List, Optional
-from pydantic import BaseModel, Field
+import os
+from typing import Any, Dict, List, Optional, Union
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field, PlainValidator, model_serializer
+from pydantic_core import PydanticCustomError
+from typing_extensions import Annotated
+
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", "1000"))
+
+
+def _raw_object(value: Any) -> Dict:
+    if not isinstance(value, dict):
+        raise PydanticCustomError("dict_type", "Input should be a valid dictionary")
+    return value
+
+# A JSON object passed through as-is: only its type is checked, nothing
+# inside it is validated or copied.
+RawDict = Annotated[Dict[str, Any], PlainValidator(_raw_object, json_schema_input_type=Dict[str, Any])]
+
+def _loose_str(value: Any) -> Any:
+    if value is None or isinstance(value, str):
+        return value
+    return str(value)
+
+def _loose_coordinate(value: Any) -> Any:
+    if value is None or isinstance(value, (str, float)) or (isinstance(value, int) and not isinstance(value, bool)):
+        return value
+    return str(value)
+
+# Upstream channels send all sorts of values in these fields, and they were
+# passed through before the sections were typed: anything that is not a
+# string (or a number, for coordinates) becomes its str() instead of a 422.
+LooseStr = Annotated[Optional[str], BeforeValidator(_loose_str)]
+LooseCoordinate = Annotated[Optional[Union[float, str]], BeforeValidator(_loose_coordinate)]
 
 class Photo(BaseModel):
     url: Optional[str] = None
@@ -8,18 +40,53 @@ class Photo(BaseModel):
     exif: Optional[Dict] = None
     captured_at: Optional[str] = None  # ISO-8601
 
+class _OpenSection(BaseModel):
+    """
+    A MEPP section with a few typed fields the services read; any other
+    keys are kept as sent. get() reads it like the dict it replaces, and
+    only fields the client actually sent are serialized, so a round trip
+    reproduces the input.
+    """
+    model_config = ConfigDict(extra="allow")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        if key in self.model_fields_set:
+            return getattr(self, key)
+        extra = self.__pydantic_extra__
+        if extra and key in extra:
+            return extra[key]
+        return default
+
+    @model_serializer(mode="wrap")
+    def _serialize_sent(self, handler):
+        data = handler(self)
+        extra = self.__pydantic_extra__ or {}
+        return {k: v for k, v in data.items() if k in self.model_fields_set or k in extra}
+
+class Issue(_OpenSection):
+    category: LooseStr = None
+    summary: LooseStr = None
+    details: LooseStr = None
+
+class Location(_OpenSection):
+    # Unparseable coordinates are kept and treated as "no geo" downstream.
+    lat: LooseCoordinate = None
+    lon: LooseCoordinate = None
+    ward: LooseStr = None
+    address_text: LooseStr = None
+
 class MEPP(BaseModel):
     version: str = "1.0"
     case_id: Optional[str] = None
     created_at: Optional[str] = None
-    reporter: Dict = Field(default_factory=dict)
-    issue: Dict = Field(default_factory=dict)
-    evidence: Dict = Field(default_factory=dict)
-    location: Dict = Field(default_factory=dict)
-    credibility: Dict = Field(default_factory=dict)
-    routing: Dict = Field(default_factory=dict)
-    sla: Dict = Field(default_factory=dict)
-    provenance: Dict = Field(default_factory=dict)
+    reporter: RawDict = Field(default_factory=dict)
+    issue: Issue = Field(default_factory=Issue)
+    evidence: RawDict = Field(default_factory=dict)
+    location: Location = Field(default_factory=Location)
+    credibility: RawDict = Field(default_factory=dict)
+    routing: RawDict = Field(default_factory=dict)
+    sla: RawDict = Field(default_factory=dict)
+    provenance: RawDict = Field(default_factory=dict)
 
 class DedupeReq(BaseModel):
     mepp: MEPP
@@ -28,14 +95,32 @@ class DedupeRes(BaseModel):
     duplicate_of: Optional[str] = None
     similarity: float = Field(..., ge=0.0, le=1.0)
     distance_km: Optional[float] = None
+    # Earlier report (case_id) with a perceptually matching photo, and the
+    # Hamming distance between the two 64-bit photo hashes.
+    photo_duplicate_of: Optional[str] = None
+    photo_distance: Optional[int] = None
+
+class DedupeBatchReq(BaseModel):
+    mepps: List[MEPP] = Field(..., max_length=BATCH_MAX_ITEMS)
+
+class DedupeBatchRes(BaseModel):
+    results: List[DedupeRes]
 
 class ScoreReq(BaseModel):
     mepp: MEPP
+    # Similarity from an earlier /dedupe call; skips re-running dedupe.
+    dedupe_similarity: Optional[float] = Field(None, ge=0.0, le=1.0)
 
 class ScoreRes(BaseModel):
     score: float = Field(..., ge=0.0, le=1.0)
     hint: str
 
+class ScoreBatchReq(BaseModel):
+    mepps: List[MEPP] = Field(..., max_length=BATCH_MAX_ITEMS)
+
+class ScoreBatchRes(BaseModel):
+    results: List[ScoreRes]
+
 class RouteReq(BaseModel):
     mepp: MEPP
 
@@ -44,6 +129,12 @@ class RouteRes(BaseModel):
     confidence: float = Field(..., ge=0.0, le=1.0)
     basis: List[str]
 
+class RouteBatchReq(BaseModel):
+    mepps: List[MEPP] = Field(..., max_length=BATCH_MAX_ITEMS)
+
+class RouteBatchRes(BaseModel):
+    results: List[RouteRes]
+
 class StatusRes(BaseModel):
     ticket_id: str
     status: str
@@ -59,6 +150,22 @@ class ClusterRes(BaseModel):
     geo_cell: Optional[str] = None
     text_similarity: float
 
+class ClusterBatchReq(BaseModel):
+    mepps: List[MEPP] = Field(..., max_length=BATCH_MAX_ITEMS)
+
+class ClusterBatchRes(BaseModel):
+    results: List[ClusterRes]
+
+class AnalyzeReq(BaseModel):
+    mepp: MEPP
+    cluster: bool = True  # False skips cluster assignment (no DB write)
+
+class AnalyzeRes(BaseModel):
+    dedupe: DedupeRes
+    score: ScoreRes
+    route: RouteRes
+    cluster: Optional[ClusterRes] = None
+
 class PackReq(BaseModel):
     mepp: MEPP
     gating: Dict
@@ -70,3 +177,23 @@ class PackRes(BaseModel):
     json_url: str
     pdf_url: str
     sha256: str
+    status: Optional[str] = None  # PDF render state: queued, rendering, done, failed
+
+class PackBulkReq(BaseModel):
+    packs: List[PackReq] = Field(..., max_length=BATCH_MAX_ITEMS)
+
+class PackBulkRes(BaseModel):
+    bundle_id: str
+    pdf_url: str
+    sha256: str
+    cases: int
+    pages: int
+    packs: List[PackRes] = Field(default_factory=list)
+
+class PackStatusRes(BaseModel):
+    pack_id: str
+    status: str
+    json_url: Optional[str] = None
+    pdf_url: Optional[str] = None
+    sha256: Optional[str] = None
+    error: Optional[str] = None
@@ -0,0 +1,136 @@
+import math
+import os
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy is optional
+    np = None
+
+EARTH_RADIUS_KM = 6371.0
+
+# "auto" uses NumPy when it is installed, "python" forces the pure-Python path.
+SCORING_BACKEND = os.environ.get("SCORING_BACKEND", "auto").lower()
+# Below this many candidates the per-call NumPy overhead outweighs the win.
+SCORING_VECTOR_MIN = int(os.environ.get("SCORING_VECTOR_MIN", "32"))
+
+
+def numpy_enabled() -> bool:
+    return np is not None and SCORING_BACKEND != "python"
+
+
+def use_vectorized(n: int) -> bool:
+    return numpy_enabled() and n >= SCORING_VECTOR_MIN
+
+
+def haversine_many(lat: float, lon: float, lats: Sequence[float], lons: Sequence[float]):
+    """Distances in km from one point to every (lats[i], lons[i])."""
+    if not numpy_enabled():
+        out = []
+        for la, lo in zip(lats, lons):
+            try:
+                out.append(_haversine(lat, lon, la, lo))
+            except ValueError:
+                out.append(math.nan)
+        return out
+    lat2 = np.radians(np.asarray(lats, dtype=np.float64))
+    lon2 = np.radians(np.asarray(lons, dtype=np.float64))
+    lat1 = math.radians(lat)
+    with np.errstate(invalid="ignore"):
+        dlat = lat2 - lat1
+        dlon = lon2 - math.radians(lon)
+        a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+        return EARTH_RADIUS_KM * 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+
+
+def _haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    dlat = math.radians(lat2 - lat1)
+    dlon = math.radians(lon2 - lon1)
+    a = (math.sin(dlat / 2) ** 2 +
+         math.cos(math.radians(lat1)) * math.cos(math.radians(lat2)) *
+         math.sin(dlon / 2) ** 2)
+    return EARTH_RADIUS_KM * 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+def jaccard_many(query: Set[str], candidates: Iterable[Set[str]]) -> List[float]:
+    """Jaccard similarity of query against each candidate set."""
+    out = []
+    q = len(query)
+    for cand in candidates:
+        inter = len(query & cand) if q <= len(cand) else len(cand & query)
+        union = q + len(cand) - inter
+        out.append(inter / union if union > 0 else 0.0)
+    return out
+
+
+class TokenMatrix:
+    """
+    Sparse incidence matrix between token sets and their tokens, stored as
+    the posting lists plus per-row set sizes. Intersection counts for a
+    query come from summing the query tokens' postings, so scoring N rows
+    never materialises N Python sets.
+    """
+
+    def __init__(self, postings: Dict[str, List[int]], sizes: Sequence[int]):
+        self.n_rows = len(sizes)
+        if numpy_enabled():
+            self.sizes = np.asarray(sizes, dtype=np.int64)
+            self.postings = {t: np.asarray(p, dtype=np.int64) for t, p in postings.items()}
+        else:
+            self.sizes = list(sizes)
+            self.postings = postings
+
+    def intersections(self, query: Iterable[str], positions: Sequence[int]):
+        lists = [self.postings[t] for t in query if t in self.postings]
+        if isinstance(self.sizes, list):
+            counts = Counter()
+            for posting in lists:
+                counts.update(posting)
+            return [counts.get(p, 0) for p in positions]
+        positions = np.asarray(positions, dtype=np.int64)
+        if not lists:
+            return np.zeros(len(positions), dtype=np.int64)
+        rows, counts = np.unique(np.concatenate(lists), return_counts=True)
+        idx = np.searchsorted(rows, positions)
+        idx[idx >= len(rows)] = 0
+        hit = rows[idx] == positions
+        return np.where(hit, counts[idx], 0)
+
+    def jaccard(self, query: Set[str], positions: Sequence[int]):
+        inter = self.intersections(query, positions)
+        q = len(query)
+        if isinstance(self.sizes, list):
+            out = []
+            for p, i in zip(positions, inter):
+                union = q + self.sizes[p] - i
+                out.append(i / union if union > 0 else 0.0)
+            return out
+        union = q + self.sizes[np.asarray(positions, dtype=np.int64)] - inter
+        with np.errstate(divide="ignore", invalid="ignore"):
+            sims = np.where(union > 0, inter / np.maximum(union, 1), 0.0)
+        return sims
+
+
+def best_geo_text_match(matrix: TokenMatrix, lats, lons, query: Set[str],
+                        lat: Optional[float], lon: Optional[float], positions: Sequence[int],
+                        radius_km: float, text_weight: float = 0.7,
+                        geo_weight: float = 0.3) -> Tuple[Optional[int], float]:
+    """
+    Vectorised form of the dedupe scan: combined score is
+    text_weight * jaccard + geo_weight * (distance < radius_km). Returns the
+    first position with the highest score above zero, as a sequential scan
+    with a strict ">" would, or (None, 0.0).
+    """
+    if not positions:
+        return None, 0.0
+    pos = np.asarray(positions, dtype=np.int64)
+    combined = text_weight * np.asarray(matrix.jaccard(query, positions), dtype=np.float64)
+    if lat is not None and lon is not None:
+        dists = haversine_many(lat, lon, np.asarray(lats)[pos], np.asarray(lons)[pos])
+        combined = combined + geo_weight * (dists < radius_km)
+    i = int(np.argmax(combined))
+    best = float(combined[i])
+    if best <= 0.0:
+        return None, 0.0
+    return int(pos[i]), best
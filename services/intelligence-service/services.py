@@ -8,44 +8,94 @@ import hashlib
 import time
 from typing import Dict, List, Optional, Tuple, Any, Set
 
+import cluster_store
+import executors
+import metrics
+import pack_jobs
+import routing_rules
 import schemas
-from schemas import MEPP, DedupeRes, ScoreRes, RouteRes, StatusRes, ClusterRes, PackRes, PackReq
+import scoring
+import textsim
+import time_window
+from cluster_index import ClusterIndex, ClusterWriter
+from cluster_shards import ShardedClusterStore
+from cluster_store import RetryPolicy
+from incident_index import IncidentIndex, bounding_cells, grid_cell
+from incident_store import IncidentStore
+from pack_store import PackStore
+from photo_index import PhotoHashIndex, from_signed, parse_phash, to_signed
+from result_cache import ResultCache, content_key
+from schemas import MEPP, AnalyzeRes, DedupeRes, ScoreRes, RouteRes, StatusRes, ClusterRes, PackRes, PackReq, PackStatusRes
 
 # --- Globals / Config ---
 CLUSTER_DB = os.environ.get("CLUSTER_DB", "cluster.db")
 CLUSTER_JACCARD_MIN = float(os.environ.get("CLUSTER_JACCARD_MIN", "0.45"))
+# Top-K tokens kept per cluster centroid; 0 keeps every token.
+CLUSTER_CENTROID_MAX_TOKENS = int(os.environ.get("CLUSTER_CENTROID_MAX_TOKENS", "32"))
+# Clusters anchored further than this from a report are never candidates.
+CLUSTER_SEARCH_RADIUS_KM = float(os.environ.get("CLUSTER_SEARCH_RADIUS_KM", "0.05"))
 PACK_DIR = os.environ.get("PACK_DIR", "./packs")
 PACK_MAX_EVIDENCE = int(os.environ.get("PACK_MAX_EVIDENCE", "5"))
-
+# Cases per bulk bundle; the renderer holds every page until it saves.
+BULK_PACK_MAX_CASES = int(os.environ.get("BULK_PACK_MAX_CASES", "1000"))
+CANONICAL_INCIDENTS_SOURCE = os.environ.get("CANONICAL_INCIDENTS_SOURCE", "")
+CANONICAL_INCIDENTS_TABLE = os.environ.get("CANONICAL_INCIDENTS_TABLE", "canonical_incidents")
+ROUTING_RULES_PATH = os.environ.get("ROUTING_RULES_PATH", "")
+# Days a canonical incident or cluster stays a candidate after its last
+# activity, optionally per category; 0 keeps everything forever.
+TIME_WINDOW = time_window.TimeWindow(
+    int(os.environ.get("TIME_WINDOW_DAYS", "30")),
+    time_window.parse_category_days(os.environ.get("TIME_WINDOW_CATEGORY_DAYS")),
+)
+TIME_WINDOW_SWEEP_INTERVAL = float(os.environ.get("TIME_WINDOW_SWEEP_INTERVAL", "3600"))
+
+# Cluster tables split over CLUSTER_SHARDS files next to CLUSTER_DB, routed
+# by blocks of CLUSTER_SHARD_REGION_CELLS x CLUSTER_SHARD_REGION_CELLS
+# geocells (by ward without coordinates), so writers in different regions
+# do not queue on one SQLite lock. 1 keeps the single CLUSTER_DB file.
+CLUSTER_STORE = ShardedClusterStore(
+    CLUSTER_DB,
+    shards=int(os.environ.get("CLUSTER_SHARDS", "1")),
+    region_cells=int(os.environ.get("CLUSTER_SHARD_REGION_CELLS", "100")),
+    pool_size=int(os.environ.get("CLUSTER_DB_POOL_SIZE", "4")),
+    busy_timeout_ms=int(os.environ.get("CLUSTER_DB_BUSY_TIMEOUT_MS", "5000")),
+    retry=RetryPolicy(
+        attempts=int(os.environ.get("CLUSTER_DB_RETRY_ATTEMPTS", "5")),
+        base_delay=float(os.environ.get("CLUSTER_DB_RETRY_BASE_DELAY", "0.05")),
+        max_delay=float(os.environ.get("CLUSTER_DB_RETRY_MAX_DELAY", "1.0")),
+    ),
+)
+
+# "memory" assigns clusters against an in-memory index and writes the
+# changes behind to CLUSTER_DB; "sqlite" reads and writes CLUSTER_DB in the
+# request's own transaction. Memory mode is opt-in: it needs a single
+# service process per CLUSTER_DB, which multi-worker servers do not give.
+CLUSTER_INDEX_MODE = os.environ.get("CLUSTER_INDEX", "sqlite").lower()
+if CLUSTER_INDEX_MODE not in ("memory", "sqlite"):
+    raise ValueError(f"CLUSTER_INDEX must be 'memory' or 'sqlite', got {CLUSTER_INDEX_MODE!r}")
+# One process owns a memory-mode store and does all its writing, so shards
+# only add parallelism to sqlite-mode workers.
+if CLUSTER_INDEX_MODE == "memory" and len(CLUSTER_STORE) > 1:
+    raise ValueError("CLUSTER_SHARDS > 1 needs CLUSTER_INDEX=sqlite")
+CLUSTER_INDEX = ClusterIndex(
+    CLUSTER_STORE,
+    ClusterWriter(
+        CLUSTER_STORE,
+        interval=float(os.environ.get("CLUSTER_WRITE_INTERVAL", "0.05")),
+        batch_size=int(os.environ.get("CLUSTER_WRITE_BATCH", "500")),
+        max_pending=int(os.environ.get("CLUSTER_WRITE_MAX_PENDING", "100000")),
+    ),
+    snapshot_path=os.environ.get("CLUSTER_SNAPSHOT_PATH", CLUSTER_DB + ".snapshot"),
+)
+CLUSTER_SNAPSHOT_INTERVAL = float(os.environ.get("CLUSTER_SNAPSHOT_INTERVAL", "300"))
+
+# Nothing touches the database or the corpus at import time. The startup
+# warm-up (warmup.py) initializes both; until it has, the first request to
+# need either does it lazily.
 def init_db():
-    conn = sqlite3.connect(CLUSTER_DB)
-    c = conn.cursor()
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS clusters (
-            cluster_id TEXT PRIMARY KEY,
-            ward TEXT,
-            geocell TEXT,
-            centroid TEXT,
-            members INT,
-            created_at TEXT,
-            updated_at TEXT
-        )
-    ''')
-    c.execute('''
-        CREATE TABLE IF NOT EXISTS cluster_members (
-            cluster_id TEXT,
-            case_id TEXT,
-            summary TEXT,
-            lat REAL,
-            lon REAL,
-            ts TEXT
-        )
-    ''')
-    conn.commit()
-    conn.close()
-
-init_db()
+    CLUSTER_STORE.init_schema()
 
+# Built-in corpus, used when CANONICAL_INCIDENTS_SOURCE is not set.
 CANONICAL_INCIDENTS = [
     {
         "id": "INC-001",
@@ -67,6 +117,13 @@ CANONICAL_INCIDENTS = [
     }
 ]
 
+# Radius inside which a canonical incident earns the dedupe distance bonus.
+DEDUPE_RADIUS_KM = 0.30
+# Photos whose 64-bit perceptual hashes differ in at most this many bits
+# count as the same picture.
+PHOTO_HASH_MAX_DISTANCE = int(os.environ.get("PHOTO_HASH_MAX_DISTANCE", "6"))
+PHOTO_HASH_CHUNKS = int(os.environ.get("PHOTO_HASH_CHUNKS", "4"))
+
 # TICKET_STATE[ticket_id] = {"status": str, "updated_at": datetime.datetime}
 TICKET_STATE: collections.OrderedDict = collections.OrderedDict()
 
@@ -94,43 +151,187 @@ def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
     return R * c
 
+# TEXT_TOKENIZER=normalized also folds punctuation, stopwords and plurals.
+_TOKENIZER = textsim.normalize_tokens if textsim.TEXT_TOKENIZER == "normalized" else textsim.simple_tokens
+
 def tokenize(text: str) -> Set[str]:
-    if not text:
-        return set()
-    return set(text.lower().split())
+    return _TOKENIZER(text)
 
 def jaccard_similarity(set1: Set[str], set2: Set[str]) -> float:
     intersection = len(set1.intersection(set2))
     union = len(set1.union(set2))
     return intersection / union if union > 0 else 0.0
 
+CANONICAL_STORE = IncidentStore(
+    tokenize,
+    source=CANONICAL_INCIDENTS_SOURCE,
+    default=CANONICAL_INCIDENTS,
+    table=CANONICAL_INCIDENTS_TABLE,
+    lsh_bands=textsim.LSH_BANDS if textsim.DEDUPE_CANDIDATES == "lsh" else 0,
+    lsh_rows=textsim.LSH_ROWS,
+    window=TIME_WINDOW,
+)
+
+# Results for identical MEPP content are reused across retries and across
+# endpoints (score reuses dedupe). Dedupe/score entries depend on the corpus,
+# so they are dropped whenever a new corpus is published.
+RESULT_CACHE_SIZE = _get_env_int("RESULT_CACHE_SIZE", 10000)
+RESULT_CACHE_TTL = _get_env_float("RESULT_CACHE_TTL", 300.0)
+DEDUPE_CACHE = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+SCORE_CACHE = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+ROUTE_CACHE = ResultCache(RESULT_CACHE_SIZE, RESULT_CACHE_TTL)
+
+def _invalidate_corpus_caches(_index: IncidentIndex) -> None:
+    DEDUPE_CACHE.clear()
+    SCORE_CACHE.clear()
+
+CANONICAL_STORE.add_listener(_invalidate_corpus_caches)
+
+def cache_stats() -> Dict[str, Dict]:
+    return {
+        "dedupe": DEDUPE_CACHE.stats(),
+        "score": SCORE_CACHE.stats(),
+        "route": ROUTE_CACHE.stats(),
+    }
+
+def _dedupe_key(summary: str, lat_f: Optional[float], lon_f: Optional[float],
+                threshold: float, index: IncidentIndex, reported_at: float) -> str:
+    # Expiries fall on day boundaries, so the report's day is all the key needs.
+    day = time_window.day_of(reported_at) if math.isfinite(index.next_expiry) else None
+    return content_key("dedupe", index.version, threshold, summary, lat_f, lon_f, day)
+
 # --- Service Functions ---
 
+def report_time(mepp: MEPP) -> float:
+    """
+    When the issue was reported: created_at, else the earliest photo
+    captured_at, else now.
+    """
+    ts = time_window.parse_timestamp(mepp.created_at)
+    if ts is not None:
+        return ts
+    photos = mepp.evidence.get("photos", [])
+    if isinstance(photos, list):
+        captured = [time_window.parse_timestamp(p.get("captured_at")) for p in photos if isinstance(p, dict)]
+        captured = [t for t in captured if t is not None]
+        if captured:
+            return min(captured)
+    return time.time()
+
+def _parse_lat_lon(location: Dict) -> Tuple[Optional[float], Optional[float]]:
+    lat = location.get("lat")
+    lon = location.get("lon")
+    if lat is None or lon is None:
+        return None, None
+    try:
+        return float(lat), float(lon)
+    except (ValueError, TypeError):
+        return None, None
+
+class ParsedMEPP:
+    """
+    The MEPP fields dedupe, score, route and cluster read, parsed once so
+    /analyze can hand the same tokens and coordinates to every stage.
+    """
+    __slots__ = ("mepp", "summary", "category", "ward", "lat_f", "lon_f", "geocell", "tokens", "cluster_tokens",
+                 "photo_hashes", "reported_at")
+
+    def __init__(self, mepp: MEPP, tokens: Optional[Set[str]] = None):
+        self.mepp = mepp
+        self.summary = str(mepp.issue.get("summary", ""))
+        self.category = str(mepp.issue.get("category", ""))
+        self.ward = str(mepp.location.get("ward", ""))
+        self.lat_f, self.lon_f = _parse_lat_lon(mepp.location)
+        self.geocell = get_geocell(self.lat_f, self.lon_f)
+        if tokens is None:
+            with metrics.stage("tokenize"):
+                tokens = tokenize(self.summary)
+        self.tokens = tokens
+        # Same as tokenize_summary(summary): clustering ignores short words.
+        self.cluster_tokens = set(w for w in self.tokens if len(w) > 2)
+        self.photo_hashes = photo_hashes(mepp)
+        self.reported_at = report_time(mepp)
+
 def dedupe_mepp(mepp: MEPP) -> DedupeRes:
-    threshold = _get_env_float("DEDUPE_THRESHOLD", 0.65)
-    
-    input_summary = str(mepp.issue.get("summary", ""))
-    input_tokens = tokenize(input_summary)
-    
-    lat = mepp.location.get("lat")
-    lon = mepp.location.get("lon")
-    has_geo = (lat is not None and lon is not None)
+    return dedupe_parsed(ParsedMEPP(mepp))
 
+def dedupe_parsed(parsed: ParsedMEPP) -> DedupeRes:
+    threshold = _get_env_float("DEDUPE_THRESHOLD", 0.65)
+    index = CANONICAL_STORE.snapshot()
+    key = _dedupe_key(parsed.summary, parsed.lat_f, parsed.lon_f, threshold, index, parsed.reported_at)
+    cached = DEDUPE_CACHE.get(key)
+    if cached is not None:
+        res = cached.model_copy()
+    else:
+        res = _dedupe(index, parsed.tokens, parsed.lat_f, parsed.lon_f, threshold, parsed.reported_at)
+        DEDUPE_CACHE.put(key, res.model_copy())
+    return _with_photo_match(res, parsed.photo_hashes, parsed.mepp.case_id)
+
+def dedupe_batch(mepps: List[MEPP]) -> List[DedupeRes]:
+    """
+    dedupe_mepp over a list, against a single corpus snapshot. Items with the
+    same summary and coordinates share one tokenization and candidate scan.
+    """
+    threshold = _get_env_float("DEDUPE_THRESHOLD", 0.65)
+    index = CANONICAL_STORE.snapshot()
+    tokens_by_summary: Dict[str, Set[str]] = {}
+    results: Dict[str, DedupeRes] = {}
+    out = []
+    for mepp in mepps:
+        summary = str(mepp.issue.get("summary", ""))
+        lat_f, lon_f = _parse_lat_lon(mepp.location)
+        reported_at = report_time(mepp)
+        key = _dedupe_key(summary, lat_f, lon_f, threshold, index, reported_at)
+        res = results.get(key)
+        if res is None:
+            res = DEDUPE_CACHE.get(key)
+        if res is None:
+            tokens = tokens_by_summary.get(summary)
+            if tokens is None:
+                with metrics.stage("tokenize"):
+                    tokens = tokens_by_summary[summary] = tokenize(summary)
+            res = _dedupe(index, tokens, lat_f, lon_f, threshold, reported_at)
+            DEDUPE_CACHE.put(key, res)
+        results[key] = res
+        out.append(_with_photo_match(res.model_copy(), photo_hashes(mepp), mepp.case_id))
+    return out
+
+def _dedupe(index: IncidentIndex, input_tokens: Set[str], lat_f: Optional[float],
+            lon_f: Optional[float], threshold: float, reported_at: Optional[float] = None) -> DedupeRes:
     best_sim = 0.0
     best_match_id = None
     best_dist = None
 
-    for inc in CANONICAL_INCIDENTS:
-        canon_tokens = tokenize(inc["summary"])
-        text_sim = jaccard_similarity(input_tokens, canon_tokens)
+    # Only incidents sharing a token or inside the bonus radius can score
+    # above zero, so the rest of the corpus is never touched. Incidents
+    # expired by the report time are skipped too.
+    with metrics.stage("dedupe_candidates"):
+        positions = index.candidates(input_tokens, lat_f, lon_f, DEDUPE_RADIUS_KM, at=reported_at)
+    started = time.perf_counter()
+    if scoring.use_vectorized(len(positions)):
+        best_pos, best_sim = scoring.best_geo_text_match(
+            index.matrix, index.lats, index.lons, input_tokens,
+            lat_f, lon_f, positions, DEDUPE_RADIUS_KM
+        )
+        if best_pos is not None:
+            best_match_id = index.ids[best_pos]
+            if lat_f is not None and index.has_geo(best_pos):
+                try:
+                    best_dist = haversine(lat_f, lon_f, index.lats[best_pos], index.lons[best_pos])
+                except (ValueError, TypeError):
+                    pass
+        positions = []
+
+    for pos in positions:
+        text_sim = jaccard_similarity(input_tokens, index.tokens[pos])
         
         dist_bonus = 0.0
         dist_km = None
         
-        if has_geo:
+        if lat_f is not None and index.has_geo(pos):
             try:
-                dist_km = haversine(float(lat), float(lon), inc["lat"], inc["lon"])
-                if dist_km < 0.30:  # 300 meters
+                dist_km = haversine(lat_f, lon_f, index.lats[pos], index.lons[pos])
+                if dist_km < DEDUPE_RADIUS_KM:
                     dist_bonus = 1.0
             except (ValueError, TypeError):
                 pass
@@ -141,8 +342,9 @@ def dedupe_mepp(mepp: MEPP) -> DedupeRes:
         
         if combined_sim > best_sim:
             best_sim = combined_sim
-            best_match_id = inc["id"]
+            best_match_id = index.ids[pos]
             best_dist = dist_km
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "dedupe_scoring")
 
     duplicate_of = best_match_id if best_sim >= threshold else None
     
@@ -152,7 +354,99 @@ def dedupe_mepp(mepp: MEPP) -> DedupeRes:
         distance_km=best_dist
     )
 
-def score_credibility(mepp: MEPP) -> ScoreRes:
+def photo_hashes(mepp: MEPP) -> List[int]:
+    """Distinct 64-bit perceptual hashes of the MEPP's photos, in order."""
+    photos = mepp.evidence.get("photos", [])
+    if not isinstance(photos, list):
+        return []
+    out = []
+    for photo in photos:
+        phash = parse_phash(photo.get("hash")) if isinstance(photo, dict) else None
+        if phash is not None and phash not in out:
+            out.append(phash)
+    return out
+
+def _load_photo_hashes():
+    # Queued write-behind rows would otherwise be missed by the load.
+    CLUSTER_INDEX.writer.flush()
+    for phash, case_id in CLUSTER_STORE.read_all(cluster_store.SELECT_PHOTO_HASHES):
+        yield from_signed(phash), case_id
+
+# Photo hashes of every clustered report, read from the cluster DB on first
+# use and extended after each committed cluster write. Dedupe results are
+# cached, but this lookup always runs fresh since the index keeps growing.
+PHOTO_INDEX = PhotoHashIndex(PHOTO_HASH_MAX_DISTANCE, PHOTO_HASH_CHUNKS, loader=_load_photo_hashes)
+
+def photo_match(hashes: List[int], case_id: Optional[str]) -> Optional[Tuple[str, int]]:
+    """(case_id, distance) of the nearest earlier report sharing a photo, excluding case_id itself."""
+    if not hashes:
+        return None
+    with metrics.stage("photo_lookup"):
+        return PHOTO_INDEX.nearest(hashes, exclude_owner=case_id)
+
+def _with_photo_match(res: DedupeRes, hashes: List[int], case_id: Optional[str]) -> DedupeRes:
+    match = photo_match(hashes, case_id)
+    if match is not None:
+        res.photo_duplicate_of, res.photo_distance = match
+    return res
+
+def photo_risk(distance: Optional[int]) -> float:
+    """1.0 for an identical photo, falling linearly to 0 past PHOTO_HASH_MAX_DISTANCE."""
+    if distance is None:
+        return 0.0
+    return round(1.0 - distance / (PHOTO_HASH_MAX_DISTANCE + 1), 4)
+
+def _index_photos(parsed: List[ParsedMEPP]) -> None:
+    """Add committed reports' photo hashes to the live index."""
+    # Before the first load, the loader reads them from the DB anyway.
+    if not PHOTO_INDEX.loaded:
+        return
+    PHOTO_INDEX.add_many((h, p.mepp.case_id) for p in parsed if p.mepp.case_id for h in p.photo_hashes)
+
+def _score_key(mepp: MEPP, dup_risk: Optional[float], photo: float) -> str:
+    photos = mepp.evidence.get("photos", [])
+    if dup_risk is None:
+        # Dedupe runs inside the score, so the key covers its inputs.
+        lat_f, lon_f = _parse_lat_lon(mepp.location)
+        dedupe_part = _dedupe_key(str(mepp.issue.get("summary", "")), lat_f, lon_f,
+                                  _get_env_float("DEDUPE_THRESHOLD", 0.65),
+                                  CANONICAL_STORE.snapshot(), report_time(mepp))
+    else:
+        dedupe_part = [dup_risk]
+    return content_key(
+        "score",
+        dedupe_part,
+        photo,
+        mepp.location.get("lat") is not None,
+        mepp.location.get("lon") is not None,
+        bool(mepp.location.get("address_text")),
+        len(photos) if isinstance(photos, list) else 0,
+        bool(mepp.reporter.get("contact")),
+    )
+
+def score_credibility(mepp: MEPP, dedupe_result: Optional[DedupeRes] = None,
+                      dedupe_similarity: Optional[float] = None) -> ScoreRes:
+    """
+    Credibility score. The duplication risk comes from dedupe_result or
+    dedupe_similarity when the caller already has it; otherwise dedupe is
+    run here. A photo matching an earlier report raises it too.
+    """
+    if dedupe_result is not None:
+        if dedupe_similarity is None:
+            dedupe_similarity = dedupe_result.similarity
+        photo = photo_risk(dedupe_result.photo_distance)
+    else:
+        match = photo_match(photo_hashes(mepp), mepp.case_id)
+        photo = photo_risk(match[1] if match else None)
+    key = _score_key(mepp, dedupe_similarity, photo)
+    cached = SCORE_CACHE.get(key)
+    if cached is not None:
+        return cached.model_copy()
+    res = _score(mepp, dedupe_similarity, photo)
+    SCORE_CACHE.put(key, res.model_copy())
+    return res
+
+def _score(mepp: MEPP, dup_risk: Optional[float], photo: float = 0.0) -> ScoreRes:
     # 1. Evidence Completeness
     photos = mepp.evidence.get("photos", [])
     if isinstance(photos, list):
@@ -181,8 +475,9 @@ def score_credibility(mepp: MEPP) -> ScoreRes:
         geo_score = 0.2
 
     # 3. Duplication Risk
-    dedupe_result = dedupe_mepp(mepp)
-    dup_risk = dedupe_result.similarity
+    if dup_risk is None:
+        dup_risk = dedupe_mepp(mepp).similarity
+    dup_risk = max(dup_risk, photo)
 
     # 4. Community Signal
     community_signal = 0.0
@@ -205,130 +500,264 @@ def score_credibility(mepp: MEPP) -> ScoreRes:
         hints.append("Add a second photo from a different angle.")
     if not has_addr:
         hints.append("Include a nearby landmark or street name.")
+    if photo > 0.0:
+        hints.append("A photo matches an earlier report; attach a fresh photo of the issue.")
     
     hint = " ".join(hints) if hints else "Looks good."
 
     return ScoreRes(score=round(final_score, 2), hint=hint)
 
+def score_batch(mepps: List[MEPP]) -> List[ScoreRes]:
+    return [score_credibility(m, d) for m, d in zip(mepps, dedupe_batch(mepps))]
+
+ROUTING_RULES = routing_rules.load_rules(ROUTING_RULES_PATH)
+
 def route_mepp(mepp: MEPP) -> RouteRes:
-    category = str(mepp.issue.get("category", ""))
-    summary = str(mepp.issue.get("summary", "")).lower()
-    ward = str(mepp.location.get("ward", ""))
-    
-    dest = None
-    confidence = 0.0
-    basis = []
-
-    # Rule 1
-    if category in ["sanitation/garbage", "sanitation/drainage"] and ward == "14":
-        dest = "ULB_TIRUPPUR_SANITATION"
-        confidence = 0.90
-        basis.append("rule: sanitation+ward14")
-    # Rule 2
-    elif any(kw in summary for kw in ["streetlight", "lamp", "bulb"]):
-        dest = "ULB_ELECTRICAL"
-        confidence = 0.75
-        basis.append("rule: streetlight keywords")
-    
-    # Fallback
-    if not dest:
-        basis.append("fallback: keyword heuristic")
-        confidence = 0.40
-        if any(w in summary for w in ["water", "pipe", "leak"]):
-            dest = "ULB_WATER"
-        elif any(w in summary for w in ["road", "pothole", "tar"]):
-            dest = "ULB_ROADS"
-        elif any(w in summary for w in ["garbage", "trash", "waste"]):
-             dest = "ULB_TIRUPPUR_SANITATION"
-        else:
-            dest = "ULB_GENERIC"
-            
-    return RouteRes(dest=dest, confidence=confidence, basis=basis)
+    return _route_fields(
+        str(mepp.issue.get("category", "")),
+        str(mepp.issue.get("summary", "")),
+        str(mepp.location.get("ward", "")),
+    )
+
+def route_parsed(parsed: ParsedMEPP) -> RouteRes:
+    return _route_fields(parsed.category, parsed.summary, parsed.ward)
+
+def _route_fields(category: str, summary: str, ward: str) -> RouteRes:
+    key = content_key("route", ROUTING_RULES.version, category, summary, ward)
+    cached = ROUTE_CACHE.get(key)
+    if cached is not None:
+        return cached.model_copy(deep=True)
+    res = _route(category, summary, ward)
+    ROUTE_CACHE.put(key, res.model_copy(deep=True))
+    return res
+
+def _route(category: str, summary: str, ward: str) -> RouteRes:
+    with metrics.stage("route_match"):
+        rule = ROUTING_RULES.match(category, summary.lower(), ward)
+    if rule is None:
+        return RouteRes(dest="ULB_GENERIC", confidence=0.40, basis=["fallback: keyword heuristic"])
+    return RouteRes(dest=rule.dest, confidence=rule.confidence, basis=[rule.basis])
+
+def route_batch(mepps: List[MEPP]) -> List[RouteRes]:
+    return [route_mepp(m) for m in mepps]
 
 # simulate_status has been moved to sla-status-service.
 
+GEOCELL_SCALE = 3000
+
 def get_geocell(lat: Any, lon: Any) -> str:
     if lat is None or lon is None:
         return "nogeo"
     try:
         lat_f = float(lat)
         lon_f = float(lon)
-        return f"{math.floor(lat_f * 3000)}:{math.floor(lon_f * 3000)}"
-    except (ValueError, TypeError):
+        return f"{math.floor(lat_f * GEOCELL_SCALE)}:{math.floor(lon_f * GEOCELL_SCALE)}"
+    except (ValueError, TypeError, OverflowError):
         return "nogeo"
 
+def neighbour_geocells(lat: float, lon: float, radius_km: float) -> List[str]:
+    """Geocells overlapping radius_km around (lat, lon); at least the 3x3 block."""
+    row, col = grid_cell(lat, lon, GEOCELL_SCALE)
+    box = bounding_cells(lat, lon, radius_km, GEOCELL_SCALE)
+    if box is None:
+        box = (row - 1, row + 1, col - 1, col + 1)
+    row_lo, row_hi, col_lo, col_hi = box
+    row_lo, row_hi = min(row_lo, row - 1), max(row_hi, row + 1)
+    col_lo, col_hi = min(col_lo, col - 1), max(col_hi, col + 1)
+    return [f"{r}:{c}" for r in range(row_lo, row_hi + 1) for c in range(col_lo, col_hi + 1)]
+
 def tokenize_summary(text: str) -> Set[str]:
-    if not text:
-        return set()
-    return set(w for w in text.lower().split() if len(w) > 2)
+    return set(w for w in tokenize(text) if len(w) > 2)
 
 def cluster_mepp(mepp: MEPP) -> ClusterRes:
-    lat = mepp.location.get("lat")
-    lon = mepp.location.get("lon")
-    ward = str(mepp.location.get("ward", ""))
-    
-    geocell = get_geocell(lat, lon)
-    summary = str(mepp.issue.get("summary", ""))
-    tokens = tokenize_summary(summary)
+    return cluster_batch([mepp])[0]
+
+def cluster_batch(mepps: List[MEPP]) -> List[ClusterRes]:
+    """
+    Assign each MEPP to a cluster in order, inside a single transaction.
+    Later items see clusters created or grown by earlier ones.
+    """
+    parsed = []
+    tokens_by_summary: Dict[str, Set[str]] = {}
+    for mepp in mepps:
+        summary = str(mepp.issue.get("summary", ""))
+        toks = tokens_by_summary.get(summary)
+        if toks is None:
+            with metrics.stage("tokenize"):
+                toks = tokens_by_summary[summary] = tokenize(summary)
+        parsed.append(ParsedMEPP(mepp, toks))
+
+    results = _assign_clusters(parsed)
+    _index_photos(parsed)
+    return results
+
+def cluster_parsed(parsed: ParsedMEPP) -> ClusterRes:
+    res = _assign_clusters([parsed])[0]
+    _index_photos([parsed])
+    return res
+
+def _assign_clusters(parsed: List[ParsedMEPP]) -> List[ClusterRes]:
+    if CLUSTER_INDEX_MODE == "memory":
+        index = CLUSTER_INDEX.ensure_loaded()
+        with index.lock:
+            index.writer.check()
+            writes: Dict[int, Tuple[Dict, List, List]] = {}
+            results = [_assign_indexed(index, p, writes) for p in parsed]
+            for shard, (clusters, members, photos) in writes.items():
+                index.writer.submit(shard, clusters.values(), members, photos)
+        return results
+
+    def assign_all(cursors: Dict[int, sqlite3.Cursor]) -> List[ClusterRes]:
+        return [_assign_cluster(cursors, p) for p in parsed]
+
+    shards = set()
+    for p in parsed:
+        shards.update(_candidate_shards(p))
+    return CLUSTER_STORE.run_in_transaction(assign_all, shards, "cluster assignment")
+
+def _candidate_shards(parsed: ParsedMEPP) -> Dict[int, Optional[List[str]]]:
+    """
+    Shard -> geocells to search there, covering every shard a report's
+    candidates or its new cluster could be in. Without coordinates the
+    report matches by ward, which any shard may hold (None: search by ward).
+    """
+    if parsed.geocell == "nogeo":
+        return {shard: None for shard in CLUSTER_STORE.all_shards}
+    cells = neighbour_geocells(parsed.lat_f, parsed.lon_f, CLUSTER_SEARCH_RADIUS_KM)
+    out: Dict[int, Optional[List[str]]] = dict(CLUSTER_STORE.cells_by_shard(cells))
+    out.setdefault(CLUSTER_STORE.shard_for(parsed.geocell, parsed.ward), [])
+    return out
+
+def _new_cluster_id() -> str:
+    return "CL-" + hashlib.sha1(os.urandom(32)).hexdigest()[:8]
+
+def _member_rows(parsed: ParsedMEPP, cluster_id: str, now_str: str) -> Tuple[tuple, List[tuple]]:
+    """The cluster_members row and photo_hashes rows one assignment adds."""
+    mepp = parsed.mepp
+    member = (cluster_id, mepp.case_id, parsed.summary, mepp.location.get("lat"), mepp.location.get("lon"), now_str)
+    photos = []
+    if mepp.case_id:
+        photos = [(to_signed(phash), mepp.case_id, cluster_id, now_str) for phash in parsed.photo_hashes]
+    return member, photos
+
+def _within_radius(parsed: ParsedMEPP, lat: Optional[float], lon: Optional[float]) -> bool:
+    return lat is None or lon is None or haversine(parsed.lat_f, parsed.lon_f, lat, lon) <= CLUSTER_SEARCH_RADIUS_KM
+
+def _assign_indexed(index: ClusterIndex, parsed: ParsedMEPP, writes: Dict[int, Tuple[Dict, List, List]]) -> ClusterRes:
+    """_assign_cluster against the in-memory index; the rows to persist are added to writes, by shard."""
+    tokens = parsed.cluster_tokens
+    started = time.perf_counter()
+    if parsed.geocell != "nogeo":
+        cells = neighbour_geocells(parsed.lat_f, parsed.lon_f, CLUSTER_SEARCH_RADIUS_KM)
+        entries = [e for e in index.by_cells(cells, parsed.reported_at) if _within_radius(parsed, e.lat, e.lon)]
+    else:
+        entries = index.by_ward(parsed.ward, parsed.reported_at)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "cluster_candidates")
+
+    best_sim = 0.0
+    best = None
+    with metrics.stage("cluster_scoring"):
+        sims = scoring.jaccard_many(tokens, [e.centroid for e in entries])
+    for entry, sim in zip(entries, sims):
+        if sim > best_sim:
+            best_sim = sim
+            best = entry
+
+    now_str = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    expires_at = TIME_WINDOW.expires_at(parsed.reported_at, parsed.category)
+    started = time.perf_counter()
+    is_new = not (best_sim >= CLUSTER_JACCARD_MIN and best is not None)
+    if is_new:
+        entry = index.create(_new_cluster_id(), parsed.ward, parsed.geocell, parsed.lat_f, parsed.lon_f,
+                             tokens, now_str, expires_at, CLUSTER_CENTROID_MAX_TOKENS)
+    else:
+        entry = index.merge(best, tokens, now_str, expires_at, CLUSTER_CENTROID_MAX_TOKENS)
+    member, photos = _member_rows(parsed, entry.cluster_id, now_str)
+    shard = writes.setdefault(index.store.shard_for(entry.geocell, entry.ward), ({}, [], []))
+    shard[0][entry.cluster_id] = entry.row()
+    shard[1].append(member)
+    shard[2].extend(photos)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "cluster_write")
+
+    return ClusterRes(
+        cluster_id=entry.cluster_id,
+        is_new=is_new,
+        members=entry.members,
+        geo_cell=parsed.geocell,
+        text_similarity=best_sim if not is_new else 1.0
+    )
+
+def _assign_cluster(cursors: Dict[int, sqlite3.Cursor], parsed: ParsedMEPP) -> ClusterRes:
+    tokens = parsed.cluster_tokens
+    ward = parsed.ward
     
-    conn = sqlite3.connect(CLUSTER_DB, timeout=10.0)
-    c = conn.cursor()
+    geocell = parsed.geocell
+    lat_f, lon_f = parsed.lat_f, parsed.lon_f
     
-    c.execute('SELECT cluster_id, centroid, members FROM clusters WHERE ward = ? OR geocell = ?', (ward, geocell))
-    rows = c.fetchall()
+    started = time.perf_counter()
+    # Search neighbouring cells too, so reports either side of a cell edge
+    # still meet, then drop anything past the radius. Each shard is asked
+    # only for the cells it owns.
+    shards = []
+    rows = []
+    for shard, cells in _candidate_shards(parsed).items():
+        c = cursors[shard]
+        if cells is None:
+            c.execute(cluster_store.SELECT_CANDIDATES_BY_WARD, (ward, parsed.reported_at))
+            found = c.fetchall()
+        elif cells:
+            c.execute(cluster_store.select_candidates_by_cells(len(cells)), (*cells, parsed.reported_at))
+            found = [row for row in c.fetchall() if _within_radius(parsed, row[3], row[4])]
+        else:
+            continue
+        shards.extend([shard] * len(found))
+        rows.extend(found)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "cluster_candidates")
     
     best_sim = 0.0
     best_cluster_id = None
-    best_centroid = set()
-    best_members = 0
+    best_centroid = ""
+    best_shard = None
     
-    for row_cid, row_centroid_str, row_members in rows:
-        row_centroid = set(json.loads(row_centroid_str))
-        sim = jaccard_similarity(tokens, row_centroid)
+    with metrics.stage("cluster_scoring"):
+        centroids = [cluster_store.decode_centroid(row[1]) for row in rows]
+        sims = scoring.jaccard_many(tokens, centroids)
+    for shard, (row_cid, row_centroid, *_), sim in zip(shards, rows, sims):
         if sim > best_sim:
             best_sim = sim
             best_cluster_id = row_cid
             best_centroid = row_centroid
-            best_members = row_members
+            best_shard = shard
             
     is_new = False
     now_str = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    expires_at = TIME_WINDOW.expires_at(parsed.reported_at, parsed.category)
     
+    started = time.perf_counter()
     if best_sim >= CLUSTER_JACCARD_MIN and best_cluster_id:
         cluster_id = best_cluster_id
-        new_centroid = best_centroid.union(tokens)
-        new_members = best_members + 1
-        
-        # Retry logic for concurrency
-        for _ in range(3):
-            try:
-                c.execute('UPDATE clusters SET centroid = ?, members = ?, updated_at = ? WHERE cluster_id = ?', 
-                          (json.dumps(list(new_centroid)), new_members, now_str, cluster_id))
-                break
-            except sqlite3.OperationalError:
-                time.sleep(0.1)
+        c = cursors[best_shard]
+        c.execute(cluster_store.SELECT_TOKEN_COUNTS, (cluster_id,))
+        counts = cluster_store.decode_token_counts(best_centroid, c.fetchone()[0])
+        cluster_store.count_tokens(counts, tokens, CLUSTER_CENTROID_MAX_TOKENS)
+        centroid, token_counts = cluster_store.top_tokens(counts, CLUSTER_CENTROID_MAX_TOKENS)
+        c.execute(cluster_store.UPDATE_CLUSTER, (centroid, token_counts, now_str, expires_at, cluster_id))
+        new_members = c.fetchone()[0]
     else:
         is_new = True
-        cluster_id = "CL-" + hashlib.sha1(os.urandom(32)).hexdigest()[:8]
-        new_members = 1
-        for _ in range(3):
-            try:
-                c.execute('INSERT INTO clusters (cluster_id, ward, geocell, centroid, members, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)',
-                          (cluster_id, ward, geocell, json.dumps(list(tokens)), new_members, now_str, now_str))
-                break
-            except sqlite3.OperationalError:
-                time.sleep(0.1)
+        cluster_id = _new_cluster_id()
+        c = cursors[CLUSTER_STORE.shard_for(geocell, ward)]
+        centroid, token_counts = cluster_store.top_tokens(
+            {tok: 1 for tok in sorted(tokens)}, CLUSTER_CENTROID_MAX_TOKENS
+        )
+        c.execute(cluster_store.INSERT_CLUSTER,
+                  (cluster_id, ward, geocell, lat_f, lon_f, centroid, token_counts, now_str, now_str, expires_at))
+        new_members = c.fetchone()[0]
         
-    for _ in range(3):
-        try:
-            c.execute('INSERT INTO cluster_members (cluster_id, case_id, summary, lat, lon, ts) VALUES (?, ?, ?, ?, ?, ?)',
-                      (cluster_id, mepp.case_id, summary, lat, lon, now_str))
-            conn.commit()
-            break
-        except sqlite3.OperationalError:
-            time.sleep(0.1)
-            
-    conn.close()
+    member, photos = _member_rows(parsed, cluster_id, now_str)
+    c.execute(cluster_store.INSERT_MEMBER, member)
+    c.executemany(cluster_store.INSERT_PHOTO_HASH, photos)
+    metrics.STAGE_SECONDS.observe(time.perf_counter() - started, "cluster_write")
     
     return ClusterRes(
         cluster_id=cluster_id,
@@ -338,33 +767,87 @@ def cluster_mepp(mepp: MEPP) -> ClusterRes:
         text_similarity=best_sim if not is_new else 1.0
     )
 
-def build_pack(req: PackReq) -> PackRes:
-    from reportlab.pdfgen import canvas
-    
-    os.makedirs(PACK_DIR, exist_ok=True)
-    
-    pack_id = "PK-" + hashlib.sha1(os.urandom(32)).hexdigest()[:10]
-    now_str = datetime.datetime.now(datetime.timezone.utc).isoformat()
-    
-    payload = {
-        "pack_id": pack_id,
-        "created_at": now_str,
+def archive_expired_clusters(now: Optional[float] = None) -> int:
+    """Move clusters expired by now into clusters_archive; returns how many moved."""
+    now = time.time() if now is None else now
+    archived_at = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).isoformat()
+    if CLUSTER_INDEX.loaded:
+        # Drop them from the index first so no new write revives them, then
+        # persist their final state so the archive copies it.
+        with CLUSTER_INDEX.lock:
+            CLUSTER_INDEX.evict_expired(now)
+            CLUSTER_INDEX.writer.flush()
+
+    def archive(c: sqlite3.Cursor) -> int:
+        c.execute(cluster_store.ARCHIVE_EXPIRED, (archived_at, now))
+        c.execute(cluster_store.DELETE_EXPIRED, (now,))
+        return c.rowcount
+
+    return sum(shard.run_in_transaction(archive, "cluster archive") for shard in CLUSTER_STORE.shards)
+
+def evict_expired() -> Dict[str, int]:
+    """Drop expired canonical incidents from the live corpus and archive expired clusters."""
+    now = time.time()
+    evicted = {
+        "incidents": CANONICAL_STORE.evict_expired(now),
+        "clusters": archive_expired_clusters(now),
+    }
+    for kind, count in evicted.items():
+        if count:
+            metrics.WINDOW_EVICTIONS.inc(kind, amount=count)
+    return evicted
+
+# Started and stopped with the app; each round runs evict_expired().
+EXPIRY_SWEEPER = time_window.Sweeper([evict_expired])
+
+def save_cluster_snapshot() -> int:
+    return CLUSTER_INDEX.save_snapshot() if CLUSTER_INDEX_MODE == "memory" else 0
+
+CLUSTER_SNAPSHOTTER = time_window.Sweeper([save_cluster_snapshot], name="cluster-snapshot")
+
+def close_cluster_index() -> None:
+    """Write out queued cluster changes and a final snapshot, then give up ownership of the store."""
+    CLUSTER_SNAPSHOTTER.stop()
+    CLUSTER_INDEX.writer.stop()
+    save_cluster_snapshot()
+    CLUSTER_INDEX.release()
+
+def analyze_mepp(mepp: MEPP, include_cluster: bool = True) -> AnalyzeRes:
+    """
+    Dedupe, score, route and (optionally) cluster one MEPP. The MEPP is
+    parsed once and the dedupe result feeds the score, so the canonical
+    incident scan runs a single time.
+    """
+    parsed = ParsedMEPP(mepp)
+    dedupe = dedupe_parsed(parsed)
+    return AnalyzeRes(
+        dedupe=dedupe,
+        score=score_credibility(mepp, dedupe),
+        route=route_parsed(parsed),
+        cluster=cluster_parsed(parsed) if include_cluster else None,
+    )
+
+PACK_STORE = PackStore(PACK_DIR)
+# Hex digits of the content hash used in a pack_id (64 bits).
+PACK_ID_HEX = 16
+
+def _pack_content(req: PackReq) -> Dict:
+    return {
         "mepp": req.mepp.model_dump(),
         "gating": req.gating,
         "routing": req.routing,
-        "cluster": req.cluster.model_dump()
+        "cluster": req.cluster.model_dump(),
     }
-    
-    json_path = os.path.join(PACK_DIR, f"{pack_id}.json")
-    json_bytes = json.dumps(payload, indent=2).encode('utf-8')
-    with open(json_path, 'wb') as f:
-        f.write(json_bytes)
-        
-    sha256_hash = hashlib.sha256(json_bytes).hexdigest()
-    
-    pdf_path = os.path.join(PACK_DIR, f"{pack_id}.pdf")
-    c = canvas.Canvas(pdf_path)
-    
+
+def pack_digest(req: PackReq) -> str:
+    """sha256 of the canonical pack content; identical requests share it."""
+    raw = json.dumps(_pack_content(req), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def pack_id_for(req: PackReq) -> str:
+    return "PK-" + pack_digest(req)[:PACK_ID_HEX]
+
+def _pack_lines(req: PackReq, pack_id: str) -> List[str]:
     case_id = req.mepp.case_id or req.mepp.provenance.get("raw_id", "Unknown")
     summary = req.mepp.issue.get("summary", "")
     category = req.mepp.issue.get("category", "")
@@ -389,20 +872,129 @@ def build_pack(req: PackReq) -> PackRes:
         f"Evidence URLs (Top {PACK_MAX_EVIDENCE}):"
     ]
     lines.extend([f" - {p}" for p in photos])
-    
-    y = 800
+    return lines
+
+PDF_TOP = 800
+PDF_BOTTOM = 40
+PDF_LINE_HEIGHT = 20
+
+def draw_pack_lines(c, lines: List[str]) -> int:
+    """Draw lines onto the current canvas page, breaking pages as needed. Returns pages used."""
+    pages = 1
+    y = PDF_TOP
     for line in lines:
+        if y < PDF_BOTTOM:
+            c.showPage()
+            pages += 1
+            y = PDF_TOP
         c.drawString(50, y, str(line))
-        y -= 20
+        y -= PDF_LINE_HEIGHT
+    return pages
+
+def render_pack_pdf(pdf_path: str, lines: List[str]) -> None:
+    from reportlab.pdfgen import canvas
+
+    with metrics.stage("pdf_render"), PACK_STORE.atomic_path(pdf_path) as tmp_path:
+        c = canvas.Canvas(tmp_path)
+        draw_pack_lines(c, lines)
+        c.save()
+
+def prepare_pack(req: PackReq, pack_id: str) -> Tuple[PackRes, str, List[str]]:
+    """Write the JSON pack and return its PackRes plus what the PDF render needs."""
+    json_path, pdf_path = PACK_STORE.paths(pack_id)
+    
+    if os.path.exists(json_path):
+        # Content-addressed hit: identical content was packed before.
+        with open(json_path, 'rb') as f:
+            json_bytes = f.read()
+    else:
+        # No timestamp in the payload: the file bytes, and so the sha256,
+        # depend only on the content. The file's mtime records creation.
+        payload = {"pack_id": pack_id, **_pack_content(req)}
+        json_bytes = json.dumps(payload, indent=2, sort_keys=True, default=str).encode('utf-8')
+        with metrics.stage("pack_json_write"):
+            PACK_STORE.write_bytes(json_path, json_bytes)
         
-    c.save()
+    sha256_hash = hashlib.sha256(json_bytes).hexdigest()
     
     abs_json = os.path.abspath(json_path)
     abs_pdf = os.path.abspath(pdf_path)
     
-    return PackRes(
+    res = PackRes(
         pack_id=pack_id,
         json_url=f"file://{abs_json}",
         pdf_url=f"file://{abs_pdf}",
         sha256=f"sha256:{sha256_hash}"
     )
+    return res, pdf_path, _pack_lines(req, pack_id)
+
+def build_pack(req: PackReq) -> PackRes:
+    """Build the JSON and PDF pack synchronously, skipping work on a hash hit."""
+    pack_id = pack_id_for(req)
+    res, pdf_path, lines = prepare_pack(req, pack_id)
+    if not os.path.exists(pdf_path):
+        render_pack_pdf(pdf_path, lines)
+    return res.model_copy(update={"status": pack_jobs.DONE})
+
+PACK_JOBS = pack_jobs.PackJobQueue(
+    lambda: executors.get_pool("pdf"),
+    max_jobs=_get_env_int("PACK_JOB_HISTORY", 10000),
+)
+
+def submit_pack(req: PackReq) -> PackRes:
+    """
+    Write the JSON pack now and queue the PDF render. The pack_id is derived
+    from the request content, so a retried request returns the existing job
+    and never renders twice.
+    """
+    pack_id = pack_id_for(req)
+
+    def prepare():
+        res, pdf_path, lines = prepare_pack(req, pack_id)
+        if os.path.exists(pdf_path):
+            return res, None
+        return res, lambda: render_pack_pdf(pdf_path, lines)
+
+    return PACK_JOBS.submit(pack_id, prepare)
+
+def pack_status(pack_id: str) -> Optional[PackStatusRes]:
+    job = PACK_JOBS.get(pack_id)
+    if job is not None:
+        res = job.result
+        return PackStatusRes(
+            pack_id=pack_id, status=job.status, json_url=res.json_url,
+            pdf_url=res.pdf_url, sha256=res.sha256, error=job.error
+        )
+    json_path, pdf_path = PACK_STORE.paths(pack_id)
+    if os.path.exists(pdf_path):
+        return PackStatusRes(
+            pack_id=pack_id, status=pack_jobs.DONE,
+            json_url=f"file://{os.path.abspath(json_path)}",
+            pdf_url=f"file://{os.path.abspath(pdf_path)}"
+        )
+    return None
+
+# Scrape-time views of state that is already tracked elsewhere.
+metrics.REGISTRY.gauge_collector(
+    "intelligence_result_cache", "Result cache counters and size by cache.", ("cache", "stat"),
+    lambda: {(name, stat): value for name, stats in cache_stats().items()
+             for stat, value in stats.items() if stat != "hit_ratio"},
+)
+metrics.REGISTRY.gauge_collector(
+    "intelligence_pack_jobs", "Pack render queue state and totals.", ("stat",),
+    lambda: {(stat,): value for stat, value in PACK_JOBS.stats().items()},
+)
+metrics.REGISTRY.gauge_collector(
+    "intelligence_canonical_incidents", "Canonical incidents in the live dedupe corpus.", (),
+    # Read without forcing the first load, so a scrape never waits on it.
+    lambda: {(): len(CANONICAL_STORE.snapshot()) if CANONICAL_STORE.loaded else 0},
+)
+metrics.REGISTRY.gauge_collector(
+    "intelligence_cluster_index", "In-memory cluster index size and write-behind queue.", ("stat",),
+    lambda: {("clusters",): len(CLUSTER_INDEX), ("pending_writes",): CLUSTER_INDEX.writer.pending,
+             ("flushed_writes",): CLUSTER_INDEX.writer.flushed},
+)
+metrics.REGISTRY.gauge_collector(
+    "intelligence_photo_hashes", "Photo hashes in the evidence duplicate index.", (),
+    lambda: {(): len(PHOTO_INDEX)},
+)
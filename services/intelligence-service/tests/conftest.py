@@ -0,0 +1,12 @@
+import atexit
+import os
+import shutil
+import tempfile
+
+# The service reads CLUSTER_DB and PACK_DIR at import time; point them at a
+# scratch directory before any test module imports services, so test runs
+# never write databases or packs into the service directory.
+_RUNTIME_DIR = tempfile.mkdtemp(prefix="intelligence-tests-")
+atexit.register(shutil.rmtree, _RUNTIME_DIR, ignore_errors=True)
+os.environ["CLUSTER_DB"] = os.path.join(_RUNTIME_DIR, "cluster.db")
+os.environ["PACK_DIR"] = os.path.join(_RUNTIME_DIR, "packs")
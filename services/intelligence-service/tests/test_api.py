@@ -1,6 +1,7 @@
 import os
 from fastapi.testclient import TestClient
 from main import app
+import schemas
 
 # Ensure we have a clean test env and no missing dependencies crash the imports
 os.environ["SLA_STATUS_SERVICE_URL"] = "http://localhost:9999" # invalid port to trigger fallback
@@ -129,3 +130,202 @@ def test_simulate_ulb_status_fallback():
     assert data["ticket_id"] == "TKT-456"
     assert data["status"] == "FILED"
     assert "updated_at" in data
+
+def _mepp(summary, lat=11.1, lon=77.3, ward="1", category="roads", photos=None):
+    return {
+        "version": "1.0",
+        "issue": {"summary": summary, "category": category, "details": ""},
+        "location": {"lat": lat, "lon": lon, "address_text": "st", "ward": ward},
+        "evidence": {"photos": photos or []},
+        "provenance": {"channel": "web", "raw_id": "123"}
+    }
+
+def test_batch_endpoints_match_single():
+    mepps = [
+        _mepp("overflowing garbage bin at main street market", 11.1085, 77.3411),
+        _mepp("broken streetlight near gandhi statue", 11.1090, 77.3415, photos=["a"]),
+        _mepp("lots of garbage", ward="14", category="sanitation/garbage"),
+        _mepp("overflowing garbage bin at main street market", 11.1085, 77.3411),
+    ]
+    for path in ["/dedupe", "/score", "/route"]:
+        response = client.post(f"{path}/batch", json={"mepps": mepps})
+        assert response.status_code == 200
+        results = response.json()["results"]
+        assert results == [client.post(path, json={"mepp": m}).json() for m in mepps]
+
+def test_cluster_batch_assigns_in_order():
+    summary = "batch test sewage overflow behind bus depot"
+    mepps = [_mepp(summary, 12.5, 78.5, ward="77"), _mepp(summary, 12.5, 78.5, ward="77")]
+    response = client.post("/cluster/batch", json={"mepps": mepps})
+    assert response.status_code == 200
+    first, second = response.json()["results"]
+    assert second["cluster_id"] == first["cluster_id"]
+    assert second["members"] == first["members"] + 1
+    assert not second["is_new"]
+
+def test_cluster_centroid_stays_bounded(monkeypatch):
+    import services
+    monkeypatch.setattr(services, "CLUSTER_CENTROID_MAX_TOKENS", 4)
+    base = "recurring garbage dump"
+    mepps = [_mepp(f"{base} extra{i}", 13.5, 79.5, ward="88") for i in range(6)]
+    results = client.post("/cluster/batch", json={"mepps": mepps}).json()["results"]
+    assert len({r["cluster_id"] for r in results}) == 1
+    services.CLUSTER_INDEX.writer.flush()
+    [(centroid,)] = services.CLUSTER_STORE.read_all("SELECT centroid FROM clusters WHERE cluster_id = ?",
+                                                    (results[0]["cluster_id"],))
+    assert len(centroid.split()) == 4
+    assert {"recurring", "garbage", "dump"} <= set(centroid.split())
+
+def test_cluster_matches_across_geocell_edge():
+    summary = "fallen tree blocking cycle lane"
+    # Same report filed ~10 m apart, either side of a geocell boundary.
+    edge = 4000 / 3000
+    first = client.post("/cluster", json={"mepp": _mepp(summary, 9.0 + edge - 0.00005, 76.5, ward="3")}).json()
+    second = client.post("/cluster", json={"mepp": _mepp(summary, 9.0 + edge + 0.00005, 76.5, ward="4")}).json()
+    assert first["geo_cell"] != second["geo_cell"]
+    assert second["cluster_id"] == first["cluster_id"]
+
+def test_cluster_ignores_distant_same_ward_cluster():
+    summary = "stray cattle on flyover ramp"
+    first = client.post("/cluster", json={"mepp": _mepp(summary, 10.2, 76.2, ward="55")}).json()
+    second = client.post("/cluster", json={"mepp": _mepp(summary, 10.25, 76.25, ward="55")}).json()
+    assert second["cluster_id"] != first["cluster_id"]
+
+def test_pack_is_idempotent_and_pollable():
+    import time
+    payload = {
+        "mepp": _mepp("pack idempotency check", photos=["u1"]),
+        "gating": {"status": "action", "final_confidence": 0.8},
+        "routing": {"dest": "ULB_ROADS", "confidence": 0.8},
+        "cluster": {"cluster_id": "CL-idem", "is_new": True, "members": 1, "text_similarity": 1.0},
+    }
+    first = client.post("/pack", json=payload).json()
+    second = client.post("/pack", json=payload).json()
+    assert first["pack_id"] == second["pack_id"]
+    assert first["sha256"] == second["sha256"]
+
+    for _ in range(100):
+        status_res = client.get(f"/pack/{first['pack_id']}").json()
+        if status_res["status"] == "done":
+            break
+        time.sleep(0.05)
+    assert status_res["status"] == "done"
+    assert status_res["pdf_url"] == first["pdf_url"]
+    assert client.get("/pack/PK-0000000000").status_code == 404
+    assert "queue_depth" in client.get("/stats").json()["pack_jobs"]
+
+def test_pack_bulk():
+    packs = [{
+        "mepp": _mepp(f"bulk api case {i}"),
+        "gating": {"status": "action", "final_confidence": 0.9},
+        "routing": {"dest": "ULB_ROADS", "confidence": 0.8},
+        "cluster": {"cluster_id": "CL-bulk", "is_new": True, "members": 1, "text_similarity": 1.0},
+    } for i in range(2)]
+    response = client.post("/pack/bulk", json={"packs": packs})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["bundle_id"].startswith("BP-")
+    assert data["cases"] == 2
+    assert len(data["packs"]) == 2
+    for pack in data["packs"]:
+        assert pack["pdf_url"] == f"{data['pdf_url']}#{pack['pack_id']}"
+        assert pack["status"] == "bundled"
+
+def test_pack_bulk_over_the_cap_is_rejected_up_front(monkeypatch):
+    import services
+    monkeypatch.setattr(services, "BULK_PACK_MAX_CASES", 1)
+    packs = [{
+        "mepp": _mepp(f"bulk cap case {i}"),
+        "gating": {"status": "action"},
+        "routing": {"dest": "ULB_ROADS"},
+        "cluster": {"cluster_id": "CL-cap", "is_new": True, "members": 1, "text_similarity": 1.0},
+    } for i in range(2)]
+    response = client.post("/pack/bulk", json={"packs": packs})
+    assert response.status_code == 413
+
+def test_analyze_matches_individual_endpoints():
+    mepp = _mepp("broken streetlight near gandhi statue", 11.1090, 77.3415, photos=["a"])
+    response = client.post("/analyze", json={"mepp": mepp, "cluster": False})
+    assert response.status_code == 200
+    data = response.json()
+    assert data["dedupe"] == client.post("/dedupe", json={"mepp": mepp}).json()
+    assert data["score"] == client.post("/score", json={"mepp": mepp}).json()
+    assert data["route"] == client.post("/route", json={"mepp": mepp}).json()
+    assert data["cluster"] is None
+
+    # A precomputed dedupe similarity gives the same score without a rescan.
+    scored = client.post("/score", json={"mepp": mepp, "dedupe_similarity": data["dedupe"]["similarity"]})
+    assert scored.json() == data["score"]
+
+    clustered = client.post("/analyze", json={"mepp": _mepp("analyze endpoint cluster check", 13.2, 79.1)})
+    assert clustered.status_code == 200
+    assert clustered.json()["cluster"]["cluster_id"].startswith("CL-")
+
+def test_mepp_sections_round_trip_and_validate():
+    mepp = _mepp("streetlight out near school", ward="14")
+    mepp["issue"]["extra_field"] = {"nested": [1, 2]}
+    mepp["location"]["landmark"] = "temple"
+    mepp["provenance"] = {"raw": {"blob": list(range(5))}}
+    parsed = schemas.MEPP(**mepp)
+    dumped = parsed.model_dump()
+    assert dumped["issue"] == mepp["issue"]
+    assert dumped["location"] == mepp["location"]
+    assert parsed.location.get("landmark") == "temple"
+    assert schemas.MEPP().location.get("address_text", "none") == "none"
+    assert schemas.MEPP(location={"ward": 14}).location.get("ward") == "14"
+    # Non-string values from upstream channels are coerced, not rejected.
+    loose = {**mepp, "issue": {"summary": 404, "category": None, "details": ["a"]}, "location": {"lat": [1], "ward": True}}
+    assert client.post("/route", json={"mepp": loose}).status_code == 200
+    assert schemas.MEPP(**loose).issue.get("summary") == "404"
+
+    response = client.post("/route", json={"mepp": {**mepp, "evidence": ["not", "a", "dict"]}})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["loc"] == ["body", "mepp", "evidence"]
+
+    response = client.post("/route", content=b'{"mepp": {', headers={"content-type": "application/json"})
+    assert response.status_code == 422
+    assert response.json()["detail"][0]["type"] == "json_invalid"
+
+def test_resubmitted_photo_is_flagged_despite_new_caption():
+    import services
+    first = _mepp("water pipe burst flooding the lane", 14.1, 80.1, ward="91")
+    first["case_id"] = "PHOTO-1"
+    first["evidence"] = {"photos": [{"url": "u1", "hash": "f0e1d2c3b4a59687"}]}
+    assert client.post("/cluster", json={"mepp": first}).status_code == 200
+    services.PHOTO_INDEX.ensure_loaded()
+
+    again = _mepp("totally different caption text", 15.0, 81.0, ward="92")
+    again["case_id"] = "PHOTO-2"
+    # Two bits off: a re-encoded copy of the same picture.
+    again["evidence"] = {"photos": [{"url": "u2", "hash": "f0e1d2c3b4a59684"}]}
+    dedupe = client.post("/dedupe", json={"mepp": again}).json()
+    assert dedupe["photo_duplicate_of"] == "PHOTO-1"
+    assert dedupe["photo_distance"] == 2
+
+    fresh = dict(again, evidence={"photos": [{"url": "u2", "hash": "0000000000000000"}]})
+    flagged = client.post("/score", json={"mepp": again}).json()
+    clean = client.post("/score", json={"mepp": fresh}).json()
+    assert flagged["score"] < clean["score"]
+    assert "earlier report" in flagged["hint"]
+    assert client.post("/analyze", json={"mepp": again, "cluster": False}).json()["score"] == flagged
+
+    # The first report never matches its own photo.
+    assert client.post("/dedupe", json={"mepp": first}).json()["photo_duplicate_of"] is None
+
+def test_cluster_window_skips_and_archives_stale_clusters():
+    import services
+    summary = "illegal hoarding blocking footpath"
+    old = dict(_mepp(summary, 16.2, 82.2, ward="93"), created_at="2020-01-01T09:00:00Z")
+    first = client.post("/cluster", json={"mepp": old}).json()
+    # A week later the cluster is still live; a year later it has expired.
+    week = dict(old, created_at="2020-01-08T09:00:00Z")
+    assert client.post("/cluster", json={"mepp": week}).json()["cluster_id"] == first["cluster_id"]
+    later = dict(old, created_at="2021-01-01T09:00:00Z")
+    second = client.post("/cluster", json={"mepp": later}).json()
+    assert second["cluster_id"] != first["cluster_id"] and second["is_new"]
+
+    assert services.archive_expired_clusters() >= 2
+    store = services.CLUSTER_STORE
+    assert store.read_all("SELECT cluster_id FROM clusters WHERE cluster_id = ?", (first["cluster_id"],)) == []
+    assert store.read_all("SELECT members FROM clusters_archive WHERE cluster_id = ?",
+                          (first["cluster_id"],)) == [(2,)]
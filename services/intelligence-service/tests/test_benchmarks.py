@@ -0,0 +1,36 @@
+import json
+
+import services
+from benchmarks import run
+from benchmarks.synthetic import Generator
+
+
+def test_percentile_nearest_rank():
+    values = [float(v) for v in range(1, 101)]
+    assert run.percentile(values, 50) == 50.0
+    assert run.percentile(values, 99) == 99.0
+    assert run.percentile([3.0], 95) == 3.0
+    assert run.percentile([], 50) == 0.0
+
+
+def test_synthetic_data_is_deterministic():
+    assert Generator(3).mepps(5) == Generator(3).mepps(5)
+    incidents = Generator(3).incidents(10)
+    assert len({i["id"] for i in incidents}) == 10
+
+
+def test_benchmark_run_writes_results(tmp_path):
+    out = tmp_path / "bench.json"
+    try:
+        run.main([
+            "--corpus-sizes", "50", "--concurrency", "1,2", "--requests", "5", "--warmup", "1",
+            "--targets", "dedupe,route", "--cache", "--output", str(out),
+        ])
+    finally:
+        services.CANONICAL_STORE.load()
+    report = json.loads(out.read_text())
+    assert {(r["target"], r["mode"], r["concurrency"]) for r in report["results"]} == {
+        (t, m, c) for t in ("dedupe", "route") for m in ("function", "asgi") for c in (1, 2)
+    }
+    assert all(r["requests"] == 5 and r["errors"] == 0 for r in report["results"])
+    assert run.compare(report, report["results"])
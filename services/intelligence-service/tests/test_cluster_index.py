@@ -0,0 +1,160 @@
+import random
+import struct
+
+import pytest
+
+import cluster_index
+import services
+from cluster_index import ClusterIndex, ClusterWriter
+from cluster_shards import ShardedClusterStore
+from cluster_store import ClusterStoreError
+from schemas import MEPP
+
+WORDS = ["garbage", "overflowing", "pothole", "broken", "streetlight", "water", "leak", "drain", "blocked"]
+
+
+def _index(tmp_path, name="c.db", shards=1):
+    store = ShardedClusterStore(str(tmp_path / name), shards=shards, region_cells=1)
+    return ClusterIndex(store, ClusterWriter(store, interval=0), snapshot_path=str(tmp_path / (name + ".snapshot")))
+
+
+def _use(monkeypatch, mode, index):
+    monkeypatch.setattr(services, "CLUSTER_INDEX_MODE", mode)
+    monkeypatch.setattr(services, "CLUSTER_STORE", index.store)
+    monkeypatch.setattr(services, "CLUSTER_INDEX", index)
+
+
+def _mepps(n, seed=3):
+    rng = random.Random(seed)
+    return [
+        MEPP(case_id=f"C-{i}", issue={"summary": " ".join(rng.sample(WORDS, 3))},
+             location={"lat": 11.1 + rng.choice([0, 0.0001, 0.02]), "lon": 77.3, "ward": "1"})
+        for i in range(n)
+    ]
+
+
+def _clusters(store):
+    return sorted(store.read_all("SELECT centroid, token_counts, members FROM clusters"))
+
+
+def test_memory_and_sqlite_modes_assign_identically(tmp_path, monkeypatch):
+    mepps = _mepps(60)
+    memory, sqlite = _index(tmp_path, "m.db"), _index(tmp_path, "s.db")
+    _use(monkeypatch, "memory", memory)
+    in_memory = services.cluster_batch(mepps)
+    memory.writer.flush()
+    _use(monkeypatch, "sqlite", sqlite)
+    in_sqlite = services.cluster_batch(mepps)
+
+    def shape(results):
+        ids = {}
+        return [(ids.setdefault(r.cluster_id, len(ids)), r.is_new, r.members, r.text_similarity) for r in results]
+
+    assert shape(in_memory) == shape(in_sqlite)
+    assert _clusters(memory.store) == _clusters(sqlite.store)
+
+
+def test_writer_coalesces_cluster_rows(tmp_path, monkeypatch):
+    index = _index(tmp_path)
+    _use(monkeypatch, "memory", index)
+    first = services.cluster_mepp(MEPP(case_id="A", issue={"summary": "pothole on main road"}, location={"ward": "9"}))
+    services.cluster_mepp(MEPP(case_id="B", issue={"summary": "pothole on main road"}, location={"ward": "9"}))
+    assert index.writer.pending == 3
+    assert index.writer.flush() == 3
+    assert index.store.read_all("SELECT cluster_id, members FROM clusters") == [(first.cluster_id, 2)]
+    assert index.store.read_all("SELECT COUNT(*) FROM cluster_members") == [(2,)]
+
+
+@pytest.mark.parametrize("shards", [1, 3])
+def test_restores_from_snapshot_and_catches_up(tmp_path, monkeypatch, shards):
+    index = _index(tmp_path, shards=shards)
+    _use(monkeypatch, "memory", index)
+    services.cluster_batch(_mepps(20))
+    assert index.save_snapshot() == len(index)
+    # Written after the snapshot, so restore reads it back from the table.
+    late = services.cluster_mepp(MEPP(case_id="late", issue={"summary": "fallen tree on cycle lane"},
+                                      location={"ward": "7"}))
+    index.writer.flush()
+    index.release()
+
+    restored = _index(tmp_path, shards=shards).ensure_loaded()
+    assert restored.restored_from == "snapshot"
+    assert len(restored) == len(index)
+    assert [e.cluster_id for e in restored.by_ward("7", 0.0)] == [late.cluster_id]
+    assert _clusters(restored.store) == _clusters(index.store)
+
+
+def test_bad_snapshot_falls_back_to_table(tmp_path, monkeypatch):
+    index = _index(tmp_path)
+    _use(monkeypatch, "memory", index)
+    services.cluster_batch(_mepps(5))
+    index.writer.flush()
+    index.release()
+    snapshot = tmp_path / "c.db.snapshot"
+    header = struct.pack("<8sIQ", cluster_index.SNAPSHOT_MAGIC, 1, 0)
+    for junk in (b"not a snapshot", header + b"{]", header + b'[["CL-1", "1"]]',
+                 header.replace(cluster_index.SNAPSHOT_MAGIC, b"CRCLIX01") + b"\x80\x04N."):
+        snapshot.write_bytes(junk)
+        restored = _index(tmp_path).ensure_loaded()
+        assert restored.restored_from == "table"
+        assert len(restored) == len(index)
+        restored.release()
+
+
+def test_failing_database_stops_new_work_once_backlog_is_full(tmp_path, monkeypatch):
+    index = _index(tmp_path)
+    index.writer.max_pending = 2
+    _use(monkeypatch, "memory", index)
+    services.cluster_mepp(MEPP(case_id="A", issue={"summary": "leaking drain"}, location={"ward": "3"}))
+
+    def fail(*args, **kwargs):
+        raise ClusterStoreError("disk full")
+
+    monkeypatch.setattr(index.store.shards[0], "run_in_transaction", fail)
+    with pytest.raises(ClusterStoreError):
+        index.writer.flush()
+    assert index.writer.pending == 2
+    with pytest.raises(ClusterStoreError):
+        services.cluster_mepp(MEPP(case_id="B", issue={"summary": "leaking drain"}, location={"ward": "3"}))
+    monkeypatch.undo()
+    assert index.writer.flush() == 2
+
+
+def test_one_index_owns_a_store(tmp_path):
+    index = _index(tmp_path).ensure_loaded()
+    with pytest.raises(ClusterStoreError):
+        _index(tmp_path).ensure_loaded()
+    index.release()
+    assert _index(tmp_path).ensure_loaded().loaded
+
+
+def test_flush_adds_member_deltas_to_the_stored_count(tmp_path, monkeypatch):
+    index = _index(tmp_path)
+    _use(monkeypatch, "memory", index)
+    mepp = MEPP(case_id="A", issue={"summary": "pothole on main road"}, location={"ward": "9"})
+    first = services.cluster_mepp(mepp)
+    index.writer.flush()
+    # Members committed behind the index's back, e.g. by an sqlite-mode writer.
+    with index.store.shards[0].connection() as conn:
+        conn.execute("UPDATE clusters SET members = members + 5 WHERE cluster_id = ?", (first.cluster_id,))
+        conn.commit()
+    services.cluster_mepp(mepp)
+    index.writer.flush()
+    assert index.store.read_all("SELECT members FROM clusters") == [(7,)]
+
+
+def test_merge_lets_new_vocabulary_into_a_full_centroid(tmp_path):
+    index = _index(tmp_path)
+    entry = index.create("CL-1", "1", "nogeo", None, None, ["a", "b", "c", "d"], "t", 1e12, 4)
+    for _ in range(10):
+        index.merge(entry, ["a", "e", "f"], "t", 1e12, 4)
+    assert set(entry.tokens[:3]) == {"a", "e", "f"}
+    assert entry.counts[:3] == (11, 11, 11)  # Space-Saving counts e and f from the evicted floor
+
+
+def test_centroid_tokens_stay_out_of_the_global_token_dictionary(tmp_path):
+    import textsim
+    before = len(textsim.TOKENS)
+    index = _index(tmp_path)
+    index.create("CL-1", "1", "nogeo", None, None, ["zzcentroidonlytoken"], "t", 1e12, 4)
+    assert len(textsim.TOKENS) == before
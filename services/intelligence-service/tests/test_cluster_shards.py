@@ -0,0 +1,134 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import services
+from cluster_index import ClusterIndex, ClusterWriter
+from cluster_shards import ShardedClusterStore, shard_paths
+from schemas import MEPP
+
+
+def _use(monkeypatch, mode, store):
+    index = ClusterIndex(store, ClusterWriter(store, interval=0))
+    monkeypatch.setattr(services, "CLUSTER_INDEX_MODE", mode)
+    monkeypatch.setattr(services, "CLUSTER_STORE", store)
+    monkeypatch.setattr(services, "CLUSTER_INDEX", index)
+    return index
+
+
+def _mepp(case_id, summary, lat=None, lon=None, ward="1"):
+    location = {"ward": ward}
+    if lat is not None:
+        location.update(lat=lat, lon=lon)
+    return MEPP(case_id=case_id, issue={"summary": summary}, location=location)
+
+
+def test_shard_paths_and_routing_are_deterministic(tmp_path):
+    path = str(tmp_path / "cluster.db")
+    assert shard_paths(path, 1) == [path]
+    assert shard_paths(path, 4)[2] == str(tmp_path / "cluster-02of04.db")
+
+    store = ShardedClusterStore(path, shards=4, region_cells=10)
+    other = ShardedClusterStore(path, shards=4, region_cells=10)
+    cells = [f"{r}:{c}" for r in range(0, 100, 7) for c in range(0, 100, 7)]
+    routes = [store.shard_for(cell, "w") for cell in cells]
+    assert routes == [other.shard_for(cell, "w") for cell in cells]
+    assert len(set(routes)) > 1
+    # A whole region lives on one shard; reports without coordinates go by ward.
+    assert len({store.shard_for(f"{r}:{c}", "w") for r in range(10, 20) for c in range(30, 40)}) == 1
+    assert store.shard_for("nogeo", "7") == store.shard_for("nogeo", "7")
+    assert sorted(sum(store.cells_by_shard(cells).values(), [])) == sorted(cells)
+
+
+def test_multi_shard_transaction_and_read_all(tmp_path):
+    store = ShardedClusterStore(str(tmp_path / "c.db"), shards=3)
+    store.init_schema()
+
+    def write(cursors):
+        for shard, c in cursors.items():
+            c.execute("INSERT INTO cluster_members (cluster_id, case_id) VALUES (?, ?)", (f"CL-{shard}", "x"))
+        return len(cursors)
+
+    assert store.run_in_transaction(write, [2, 0, 1]) == 3
+    assert sorted(store.read_all("SELECT cluster_id FROM cluster_members")) == [("CL-0",), ("CL-1",), ("CL-2",)]
+
+    def fail(cursors):
+        write(cursors)
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        store.run_in_transaction(fail, [0, 2])
+    assert len(store.read_all("SELECT cluster_id FROM cluster_members")) == 3
+
+
+@pytest.mark.parametrize("mode", ["memory", "sqlite"])
+def test_sharded_store_assigns_like_a_single_file(tmp_path, monkeypatch, mode):
+    # Reports straddling region edges, plus some without coordinates.
+    mepps = []
+    for i in range(40):
+        lat = 11.1 + (i % 4) * 0.0004
+        lon = 77.3 + (i % 3) * 0.0004
+        mepps.append(_mepp(f"C-{i}", ["garbage pile", "broken streetlight", "water leak"][i % 3], lat, lon))
+    mepps += [_mepp(f"N-{i}", "blocked drain", ward=str(i % 2)) for i in range(6)]
+
+    def shape(results):
+        ids = {}
+        return [(ids.setdefault(r.cluster_id, len(ids)), r.is_new, r.members) for r in results]
+
+    single = ShardedClusterStore(str(tmp_path / "one.db"))
+    single.init_schema()
+    index = _use(monkeypatch, mode, single)
+    expected = shape(services.cluster_batch(mepps))
+    index.writer.flush()
+
+    sharded = ShardedClusterStore(str(tmp_path / "many.db"), shards=4, region_cells=1)
+    sharded.init_schema()
+    index = _use(monkeypatch, mode, sharded)
+    assert shape(services.cluster_batch(mepps)) == expected
+    index.writer.flush()
+    rows = "SELECT members FROM clusters"
+    used = 0
+    for store in sharded.shards:
+        with store.connection() as conn:
+            used += bool(conn.execute(rows).fetchall())
+    assert used > 1
+    assert sorted(sharded.read_all(rows)) == sorted(single.read_all(rows))
+    # Every member row sits in the shard of its cluster.
+    for store in sharded.shards:
+        with store.connection() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM cluster_members m LEFT JOIN clusters c "
+                                "USING (cluster_id) WHERE c.cluster_id IS NULL").fetchone()[0] == 0
+
+
+def test_concurrent_writers_on_different_shards(tmp_path, monkeypatch):
+    store = ShardedClusterStore(str(tmp_path / "c.db"), shards=2, region_cells=1)
+    store.init_schema()
+    _use(monkeypatch, "sqlite", store)
+    errors = []
+
+    def work(lat):
+        try:
+            for i in range(20):
+                services.cluster_mepp(_mepp(f"{lat}-{i}", "pothole on main road", lat, 77.3))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work, args=(lat,)) for lat in (10.0, 12.0)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == []
+    assert sorted(store.read_all("SELECT members FROM clusters")) == [(20,), (20,)]
+
+
+def test_memory_index_refuses_shards(tmp_path):
+    env = dict(os.environ, CLUSTER_SHARDS="2", CLUSTER_INDEX="memory", CLUSTER_DB=str(tmp_path / "c.db"))
+    service_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.run([sys.executable, "-c", "import services"], cwd=service_dir, env=env,
+                          capture_output=True, text=True)
+    assert proc.returncode != 0
+    assert "CLUSTER_SHARDS > 1 needs CLUSTER_INDEX=sqlite" in proc.stderr
@@ -0,0 +1,134 @@
+import sqlite3
+import threading
+
+import pytest
+
+from cluster_store import (
+    INSERT_CLUSTER, SELECT_CANDIDATES_BY_WARD, UPDATE_CLUSTER, ClusterStore, ClusterStoreError, RetryPolicy,
+    count_tokens, decode_centroid, decode_token_counts, encode_centroid, select_candidates_by_cells, top_tokens,
+)
+
+
+def test_store_uses_wal_and_reuses_connections(tmp_path):
+    store = ClusterStore(str(tmp_path / "c.db"), pool_size=2)
+    with store.connection() as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        first = conn
+    with store.connection() as conn:
+        assert conn is first
+    store.close()
+
+
+def test_transaction_is_all_or_nothing(tmp_path):
+    store = ClusterStore(str(tmp_path / "c.db"))
+
+    def insert_then_fail(c):
+        c.execute("INSERT INTO clusters (cluster_id, members) VALUES ('CL-x', 1)")
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        store.run_in_transaction(insert_then_fail)
+    with store.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM clusters").fetchone()[0] == 0
+
+
+def test_lock_contention_surfaces_error(tmp_path):
+    path = str(tmp_path / "c.db")
+    store = ClusterStore(path, busy_timeout_ms=10, retry=RetryPolicy(attempts=2, base_delay=0.001))
+    store.init_schema()
+    blocker = sqlite3.connect(path, isolation_level=None)
+    blocker.execute("BEGIN IMMEDIATE")
+    try:
+        with pytest.raises(ClusterStoreError):
+            store.run_in_transaction(lambda c: c.execute("INSERT INTO clusters (cluster_id) VALUES ('CL-y')"))
+    finally:
+        blocker.execute("ROLLBACK")
+        blocker.close()
+
+
+def test_concurrent_writers_do_not_drop_rows(tmp_path):
+    store = ClusterStore(str(tmp_path / "c.db"), pool_size=4)
+
+    def writer(n):
+        for i in range(25):
+            store.run_in_transaction(
+                lambda c: c.execute("INSERT INTO cluster_members (cluster_id, case_id) VALUES (?, ?)",
+                                    (f"CL-{n}", str(i))))
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with store.connection() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM cluster_members").fetchone()[0] == 100
+
+
+def test_centroid_round_trip_and_legacy_json():
+    assert decode_centroid(encode_centroid({"pothole", "road"})) == {"pothole", "road"}
+    assert decode_centroid('["pothole", "road"]') == {"pothole", "road"}
+    assert decode_centroid(None) == set()
+
+
+def test_candidate_lookup_uses_indexes(tmp_path):
+    store = ClusterStore(str(tmp_path / "c.db"))
+    with store.connection() as conn:
+        ward_plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN " + SELECT_CANDIDATES_BY_WARD, ("1", 0.0)))
+        cell_plan = " ".join(row[-1] for row in conn.execute(
+            "EXPLAIN QUERY PLAN " + select_candidates_by_cells(9), [str(i) for i in range(9)] + [0.0]))
+    assert "idx_clusters_ward" in ward_plan
+    assert "idx_clusters_geocell" in cell_plan
+
+
+def test_concurrent_merges_keep_member_count(tmp_path):
+    store = ClusterStore(str(tmp_path / "c.db"), pool_size=4)
+    store.run_in_transaction(lambda c: c.execute(INSERT_CLUSTER, ("CL-1", "1", "g", None, None, "a", "1", "t", "t", 1.0)))
+
+    def merge():
+        for _ in range(25):
+            store.run_in_transaction(lambda c: c.execute(UPDATE_CLUSTER, ("a", "1", "t", 2.0, "CL-1")).fetchone())
+
+    threads = [threading.Thread(target=merge) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    with store.connection() as conn:
+        assert conn.execute("SELECT members FROM clusters").fetchone()[0] == 101
+
+
+def test_top_tokens_caps_centroid_by_frequency():
+    counts = decode_token_counts("garbage bin", "3 1")
+    for tok in ["garbage", "overflow", "market"]:
+        counts[tok] = counts.get(tok, 0) + 1
+    centroid, token_counts = top_tokens(counts, 2)
+    assert centroid == "garbage bin"
+    assert token_counts == "4 1"
+    assert decode_token_counts(centroid, token_counts) == {"garbage": 4, "bin": 1}
+    # Legacy rows without counts weigh every token once.
+    assert decode_token_counts('["a", "b"]', None) == {"a": 1, "b": 1}
+
+
+def test_schema_migrates_existing_database(tmp_path):
+    path = str(tmp_path / "c.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE clusters (cluster_id TEXT PRIMARY KEY, ward TEXT, geocell TEXT, "
+                 "centroid TEXT, members INT, created_at TEXT, updated_at TEXT)")
+    conn.commit()
+    conn.close()
+    store = ClusterStore(path)
+    with store.connection() as conn:
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(clusters)")}
+    assert "token_counts" in columns
+
+
+def test_recurring_new_tokens_overtake_a_full_centroid():
+    counts = {}
+    count_tokens(counts, {"a", "b", "c", "d"}, 4)
+    for _ in range(10):
+        count_tokens(counts, {"e", "f"}, 4)
+    centroid, token_counts = top_tokens(counts, 4)
+    assert centroid.split()[:2] == ["e", "f"]
+    assert token_counts.split()[:2] == ["11", "11"]
+    assert len(counts) == 4
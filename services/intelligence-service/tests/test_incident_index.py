@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+import scoring
+import services
+from incident_index import IncidentIndex
+from result_cache import ResultCache
+from schemas import MEPP
+
+VOCAB = ["garbage", "bin", "overflowing", "pothole", "road", "streetlight", "broken",
+         "water", "leak", "pipe", "drain", "blocked", "market", "near", "school", "at"]
+
+
+@pytest.fixture(autouse=True)
+def no_result_cache(monkeypatch):
+    # These tests swap the corpus underneath the store; never serve cached results.
+    monkeypatch.setattr(services, "DEDUPE_CACHE", ResultCache(0))
+
+
+def _brute_force(mepp, incidents):
+    tokens = services.tokenize(str(mepp.issue.get("summary", "")))
+    lat, lon = mepp.location.get("lat"), mepp.location.get("lon")
+    best_sim, best_id, best_dist = 0.0, None, None
+    for inc in incidents:
+        text_sim = services.jaccard_similarity(tokens, services.tokenize(inc["summary"]))
+        dist_km = None
+        bonus = 0.0
+        if lat is not None and lon is not None:
+            dist_km = services.haversine(float(lat), float(lon), inc["lat"], inc["lon"])
+            if dist_km < 0.30:
+                bonus = 1.0
+        sim = 0.7 * text_sim + 0.3 * bonus
+        if sim > best_sim:
+            best_sim, best_id, best_dist = sim, inc["id"], dist_km
+    return best_id, best_sim, best_dist
+
+
+def test_indexed_dedupe_matches_full_scan(monkeypatch):
+    rng = random.Random(7)
+    incidents = [
+        {
+            "id": f"INC-{i:05d}",
+            "summary": " ".join(rng.sample(VOCAB, rng.randint(2, 6))),
+            "lat": 11.10 + rng.uniform(-0.02, 0.02),
+            "lon": 77.34 + rng.uniform(-0.02, 0.02),
+        }
+        for i in range(2000)
+    ]
+    monkeypatch.setattr(services.CANONICAL_STORE, "_snapshot",
+                        IncidentIndex.from_incidents(incidents, services.tokenize))
+    monkeypatch.setenv("DEDUPE_THRESHOLD", "0.65")
+
+    for _ in range(200):
+        location = {}
+        if rng.random() < 0.8:
+            location = {"lat": 11.10 + rng.uniform(-0.03, 0.03), "lon": 77.34 + rng.uniform(-0.03, 0.03)}
+        mepp = MEPP(issue={"summary": " ".join(rng.sample(VOCAB, rng.randint(1, 5)))}, location=location)
+        res = services.dedupe_mepp(mepp)
+        best_id, best_sim, best_dist = _brute_force(mepp, incidents)
+        assert res.similarity == round(best_sim, 4)
+        assert res.distance_km == best_dist
+        assert res.duplicate_of == (best_id if best_sim >= 0.65 else None)
+
+
+def test_geo_candidates_cover_radius():
+    incidents = [{"id": "A", "summary": "x", "lat": 11.1085, "lon": 77.3411}]
+    index = IncidentIndex.from_incidents(incidents, services.tokenize)
+    # ~0.29 km north and east of the incident, across several grid cells
+    assert index.geo_candidates(11.1085 + 0.0026, 77.3411, 0.30) == {0}
+    assert index.geo_candidates(11.1085, 77.3411 + 0.0026, 0.30) == {0}
+    assert index.geo_candidates(11.2, 77.3411, 0.30) == set()
+
+
+def test_vectorized_and_python_backends_agree(monkeypatch):
+    rng = random.Random(11)
+    incidents = [
+        {
+            "id": f"INC-{i:05d}",
+            "summary": " ".join(rng.sample(VOCAB, rng.randint(2, 6))),
+            "lat": 11.10 + rng.uniform(-0.01, 0.01),
+            "lon": 77.34 + rng.uniform(-0.01, 0.01),
+        }
+        for i in range(500)
+    ]
+    monkeypatch.setattr(services.CANONICAL_STORE, "_snapshot",
+                        IncidentIndex.from_incidents(incidents, services.tokenize))
+    mepps = [
+        MEPP(issue={"summary": " ".join(rng.sample(VOCAB, 3))},
+             location={"lat": 11.10 + rng.uniform(-0.01, 0.01), "lon": 77.34 + rng.uniform(-0.01, 0.01)})
+        for _ in range(50)
+    ]
+    monkeypatch.setattr(scoring, "SCORING_VECTOR_MIN", 0)
+    vectorized = [services.dedupe_mepp(m) for m in mepps]
+    monkeypatch.setattr(scoring, "SCORING_BACKEND", "python")
+    scalar = [services.dedupe_mepp(m) for m in mepps]
+    assert vectorized == scalar
@@ -0,0 +1,59 @@
+import json
+import sqlite3
+
+import services
+from incident_store import IncidentStore
+
+
+def test_loads_json_and_reloads_on_change(tmp_path):
+    path = tmp_path / "incidents.json"
+    path.write_text(json.dumps([{"id": "A", "summary": "Broken Pipe", "lat": 11.1, "lon": 77.3}]))
+    store = IncidentStore(services.tokenize, source=str(path))
+    index = store.load()
+    assert index.ids == ("A",)
+    assert index.tokens[0] == frozenset({"broken", "pipe"})
+    assert not store.reload_if_changed()
+
+    path.write_text(json.dumps({"incidents": [
+        {"id": "B", "summary": "pothole", "lat": 11.2, "lon": 77.4},
+        {"id": "C", "summary": "no coordinates"},
+    ]}))
+    assert store.reload_if_changed()
+    current = store.snapshot()
+    assert current.ids == ("B", "C")
+    assert current.version > index.version
+    assert not current.has_geo(1)
+    # The old snapshot is untouched by the swap.
+    assert index.ids == ("A",)
+
+
+def test_bad_reload_keeps_previous_corpus(tmp_path):
+    path = tmp_path / "incidents.jsonl"
+    path.write_text('{"id": "A", "summary": "garbage", "lat": 1, "lon": 2}\n')
+    store = IncidentStore(services.tokenize, source=str(path))
+    store.load()
+    path.write_text("not json\n")
+    assert not store.reload_if_changed()
+    assert store.snapshot().ids == ("A",)
+
+
+def test_loads_sqlite_table(tmp_path):
+    db = tmp_path / "incidents.db"
+    conn = sqlite3.connect(db)
+    conn.execute("CREATE TABLE canonical_incidents (id TEXT, summary TEXT, lat REAL, lon REAL)")
+    conn.execute("INSERT INTO canonical_incidents VALUES ('X', 'leaking water pipe', 11.1, 77.3)")
+    conn.commit()
+    conn.close()
+    store = IncidentStore(services.tokenize, source=f"sqlite:///{db}")
+    assert store.load().ids == ("X",)
+
+
+def test_first_snapshot_loads_lazily(tmp_path):
+    path = tmp_path / "incidents.json"
+    path.write_text(json.dumps([{"id": "A", "summary": "garbage", "lat": 1, "lon": 2}]))
+    store = IncidentStore(services.tokenize, source=str(path))
+    assert not store.loaded
+    assert store.snapshot().ids == ("A",)
+    assert store.loaded
+    version = store.version
+    assert store.ensure_loaded().version == version
@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+import metrics
+from cluster_store import ClusterStoreError, RetryPolicy
+from main import app
+
+client = TestClient(app)
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = metrics.Registry()
+    hist = registry.histogram("demo_seconds", "Demo.", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "a")
+    text = registry.render()
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 2' in text
+    assert 'demo_seconds_bucket{stage="a",le="1"} 3' in text
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 4' in text
+    assert 'demo_seconds_count{stage="a"} 4' in text
+    assert "# TYPE demo_seconds histogram" in text
+    with pytest.raises(ValueError):
+        hist.observe(1.0)
+
+
+def test_retry_policy_counts_retries_and_exhaustion():
+    before = metrics.SQLITE_RETRIES.value("metrics test")
+    failed_before = metrics.SQLITE_RETRY_FAILURES.value("metrics test")
+
+    def locked():
+        raise sqlite3.OperationalError("database is locked")
+
+    with pytest.raises(ClusterStoreError):
+        RetryPolicy(attempts=3, base_delay=0.0, max_delay=0.0).run(locked, "metrics test")
+    assert metrics.SQLITE_RETRIES.value("metrics test") == before + 2
+    assert metrics.SQLITE_RETRY_FAILURES.value("metrics test") == failed_before + 1
+
+
+def test_metrics_endpoint_reports_requests_and_stages():
+    mepp = {"issue": {"summary": "metrics endpoint streetlight check", "category": "electrical"},
+            "location": {"lat": 11.2, "lon": 77.2, "ward": "3"}}
+    assert client.post("/dedupe", json={"mepp": mepp}).status_code == 200
+    assert client.post("/route", json={"mepp": mepp}).status_code == 200
+    assert client.get("/pack/PK-000000").status_code == 404
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'intelligence_http_requests_total{method="POST",route="/route",status="200"}' in text
+    assert 'intelligence_http_requests_total{method="GET",route="/pack/{pack_id}",status="404"}' in text
+    assert 'intelligence_http_request_seconds_bucket{method="POST",route="/dedupe",le="+Inf"}' in text
+    assert 'intelligence_stage_seconds_count{stage="route_match"}' in text
+    assert 'intelligence_stage_seconds_count{stage="dedupe_candidates"}' in text
+    assert 'intelligence_result_cache{cache="dedupe",stat="hits"}' in text
+    assert 'intelligence_pack_jobs{stat="queue_depth"}' in text
@@ -0,0 +1,62 @@
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+import metrics
+from middleware import RequestMiddleware
+
+app = FastAPI()
+app.add_middleware(RequestMiddleware, api_key="secret", trace_header="X-Trace-Id")
+
+
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+
+@app.get("/items/{item_id}")
+async def item(item_id: str, request: Request):
+    return {"item_id": item_id, "trace_id": request.state.trace_id}
+
+
+@app.get("/boom")
+async def boom():
+    raise RuntimeError("boom")
+
+
+client = TestClient(app, raise_server_exceptions=False)
+AUTH = {"X-API-Key": "secret"}
+
+
+def test_auth_and_public_paths():
+    assert client.get("/items/1").status_code == 403
+    assert client.get("/items/1", headers={"X-API-Key": "wrong"}).status_code == 403
+    assert client.get("/items/1", headers=AUTH).status_code == 200
+    assert client.get("/healthz").status_code == 200
+    assert client.get("/healthz/").status_code != 403
+    assert client.options("/items/1").status_code != 403
+
+
+def test_path_normalization():
+    response = client.get("/items///7", headers=AUTH)
+    assert response.status_code == 200
+    assert response.json()["item_id"] == "7"
+
+
+def test_trace_id_is_propagated_or_minted():
+    response = client.get("/items/1", headers={**AUTH, "X-Trace-Id": "abc-123"})
+    assert response.headers["x-trace-id"] == "abc-123"
+    assert response.json()["trace_id"] == "abc-123"
+
+    first = client.get("/items/1", headers=AUTH)
+    second = client.get("/items/1", headers=AUTH)
+    assert first.headers["x-trace-id"] == first.json()["trace_id"]
+    assert first.headers["x-trace-id"] != second.headers["x-trace-id"]
+
+
+def test_unhandled_error_returns_500_with_trace_id():
+    before = metrics.REQUESTS.value("GET", "/boom", 500)
+    response = client.get("/boom", headers={**AUTH, "X-Trace-Id": "t-500"})
+    assert response.status_code == 500
+    assert response.json() == {"error": "Internal Server Error", "trace_id": "t-500"}
+    assert response.headers["x-trace-id"] == "t-500"
+    assert metrics.REQUESTS.value("GET", "/boom", 500) == before + 1
@@ -0,0 +1,46 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import pack_jobs
+from schemas import PackRes
+
+
+def _res(pack_id):
+    return PackRes(pack_id=pack_id, json_url=f"/{pack_id}.json", pdf_url=f"/{pack_id}.pdf", sha256="x")
+
+
+def test_prepare_runs_outside_the_queue_lock():
+    queue = pack_jobs.PackJobQueue(lambda: ThreadPoolExecutor(1))
+    entered, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow_prepare():
+        calls.append(1)
+        entered.set()
+        release.wait(5)
+        return _res("PK-a"), None
+
+    with ThreadPoolExecutor(2) as pool:
+        first = pool.submit(queue.submit, "PK-a", slow_prepare)
+        assert entered.wait(5)
+        # Neither stats nor another pack wait on the slow prepare.
+        assert queue.stats()["queue_depth"] == 0
+        assert queue.submit("PK-b", lambda: (_res("PK-b"), None)).status == pack_jobs.DONE
+        second = pool.submit(queue.submit, "PK-a", slow_prepare)
+        release.set()
+        assert first.result(5).status == second.result(5).status == pack_jobs.DONE
+    assert len(calls) == 1
+
+
+def test_failed_prepare_leaves_no_placeholder():
+    queue = pack_jobs.PackJobQueue(lambda: ThreadPoolExecutor(1))
+
+    def fail():
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        queue.submit("PK-a", fail)
+    assert queue.get("PK-a") is None
+    assert queue.submit("PK-a", lambda: (_res("PK-a"), None)).status == pack_jobs.DONE
@@ -0,0 +1,79 @@
+import os
+
+import pytest
+
+import services
+from pack_store import PackStore
+from schemas import PackReq
+
+
+def _req(summary="pack store check"):
+    return PackReq(
+        mepp={"case_id": "C-1", "issue": {"summary": summary}, "evidence": {"photos": ["u1"]}},
+        gating={"status": "action", "final_confidence": 0.9},
+        routing={"dest": "ULB_ROADS", "confidence": 0.8},
+        cluster={"cluster_id": "CL-1", "is_new": True, "members": 1, "text_similarity": 1.0},
+    )
+
+
+def test_paths_are_sharded_by_hash(tmp_path):
+    store = PackStore(str(tmp_path))
+    json_path, pdf_path = store.paths("PK-abcdef0123456789")
+    assert json_path == os.path.join(str(tmp_path), "ab", "cd", "PK-abcdef0123456789.json")
+    assert pdf_path.endswith(os.path.join("ab", "cd", "PK-abcdef0123456789.pdf"))
+
+
+def test_atomic_path_leaves_nothing_on_failure(tmp_path):
+    store = PackStore(str(tmp_path))
+    target = os.path.join(str(tmp_path), "ab", "cd", "PK-abcd.pdf")
+    with pytest.raises(RuntimeError):
+        with store.atomic_path(target) as tmp:
+            open(tmp, "w").write("partial")
+            raise RuntimeError("render crashed")
+    assert os.listdir(os.path.dirname(target)) == []
+
+
+def test_identical_content_is_stored_once(tmp_path, monkeypatch):
+    monkeypatch.setattr(services, "PACK_STORE", PackStore(str(tmp_path)))
+    rendered = []
+    original = services.render_pack_pdf
+    monkeypatch.setattr(services, "render_pack_pdf", lambda *a: rendered.append(a) or original(*a))
+
+    first = services.build_pack(_req())
+    second = services.build_pack(_req())
+    assert first == second
+    assert len(rendered) == 1
+    assert services.build_pack(_req("other content")).sha256 != first.sha256
+    files = [f for _, _, names in os.walk(tmp_path) for f in names]
+    assert len(files) == 4  # one JSON + PDF pair per distinct content
+
+
+def test_bulk_pack_renders_one_combined_pdf(tmp_path, monkeypatch, capsys):
+    import json
+    import bulk_pack
+
+    monkeypatch.setattr(services, "PACK_STORE", PackStore(str(tmp_path)))
+    reqs = [_req(f"bulk case {i}") for i in range(3)]
+    bundle = bulk_pack.build_bulk_pack(reqs)
+    assert bundle.cases == 3
+    assert bundle.pages == 4  # one page per case plus the table of contents
+    pdf_path = bundle.pdf_url[len("file://"):]
+    with open(pdf_path, "rb") as f:
+        assert f.read(5) == b"%PDF-"
+    # Each case still gets its own content-addressed JSON pack.
+    assert os.path.exists(services.PACK_STORE.paths(services.pack_id_for(reqs[0]))[0])
+
+    source = tmp_path / "reqs.jsonl"
+    source.write_text("\n".join(r.model_dump_json() for r in reqs) + "\n")
+    assert bulk_pack.main([str(source)]) == 0
+    out = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert len(out) == 4
+    assert out[-1]["bundle_id"] == bundle.bundle_id
+    assert out[0]["pdf_url"] == f"{bundle.pdf_url}#{out[0]['pack_id']}"
+
+    monkeypatch.setattr(services, "BULK_PACK_MAX_CASES", 2)
+    fresh = [_req(f"over the cap {i}") for i in range(3)]
+    with pytest.raises(ValueError):
+        bulk_pack.build_bulk_pack(fresh)
+    # Rejected before any case's JSON pack is written.
+    assert not any(os.path.exists(services.PACK_STORE.paths(services.pack_id_for(r))[0]) for r in fresh)
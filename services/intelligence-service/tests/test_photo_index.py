@@ -0,0 +1,73 @@
+import random
+
+import pytest
+
+from photo_index import PhotoHashIndex, from_signed, parse_phash, to_signed
+
+
+def _flip(h, bits):
+    for b in bits:
+        h ^= 1 << b
+    return h
+
+
+def test_parse_phash_accepts_only_64_bit_hex():
+    assert parse_phash("ffffffffffffffff") == (1 << 64) - 1
+    assert parse_phash("0x00000000000000aB") == 0xab
+    assert parse_phash("a" * 64) is None
+    assert parse_phash("not-a-hash-12345") is None
+    assert parse_phash(None) is None
+    for h in (0, 1, (1 << 63) - 1, 1 << 63, (1 << 64) - 1):
+        assert from_signed(to_signed(h)) == h
+        assert -(1 << 63) <= to_signed(h) < 1 << 63
+
+
+def test_search_matches_brute_force():
+    rng = random.Random(4)
+    index = PhotoHashIndex(max_distance=6, chunks=4)
+    stored = [rng.getrandbits(64) for _ in range(3000)]
+    index.add_many((h, f"C{i}") for i, h in enumerate(stored))
+    for i in range(200):
+        base = stored[rng.randrange(len(stored))] if i % 2 else rng.getrandbits(64)
+        query = _flip(base, rng.sample(range(64), rng.randint(0, 8)))
+        expected = sorted(((h ^ query).bit_count(), eid) for eid, h in enumerate(stored)
+                          if (h ^ query).bit_count() <= 6)
+        assert index.search(query) == expected
+
+
+def test_nearest_skips_own_case_and_prefers_closest():
+    index = PhotoHashIndex(max_distance=6)
+    h = 0x0123456789ABCDEF
+    index.add(h, "OWN")
+    index.add(_flip(h, [1, 2, 3]), "FAR")
+    index.add(_flip(h, [5]), "NEAR")
+    assert index.nearest([h]) == ("OWN", 0)
+    assert index.nearest([h], exclude_owner="OWN") == ("NEAR", 1)
+    assert index.nearest([_flip(h, range(20))]) is None
+    assert index.nearest([]) is None
+
+
+def test_loader_runs_once_on_first_use():
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return [(42, "A")]
+
+    index = PhotoHashIndex(loader=loader)
+    assert not index.loaded
+    assert index.nearest([42]) == ("A", 0)
+    index.ensure_loaded()
+    assert calls == [1] and len(index) == 1
+
+
+def test_chunks_must_divide_hash_bits():
+    with pytest.raises(ValueError):
+        PhotoHashIndex(chunks=5)
+
+
+def test_photo_benchmark_recall():
+    from benchmarks import photos
+
+    row = photos.measure(2000, 50, max_distance=6, chunks=4, seed=3, scan_queries=50)
+    assert row["recall"] == 1.0 and row["checked_matches"] > 0
@@ -0,0 +1,47 @@
+import time
+
+import services
+from result_cache import ResultCache, content_key
+from schemas import MEPP
+
+
+def test_lru_eviction_and_ttl():
+    cache = ResultCache(max_entries=2, ttl_seconds=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+    short = ResultCache(max_entries=10, ttl_seconds=0.01)
+    short.put("x", 1)
+    time.sleep(0.02)
+    assert short.get("x") is None
+
+
+def test_content_key_ignores_dict_order():
+    assert content_key({"a": 1, "b": 2}) == content_key({"b": 2, "a": 1})
+
+
+def test_score_reuses_cached_dedupe_and_corpus_change_invalidates(monkeypatch):
+    monkeypatch.setattr(services, "DEDUPE_CACHE", ResultCache(100, 60))
+    monkeypatch.setattr(services, "SCORE_CACHE", ResultCache(100, 60))
+    mepp = MEPP(issue={"summary": "broken streetlight near gandhi statue"},
+                location={"lat": 11.1090, "lon": 77.3415})
+
+    first = services.dedupe_mepp(mepp)
+    services.score_credibility(mepp)
+    assert services.DEDUPE_CACHE.hits == 1
+    services.score_credibility(mepp)
+    assert services.SCORE_CACHE.hits == 1
+
+    store = services.CANONICAL_STORE
+    previous = store.snapshot()
+    try:
+        store.publish([])
+        assert len(services.DEDUPE_CACHE) == 0
+        assert services.dedupe_mepp(mepp).duplicate_of is None
+    finally:
+        store._snapshot = previous
+    assert first.duplicate_of == "INC-002"
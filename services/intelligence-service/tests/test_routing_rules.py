@@ -0,0 +1,77 @@
+import itertools
+import json
+
+import pytest
+
+import services
+from routing_rules import RuleSet, load_rules
+from schemas import MEPP
+
+
+def _legacy_route(category, summary, ward):
+    # The hard-coded rules the default rule set replaces.
+    summary = summary.lower()
+    if category in ["sanitation/garbage", "sanitation/drainage"] and ward == "14":
+        return "ULB_TIRUPPUR_SANITATION", 0.90, ["rule: sanitation+ward14"]
+    if any(kw in summary for kw in ["streetlight", "lamp", "bulb"]):
+        return "ULB_ELECTRICAL", 0.75, ["rule: streetlight keywords"]
+    basis = ["fallback: keyword heuristic"]
+    if any(w in summary for w in ["water", "pipe", "leak"]):
+        return "ULB_WATER", 0.40, basis
+    if any(w in summary for w in ["road", "pothole", "tar"]):
+        return "ULB_ROADS", 0.40, basis
+    if any(w in summary for w in ["garbage", "trash", "waste"]):
+        return "ULB_TIRUPPUR_SANITATION", 0.40, basis
+    return "ULB_GENERIC", 0.40, basis
+
+
+def test_default_rules_match_legacy_routing():
+    categories = ["sanitation/garbage", "sanitation/drainage", "roads/pothole", ""]
+    wards = ["14", "7", ""]
+    summaries = [
+        "Broken STREETLIGHT near the bus stand",
+        "lamps flickering and a leaking pipe",
+        "start of the market road is flooded",
+        "huge pile of trash",
+        "waste water overflowing",
+        "stray dogs",
+        "",
+    ]
+    for category, ward, summary in itertools.product(categories, wards, summaries):
+        res = services.route_mepp(MEPP(issue={"category": category, "summary": summary}, location={"ward": ward}))
+        assert (res.dest, res.confidence, res.basis) == _legacy_route(category, summary, ward)
+
+
+def test_overlapping_keywords_are_all_found():
+    rules = RuleSet.from_config([
+        {"keywords": ["tarmac"], "dest": "A", "confidence": 0.5},
+        {"keywords": ["tar", "mac"], "dest": "B", "confidence": 0.5},
+    ])
+    assert rules.find_keywords("fresh tarmac") == {"tarmac", "tar", "mac"}
+    assert rules.match("", "fresh tarmac", "").dest == "A"
+    assert rules.match("", "guitar", "").dest == "B"
+    assert rules.match("", "nothing here", "") is None
+
+
+def test_rule_order_wins_over_index_order():
+    rules = RuleSet.from_config({"rules": [
+        {"wards": ["3"], "dest": "WARD3", "confidence": 0.6},
+        {"categories": ["roads/pothole"], "dest": "ROADS", "confidence": 0.7},
+        {"categories": ["roads/pothole"], "keywords": ["bridge"], "dest": "BRIDGES", "confidence": 0.9},
+    ]})
+    assert rules.match("roads/pothole", "crack on bridge", "3").dest == "WARD3"
+    assert rules.match("roads/pothole", "crack on bridge", "4").dest == "ROADS"
+    assert rules.match("parks", "crack on bridge", "4") is None
+
+
+def test_load_rules_from_file(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(json.dumps({"rules": [{"keywords": ["Hoarding"], "dest": "ULB_ADS", "confidence": 0.8}]}))
+    rules = load_rules(str(path))
+    assert len(rules) == 1
+    assert rules.match("", "illegal hoarding", "").basis == "rule: ULB_ADS"
+    assert rules.version != load_rules().version
+
+    path.write_text(json.dumps([{"keywords": ["x"], "confidence": 0.8}]))
+    with pytest.raises(ValueError):
+        load_rules(str(path))
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+import scoring
+import services
+import textsim
+from benchmarks import recall
+from incident_index import IncidentIndex
+
+
+def test_normalize_tokens_folds_punctuation_stopwords_and_plurals():
+    assert textsim.normalize_tokens("Potholes, on the main-road!") == textsim.normalize_tokens("pothole main road")
+    assert textsim.normalize_tokens("Drains clogged since 3 days") == {"drain", "clog", "sinc", "3", "day"}
+    assert textsim.normalize_tokens("") == set()
+    for a, b in [("damaged", "damage"), ("leaking", "leak"), ("batteries", "battery"), ("boxes", "box")]:
+        assert textsim.stem(a) == textsim.stem(b)
+    assert textsim.stem("bus") == "bus"
+    assert textsim.stem("speed") == "speed"
+
+
+def test_token_dictionary_ids_are_stable_and_query_tokens_are_not_added():
+    d = textsim.TokenDictionary()
+    assert d.ids(["pipe", "leak", "pipe"]) == [0, 1, 0]
+    assert d.token(1) == "leak"
+    assert d.hashes_for(["leak", "unseen"]) == [textsim.token_hash("leak"), textsim.token_hash("unseen")]
+    assert len(d) == 2
+
+
+def test_minhash_backends_agree(monkeypatch):
+    if scoring.np is None:
+        pytest.skip("numpy not installed")
+    h = textsim.MinHasher(64, seed=3)
+    sets = [[textsim.token_hash(w) for w in s.split()] for s in ("a b c", "", "garbage bin market", "x")]
+    vectorized = h.signatures(sets)
+    assert vectorized[0] == h.signature(sets[0])
+    monkeypatch.setattr(scoring, "SCORING_BACKEND", "python")
+    assert h.signatures(sets) == vectorized
+    assert vectorized[1] is None
+
+    index = textsim.LSHIndex(8, 4)
+    sig = index.hasher.signature(sets[2])
+    expected = index.band_keys(sig)
+    arr = scoring.np.asarray([sig], dtype=scoring.np.uint64)
+    assert index._band_key_array(arr).tolist()[0] == expected
+
+
+def test_minhash_estimates_jaccard():
+    h = textsim.MinHasher(256)
+    a = {textsim.token_hash(str(i)) for i in range(100)}
+    b = {textsim.token_hash(str(i)) for i in range(50, 150)}
+    sa, sb = h.signature(sorted(a)), h.signature(sorted(b))
+    estimate = sum(x == y for x, y in zip(sa, sb)) / h.num_perm
+    assert abs(estimate - len(a & b) / len(a | b)) < 0.1
+
+
+@pytest.mark.parametrize("backend", ["auto", "python"])
+def test_lsh_finds_near_duplicates_with_bulk_and_incremental_adds(monkeypatch, backend):
+    monkeypatch.setattr(scoring, "SCORING_BACKEND", backend)
+    docs = [{"garbage", "bin", "overflowing", "market", "near"},
+            {"streetlight", "broken", "gandhi", "statue"},
+            {"pothole", "traffic", "jam", "large"}]
+    index = textsim.LSHIndex(32, 4)
+    index.add_many([0, 1], docs[:2])
+    index.add_tokens(2, docs[2])
+    assert 0 in index.query({"garbage", "bin", "overflowing", "market"})
+    assert 2 in index.query({"pothole", "traffic", "jam", "large", "again"})
+    assert index.query(set()) == set()
+    assert 1 not in index.query({"water", "pipe", "leak"})
+
+
+def test_lsh_incident_index_agrees_with_exact_dedupe():
+    rng = random.Random(5)
+    vocab = ["garbage", "bin", "overflowing", "pothole", "road", "streetlight", "broken",
+             "water", "leak", "pipe", "drain", "blocked", "market", "near", "school", "at"]
+    incidents = [{"id": f"I{i}", "summary": " ".join(rng.sample(vocab, rng.randint(3, 6))),
+                  "lat": 11.1 + rng.random() / 100, "lon": 77.3 + rng.random() / 100} for i in range(300)]
+    exact = IncidentIndex.from_incidents(incidents, services.tokenize)
+    lsh = IncidentIndex.from_incidents(incidents, services.tokenize, lsh_bands=32, lsh_rows=4)
+    for inc in incidents[:50]:
+        tokens = services.tokenize(inc["summary"])
+        e = services._dedupe(exact, tokens, None, None, 0.65)
+        l = services._dedupe(lsh, tokens, None, None, 0.65)
+        assert l.duplicate_of == e.duplicate_of
+        assert l.similarity == e.similarity
+    # Geo neighbours are still candidates in LSH mode.
+    assert set(exact.geo_candidates(11.105, 77.305, 0.3)) <= set(lsh.candidates({"zzz"}, 11.105, 77.305, 0.3))
+
+
+def test_recall_benchmark_runs():
+    row = recall.measure(300, 40, seed=2, bands=32, rows=4, threshold=0.65)
+    assert row["exact_duplicates"] > 0
+    assert row["recall"] >= 0.9
+    assert row["false_positives"] == 0
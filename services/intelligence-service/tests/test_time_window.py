@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+import services
+from incident_index import IncidentIndex
+from incident_store import IncidentStore
+from time_window import DAY_SECONDS, NEVER, Sweeper, TimeWindow, day_of, parse_category_days, parse_timestamp
+
+
+def test_parse_timestamp_accepts_iso_and_numbers():
+    assert parse_timestamp("1970-01-02T00:00:00Z") == DAY_SECONDS
+    assert parse_timestamp("1970-01-02T05:30:00+05:30") == DAY_SECONDS
+    assert parse_timestamp("1970-01-02") == DAY_SECONDS
+    assert parse_timestamp(42) == 42.0
+    for bad in (None, "", "yesterday", True, float("nan")):
+        assert parse_timestamp(bad) is None
+
+
+def test_category_days_and_expiry():
+    window = TimeWindow(30, parse_category_days("Sanitation=7, roads=0"))
+    assert window.days_for("sanitation") == 7
+    assert window.days_for("roads") == 0
+    assert window.days_for("other") == 30
+    ts = 10 * DAY_SECONDS + 3600
+    # Active through the end of the 7th day after the report's day.
+    assert window.expires_at(ts, "sanitation") == (10 + 7 + 1) * DAY_SECONDS
+    assert window.expires_at(ts, "roads") == NEVER
+    assert window.expires_at(None, "other") == NEVER
+    assert not TimeWindow(0).enabled
+    with pytest.raises(ValueError):
+        parse_category_days("sanitation")
+
+
+def test_index_skips_expired_incidents():
+    incidents = [
+        {"id": "OLD", "summary": "garbage bin", "created_at": "2024-01-01T00:00:00Z"},
+        {"id": "NEW", "summary": "garbage bin", "created_at": "2024-03-01T00:00:00Z"},
+        {"id": "UNDATED", "summary": "garbage bin"},
+    ]
+    index = IncidentIndex.from_incidents(incidents, services.tokenize, window=TimeWindow(30))
+    at = parse_timestamp("2024-03-05T00:00:00Z")
+    assert [index.ids[p] for p in index.candidates({"garbage"}, at=at)] == ["NEW", "UNDATED"]
+    assert len(index.candidates({"garbage"})) == 3
+    assert index.active(at, version=9).ids == ("NEW", "UNDATED")
+
+
+def test_store_evicts_expired_incidents(tmp_path):
+    path = tmp_path / "incidents.json"
+    path.write_text(json.dumps([
+        {"id": "A", "summary": "pothole", "created_at": "2024-01-01T00:00:00Z"},
+        {"id": "B", "summary": "pothole", "created_at": "2024-02-01T00:00:00Z"},
+    ]))
+    store = IncidentStore(services.tokenize, source=str(path), window=TimeWindow(10))
+    seen = []
+    store.add_listener(seen.append)
+    index = store.ensure_loaded()
+    # Loading already drops what is expired by now.
+    assert len(index) == 0
+
+    # A window long enough to outlive now, swept at later and later times.
+    store.window = TimeWindow(100000)
+    store.load()
+    assert store.evict_expired(parse_timestamp("2024-01-20T00:00:00Z")) == 0
+    assert store.snapshot().ids == ("A", "B")
+    assert store.evict_expired(parse_timestamp("2297-11-01T00:00:00Z")) == 1
+    assert store.snapshot().ids == ("B",)
+    assert store.evict_expired(parse_timestamp("2300-01-01T00:00:00Z")) == 1
+    assert store.snapshot().ids == ()
+    assert seen[-1] is store.snapshot()
+
+
+def test_sweeper_survives_failing_task():
+    calls = []
+
+    def boom():
+        raise RuntimeError("boom")
+
+    Sweeper([boom, lambda: calls.append(1)]).run_once()
+    assert calls == [1]
+    assert day_of(-1) == -1
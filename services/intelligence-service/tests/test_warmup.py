@@ -0,0 +1,52 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+import services
+import warmup
+
+
+def test_parse_steps():
+    assert warmup.parse_steps(None) == warmup.DEFAULT_STEPS
+    assert warmup.parse_steps(" corpus , schema ,") == ["corpus", "schema"]
+    assert warmup.parse_steps("") == []
+    with pytest.raises(ValueError):
+        warmup.parse_steps("schema,bogus")
+
+
+def test_run_marks_ready_and_loads_corpus():
+    readiness = warmup.Readiness()
+    assert asyncio.run(warmup.run(["schema", "corpus", "pdf"], readiness))
+    snap = readiness.snapshot()
+    assert snap["status"] == warmup.READY
+    assert set(snap["steps"]) == {"schema", "corpus", "pdf"}
+    assert services.CANONICAL_STORE.loaded
+
+
+def test_failed_step_is_reported(monkeypatch):
+    def broken():
+        raise RuntimeError("disk gone")
+
+    monkeypatch.setitem(warmup.STEPS, "schema", (broken, False))
+    readiness = warmup.Readiness()
+    assert not asyncio.run(warmup.run(["schema", "corpus"], readiness))
+    snap = readiness.snapshot()
+    assert snap["status"] == warmup.FAILED
+    assert snap["error"] == "schema: disk gone"
+    assert snap["steps"] == {}
+
+
+def test_readyz_is_separate_from_healthz(monkeypatch):
+    client = TestClient(main.app)
+    monkeypatch.setattr(warmup, "READINESS", warmup.Readiness())
+    assert client.get("/healthz").status_code == 200
+    response = client.get("/readyz")
+    assert response.status_code == 503
+    assert response.json()["status"] == warmup.PENDING
+
+    warmup.READINESS.set(warmup.READY)
+    response = client.get("/readyz")
+    assert response.status_code == 200
+    assert response.json()["status"] == warmup.READY
@@ -0,0 +1,305 @@
+"""
+Text similarity building blocks: token normalization, a token dictionary,
+MinHash signatures and an LSH band index.
+
+- normalize_tokens() lowercases, strips punctuation, drops stopwords and
+  applies a light suffix stemmer, so "Potholes," and "pothole" meet.
+- TOKENS maps every indexed token to a small integer id plus a stable
+  32-bit hash, computed once per distinct token rather than per comparison.
+- MinHasher turns a token set into a fixed-length signature whose per-slot
+  agreement estimates Jaccard similarity; LSHIndex buckets signatures by
+  band so near-duplicates are found without scanning the corpus.
+
+LSH only proposes candidates. Callers still re-score them with exact
+Jaccard, so it can miss a low-similarity pair but never invents a match.
+"""
+import os
+import random
+import re
+import sys
+import threading
+import zlib
+from array import array
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import scoring
+from scoring import np
+
+# "simple" keeps the legacy lowercase + whitespace split; "normalized" uses
+# normalize_tokens().
+TEXT_TOKENIZER = os.environ.get("TEXT_TOKENIZER", "simple").lower()
+# "exact" takes every incident sharing a token; "lsh" asks the LSH index.
+# Dedupe only: cluster candidates come from the geocell neighbourhood or ward.
+DEDUPE_CANDIDATES = os.environ.get("DEDUPE_CANDIDATES", "exact").lower()
+# 32 bands of 4 rows: pairs above ~0.42 Jaccard collide in some band with
+# better than even odds, and at 0.6 almost always (> 0.99).
+LSH_BANDS = int(os.environ.get("LSH_BANDS", "32"))
+LSH_ROWS = int(os.environ.get("LSH_ROWS", "4"))
+
+if TEXT_TOKENIZER not in ("simple", "normalized"):
+    raise ValueError(f"TEXT_TOKENIZER must be 'simple' or 'normalized', got {TEXT_TOKENIZER!r}")
+if DEDUPE_CANDIDATES not in ("exact", "lsh"):
+    raise ValueError(f"DEDUPE_CANDIDATES must be 'exact' or 'lsh', got {DEDUPE_CANDIDATES!r}")
+
+_WORD = re.compile(r"[^\W_]+")
+
+STOPWORDS = frozenset("""
+a an and are as at be been but by for from has have in into is it its of on or
+so than that the their there this to was were will with
+""".split())
+
+_VOWELS = frozenset("aeiou")
+
+
+def stem(word: str) -> str:
+    """
+    Light suffix stripping (plurals, -ing, -ed, final e), enough to fold
+    inflected forms of the same complaint together without a full Porter
+    stemmer. Stems are only compared with each other, never shown.
+    """
+    if len(word) <= 3 or not word.isalpha():
+        return word
+    if word.endswith("ies") and len(word) > 4:
+        word = word[:-3] + "y"
+    elif word.endswith(("sses", "xes", "zes", "ches", "shes")):
+        word = word[:-2]
+    elif word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        word = word[:-1]
+    elif (word.endswith("ing") and len(word) >= 6) or (
+            word.endswith("ed") and len(word) >= 5 and not word.endswith("eed")):
+        base = word[:-3] if word.endswith("ing") else word[:-2]
+        if _VOWELS.intersection(base):
+            # "clogged" -> "clog", but "filled" -> "fill".
+            if base[-1] == base[-2] and base[-1] not in "lsz":
+                base = base[:-1]
+            word = base
+    # "damage" and "damaged" both end up as "damag".
+    if len(word) > 3 and word.endswith("e") and not word.endswith("ee"):
+        word = word[:-1]
+    return word
+
+
+def normalize_tokens(text: str) -> Set[str]:
+    if not text:
+        return set()
+    return {stem(w) for w in _WORD.findall(text.lower()) if w not in STOPWORDS}
+
+
+def simple_tokens(text: str) -> Set[str]:
+    if not text:
+        return set()
+    return set(text.lower().split())
+
+
+def token_hash(token: str) -> int:
+    """Stable across processes, unlike hash(str)."""
+    return zlib.crc32(token.encode("utf-8"))
+
+
+class TokenDictionary:
+    """
+    Append-only token -> integer id mapping. Each token's string is
+    interned and its hash computed once; ids are dense, so per-token data
+    lives in flat arrays.
+    """
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._tokens: List[str] = []
+        self.hashes = array("I")
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def id(self, token: str) -> int:
+        tid = self._ids.get(token)
+        if tid is not None:
+            return tid
+        with self._lock:
+            tid = self._ids.get(token)
+            if tid is None:
+                tid = len(self._tokens)
+                self._tokens.append(sys.intern(token))
+                self.hashes.append(token_hash(token))
+                self._ids[self._tokens[tid]] = tid
+            return tid
+
+    def ids(self, tokens: Iterable[str]) -> List[int]:
+        return [self.id(t) for t in tokens]
+
+    def token(self, tid: int) -> str:
+        return self._tokens[tid]
+
+    def intern(self, token: str) -> str:
+        return self._tokens[self.id(token)]
+
+    def hashes_for(self, tokens: Iterable[str]) -> List[int]:
+        """Hashes of tokens; unknown (query-only) tokens are hashed without being added."""
+        out = []
+        for t in tokens:
+            tid = self._ids.get(t)
+            out.append(self.hashes[tid] if tid is not None else token_hash(t))
+        return out
+
+
+TOKENS = TokenDictionary()
+
+# Universal hashing modulo a Mersenne prime: a * h + b stays below 2**62,
+# so the NumPy path never overflows uint64 and both paths agree exactly.
+_PRIME = (1 << 31) - 1
+# Documents signed per NumPy block in signatures(), bounding the temporary
+# (num_perm x tokens) matrix.
+_SIGN_BLOCK = 2048
+
+
+class MinHasher:
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.a = [rng.randrange(1, _PRIME) for _ in range(num_perm)]
+        self.b = [rng.randrange(0, _PRIME) for _ in range(num_perm)]
+        if np is not None:
+            self._a = np.asarray(self.a, dtype=np.uint64)[:, None]
+            self._b = np.asarray(self.b, dtype=np.uint64)[:, None]
+
+    def signature(self, hashes: Sequence[int]) -> Optional[Tuple[int, ...]]:
+        """MinHash signature of one set given its token hashes; None when empty."""
+        if not hashes:
+            return None
+        if scoring.numpy_enabled():
+            h = np.asarray(hashes, dtype=np.uint64) % _PRIME
+            return tuple(((self._a * h + self._b) % _PRIME).min(axis=1).tolist())
+        hs = [h % _PRIME for h in hashes]
+        return tuple(min((a * h + b) % _PRIME for h in hs) for a, b in zip(self.a, self.b))
+
+    def signature_array(self, sets: Sequence[Sequence[int]]):
+        """
+        NumPy only: (signatures, nonempty) for many sets at once, as a
+        (len(sets), num_perm) uint64 array plus a boolean mask; rows of
+        empty sets are zero and masked out. Computed in blocks.
+        """
+        sigs = np.zeros((len(sets), self.num_perm), dtype=np.uint64)
+        lengths_all = np.fromiter((len(s) for s in sets), dtype=np.int64, count=len(sets))
+        for start in range(0, len(sets), _SIGN_BLOCK):
+            lengths = lengths_all[start:start + _SIGN_BLOCK]
+            nonempty = np.flatnonzero(lengths)
+            if not len(nonempty):
+                continue
+            flat = [h for s in sets[start:start + _SIGN_BLOCK] for h in s]
+            h = np.asarray(flat, dtype=np.uint64) % _PRIME
+            values = (self._a * h + self._b) % _PRIME
+            offsets = np.concatenate(([0], np.cumsum(lengths[:-1])))
+            sigs[start + nonempty] = np.minimum.reduceat(values, offsets[nonempty], axis=1).T
+        return sigs, lengths_all > 0
+
+    def signatures(self, sets: Sequence[Sequence[int]]) -> List[Optional[Tuple[int, ...]]]:
+        """signature() for many sets, vectorized when NumPy is available."""
+        if not scoring.numpy_enabled():
+            return [self.signature(s) for s in sets]
+        sigs, nonempty = self.signature_array(sets)
+        return [tuple(row) if ok else None for row, ok in zip(sigs.tolist(), nonempty.tolist())]
+
+
+_HASHERS: Dict[int, MinHasher] = {}
+_HASHERS_LOCK = threading.Lock()
+
+
+def hasher(num_perm: int) -> MinHasher:
+    """Shared MinHasher per signature length, so every index signs the same way."""
+    with _HASHERS_LOCK:
+        h = _HASHERS.get(num_perm)
+        if h is None:
+            h = _HASHERS[num_perm] = MinHasher(num_perm)
+        return h
+
+
+_MASK64 = (1 << 64) - 1
+_FNV_PRIME = 0x100000001B3
+# Mixed into each band's key so one flat key space can hold every band.
+_BAND_SALT = 0x9E3779B97F4A7C15
+
+
+class LSHIndex:
+    """
+    Banded LSH over MinHash signatures, keyed by integer (e.g. corpus
+    position). Each band of rows signature slots hashes to a 64-bit bucket
+    key; two sets become candidates when any band key matches.
+
+    A bulk add_many() into an empty index with NumPy available stores the
+    buckets as one sorted key array plus the matching keys, built and
+    probed with vectorized sort/searchsorted. Later adds, and everything
+    without NumPy, go into per-key dict buckets. query() reads both.
+    """
+
+    def __init__(self, bands: int = LSH_BANDS, rows: int = LSH_ROWS):
+        if bands < 1 or rows < 1:
+            raise ValueError("LSH bands and rows must be positive")
+        self.bands = bands
+        self.rows = rows
+        self.hasher = hasher(bands * rows)
+        self.buckets: Dict[int, List[int]] = {}
+        self._sorted_keys = None
+        self._sorted_ids = None
+
+    def band_keys(self, sig: Tuple[int, ...]) -> List[int]:
+        """FNV-style fold of each band's rows; _band_key_array() is the vectorized twin."""
+        r = self.rows
+        out = []
+        for band in range(self.bands):
+            k = (band * _BAND_SALT) & _MASK64
+            for v in sig[band * r:(band + 1) * r]:
+                k = ((k ^ v) * _FNV_PRIME) & _MASK64
+            out.append(k)
+        return out
+
+    def _band_key_array(self, sigs):
+        n = len(sigs)
+        by_band = sigs.reshape(n, self.bands, self.rows)
+        salts = np.asarray([(b * _BAND_SALT) & _MASK64 for b in range(self.bands)], dtype=np.uint64)
+        keys = np.broadcast_to(salts, (n, self.bands)).copy()
+        prime = np.uint64(_FNV_PRIME)
+        for j in range(self.rows):
+            keys = (keys ^ by_band[:, :, j]) * prime  # uint64 arithmetic wraps mod 2**64
+        return keys
+
+    def add(self, key: int, sig: Optional[Tuple[int, ...]]) -> None:
+        if sig is None:
+            return
+        for band_key in self.band_keys(sig):
+            self.buckets.setdefault(band_key, []).append(key)
+
+    def add_tokens(self, key: int, tokens: Iterable[str]) -> None:
+        self.add(key, self.hasher.signature(TOKENS.hashes_for(tokens)))
+
+    def add_many(self, keys: Sequence[int], token_sets: Sequence[Iterable[str]]) -> None:
+        hashes = [TOKENS.hashes_for(t) for t in token_sets]
+        if not scoring.numpy_enabled() or self._sorted_keys is not None or self.buckets:
+            for key, sig in zip(keys, self.hasher.signatures(hashes)):
+                self.add(key, sig)
+            return
+        sigs, nonempty = self.hasher.signature_array(hashes)
+        band_keys = self._band_key_array(sigs[nonempty]).ravel()
+        ids = np.repeat(np.asarray(keys, dtype=np.int64)[nonempty], self.bands)
+        order = np.argsort(band_keys, kind="stable")
+        self._sorted_keys = band_keys[order]
+        self._sorted_ids = ids[order]
+
+    def query(self, tokens: Iterable[str]) -> Set[int]:
+        sig = self.hasher.signature(TOKENS.hashes_for(tokens))
+        found: Set[int] = set()
+        if sig is None:
+            return found
+        keys = self.band_keys(sig)
+        for band_key in keys:
+            hit = self.buckets.get(band_key)
+            if hit:
+                found.update(hit)
+        if self._sorted_keys is not None:
+            q = np.asarray(keys, dtype=np.uint64)
+            lo = np.searchsorted(self._sorted_keys, q, side="left")
+            hi = np.searchsorted(self._sorted_keys, q, side="right")
+            for a, b in zip(lo.tolist(), hi.tolist()):
+                if b > a:
+                    found.update(self._sorted_ids[a:b].tolist())
+        return found
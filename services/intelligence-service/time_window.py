@@ -0,0 +1,127 @@
+"""
+Time windows for dedupe and clustering.
+
+Every canonical incident and cluster carries an expiry: the end of the day
+its category's window runs out, counted from its last activity. A report
+only matches incidents and clusters still active at its own time, and a
+periodic sweep drops or archives what has expired, so the candidate set
+tracks recent activity instead of all history.
+
+Expiries fall on day boundaries, so every report made on the same day sees
+the same candidates. Items with no usable timestamp, and every item while
+the window is 0 days, never expire.
+"""
+import datetime
+import logging
+import math
+import threading
+from typing import Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger("intelligence-service")
+
+DAY_SECONDS = 86400
+NEVER = math.inf
+
+
+def parse_timestamp(value) -> Optional[float]:
+    """Epoch seconds from an ISO-8601 string or a number; naive times are UTC."""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return float(value) if math.isfinite(value) else None
+    if not isinstance(value, str) or not value.strip():
+        return None
+    text = value.strip()
+    if text[-1] in "zZ":
+        text = text[:-1] + "+00:00"
+    try:
+        dt = datetime.datetime.fromisoformat(text)
+    except ValueError:
+        return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=datetime.timezone.utc)
+    return dt.timestamp()
+
+
+def day_of(ts: float) -> int:
+    return math.floor(ts / DAY_SECONDS)
+
+
+def parse_category_days(value: Optional[str]) -> Dict[str, int]:
+    """Per-category window overrides from "sanitation=7,roads=60"."""
+    out: Dict[str, int] = {}
+    for part in (value or "").split(","):
+        if not part.strip():
+            continue
+        category, sep, days = part.partition("=")
+        if not sep or not category.strip():
+            raise ValueError(f"TIME_WINDOW_CATEGORY_DAYS: expected category=days, got {part.strip()!r}")
+        try:
+            out[category.strip().lower()] = int(days)
+        except ValueError:
+            raise ValueError(f"TIME_WINDOW_CATEGORY_DAYS: {category.strip()!r} has non-integer days {days.strip()!r}")
+    return out
+
+
+class TimeWindow:
+    """How many days an incident or cluster stays active, by category."""
+
+    def __init__(self, days: int = 0, by_category: Optional[Dict[str, int]] = None):
+        self.days = max(0, days)
+        self.by_category = {k.lower(): max(0, v) for k, v in (by_category or {}).items()}
+
+    @property
+    def enabled(self) -> bool:
+        return self.days > 0 or any(self.by_category.values())
+
+    def days_for(self, category: Optional[str]) -> int:
+        if category:
+            days = self.by_category.get(str(category).lower())
+            if days is not None:
+                return days
+        return self.days
+
+    def expires_at(self, ts: Optional[float], category: Optional[str] = None) -> float:
+        """End of the last day an item active at ts stays a candidate."""
+        days = self.days_for(category)
+        if ts is None or days <= 0:
+            return NEVER
+        return float((day_of(ts) + days + 1) * DAY_SECONDS)
+
+
+class Sweeper:
+    """
+    Daemon thread calling each task every interval seconds. A failing task
+    is logged and retried on the next round.
+    """
+
+    def __init__(self, tasks: Iterable[Callable[[], object]], name: str = "expiry-sweeper"):
+        self.tasks = list(tasks)
+        self.name = name
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def run_once(self) -> None:
+        for task in self.tasks:
+            try:
+                task()
+            except Exception as e:
+                logger.error(f"{self.name}: {getattr(task, '__name__', task)} failed: {e}")
+
+    def start(self, interval: float) -> None:
+        if interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+
+        def _sweep():
+            while not self._stop.wait(interval):
+                self.run_once()
+
+        self._thread = threading.Thread(target=_sweep, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+            self._thread = None
@@ -0,0 +1,139 @@
+"""
+Startup warm-up and readiness.
+
+Importing the service does no I/O. The warm-up runs the configured steps
+once at startup, so the first real request does not pay for them:
+
+- schema: open the cluster DB and create/migrate its tables
+- clusters: restore the in-memory cluster index from its snapshot
+- corpus: load and index (tokenize) the canonical incidents
+- photos: load stored photo hashes into the evidence duplicate index
+- pdf: import reportlab and render a throwaway page, loading its fonts
+- http: create the shared outbound HTTP client
+
+READINESS tracks progress. /readyz reports 200 only once every step has
+finished, while /healthz stays a plain liveness check.
+"""
+import asyncio
+import io
+import logging
+import threading
+import time
+from typing import Any, Dict, Optional, Sequence
+
+import executors
+import services
+
+logger = logging.getLogger("intelligence-service")
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+def warm_schema() -> None:
+    services.init_db()
+
+
+def warm_clusters() -> None:
+    if services.CLUSTER_INDEX_MODE == "memory":
+        index = services.CLUSTER_INDEX.ensure_loaded()
+        logger.info(f"Warm-up: {len(index)} active clusters restored from the {index.restored_from}")
+
+
+def warm_corpus() -> None:
+    index = services.CANONICAL_STORE.ensure_loaded()
+    logger.info(f"Warm-up: {len(index)} canonical incidents indexed")
+
+
+def warm_photos() -> None:
+    index = services.PHOTO_INDEX.ensure_loaded()
+    logger.info(f"Warm-up: {len(index)} photo hashes indexed")
+
+
+def warm_pdf() -> None:
+    from reportlab.pdfgen import canvas
+
+    c = canvas.Canvas(io.BytesIO())
+    services.draw_pack_lines(c, ["warm-up"])
+    c.save()
+
+
+def warm_http() -> None:
+    executors.http_client()
+
+
+# name -> (function, runs on the event loop rather than a worker thread)
+STEPS: Dict[str, tuple] = {
+    "schema": (warm_schema, False),
+    "clusters": (warm_clusters, False),
+    "corpus": (warm_corpus, False),
+    "photos": (warm_photos, False),
+    "pdf": (warm_pdf, False),
+    "http": (warm_http, True),
+}
+DEFAULT_STEPS = tuple(STEPS)
+
+
+def parse_steps(value: Optional[str]) -> Sequence[str]:
+    if value is None:
+        return DEFAULT_STEPS
+    steps = [s.strip() for s in value.split(",") if s.strip()]
+    unknown = [s for s in steps if s not in STEPS]
+    if unknown:
+        raise ValueError(f"WARMUP_STEPS: unknown steps {unknown}; choose from {', '.join(STEPS)}")
+    return steps
+
+
+class Readiness:
+    def __init__(self):
+        self.state = PENDING
+        self.error: Optional[str] = None
+        self.steps: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    def set(self, state: str, error: Optional[str] = None) -> None:
+        with self._lock:
+            self.state = state
+            self.error = error
+
+    def step_done(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.steps[name] = round(seconds, 4)
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = {"status": self.state, "steps": dict(self.steps)}
+            if self.error:
+                out["error"] = self.error
+            return out
+
+
+READINESS = Readiness()
+
+
+async def run(steps: Sequence[str], readiness: Readiness = READINESS) -> bool:
+    """Run the steps in order; stop at the first failure and report it."""
+    readiness.set(WARMING)
+    started = time.perf_counter()
+    for name in steps:
+        fn, on_loop = STEPS[name]
+        step_started = time.perf_counter()
+        try:
+            if on_loop:
+                fn()
+            else:
+                await asyncio.to_thread(fn)
+        except Exception as e:
+            logger.error(f"Warm-up step '{name}' failed: {e}")
+            readiness.set(FAILED, f"{name}: {e}")
+            return False
+        readiness.step_done(name, time.perf_counter() - step_started)
+    readiness.set(READY)
+    logger.info(f"Warm-up finished in {time.perf_counter() - started:.3f}s ({', '.join(steps) or 'no steps'})")
+    return True